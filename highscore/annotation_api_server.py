@@ -1,11 +1,13 @@
 # annotation_api_server.py - Updated to use SQLite database (NO ASYNC CHANGES!)
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Dict, Optional
+import asyncio
+from typing import Any, Dict, List, Optional
 import os
 from pathlib import Path
 
@@ -16,8 +18,8 @@ from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 
 # where to store things on the server (adjust if needed)
-# DATA_ROOT = Path(os.getenv("ANNOTATION_DATA_ROOT", "/srv/label_data")).resolve()
-# ANNOTATIONS_DIR = DATA_ROOT / "annotations"  # <session_id>.json uploaded here
+DATA_ROOT = Path(os.getenv("ANNOTATION_DATA_ROOT", "/srv/label_data")).resolve()
+ANNOTATIONS_DIR = DATA_ROOT / "annotations"  # <session_id>.json uploaded here
 # IMAGES_DIR = DATA_ROOT / "images"            # images stored by their relative_path
 
 # ANNOTATIONS_DIR.mkdir(parents=True, exist_ok=True)
@@ -27,7 +29,13 @@ from fastapi.staticfiles import StaticFiles
 # ONLY CHANGE: Replace JSON import with database import
 # OLD: import json
 # NEW: Import your database module
-from highscore_db import initialize_data_file, read_data, write_data, get_database_stats
+from leaderboard_view import LeaderboardView
+from unsure_index import UnsureIndex
+from highscore_db import (
+    initialize_data_file, read_leaderboard, apply_annotations, get_database_stats,
+    get_pair_states,
+    apply_events,
+)
 
 app = FastAPI(title="Annotation Leaderboard API")
 
@@ -83,121 +91,214 @@ class LeaderboardResponse(BaseModel):
 # Initialize on startup (UNCHANGED - still synchronous!)
 initialize_data_file()
 
+# leaderboard served from memory, patched by every write. Only writes of this process reach it,
+# so run this server as a single process (no uvicorn --workers), or the workers' boards drift apart.
+leaderboard_view = LeaderboardView()
+leaderboard_view.load(read_leaderboard())
+_stats_cache = (None, None)  # (version, serialized /api/stats)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (t.strip() for t in header.split(","))
+
+
+def _cached_json(request: Request, etag: str, body: bytes) -> Response:
+    # no-cache: browsers keep the body but revalidate, which costs a 304 while nothing changed
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _record(totals):
+    """Push the result of apply_annotations() into the leaderboard view (and its SSE clients)."""
+    leaderboard_view.apply(totals)
+    return totals
+
 # API Routes (COMPLETELY UNCHANGED!)
 
 @app.get("/api/stats")
-async def get_stats():
-    """Get all statistics (UNCHANGED)"""
+def get_stats(request: Request):
+    """
+    Totals and class counts of every user. Rebuilt from the leaderboard view once per version,
+    otherwise served from memory / 304. Per-pair states are not included (they grew with every
+    annotation), use /api/users/{username}/pairs/... for those.
+    """
+    global _stats_cache
     try:
-        data = read_data()  # Same call, no await needed!
-        return data
+        version, etag = leaderboard_view.version, leaderboard_view.etag
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+        cached_version, body = _stats_cache
+        if cached_version != version:
+            board = leaderboard_view.snapshot()
+            body = json.dumps({
+                "users": {
+                    entry["username"]: {k: entry[k] for k in ("total", "classes", "lastAnnotation")}
+                    for entry in board["leaderboard"]
+                },
+                "totalAnnotations": board["totalAnnotations"],
+                "lastUpdated": board["lastUpdated"],
+            }).encode()
+            _stats_cache = (version, body)
+        return _cached_json(request, etag, body)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to read stats")
 
 @app.post("/api/annotate")
 async def update_annotation(annotation: AnnotationUpdate):
-    # YOUR EXISTING CODE - COMPLETELY UNCHANGED!
     try:
         print(f"[SERVER] Received annotation from {annotation.username} for {annotation.pairId}: {annotation.className}")
-        data = read_data()  # Same call!
-
-        user_data = data["users"].setdefault(annotation.username, {
-            "total": 0,
-            "classes": {},
-            "lastAnnotation": None,
-            "pairs": {}
-        })
-
-        pair_id = annotation.pairId
-        new_class = annotation.className
-        old_class = user_data["pairs"].get(pair_id)
-
-        is_new_pair = old_class is None
-        class_changed = old_class != new_class
-        is_no_annotation = (new_class == "no_annotation")
-
-        # Remove previous class if changing to "no_annotation"
-        if is_no_annotation:
-            if old_class and old_class != "no_annotation":
-                user_data["total"] -= 1
-                data["totalAnnotations"] -= 1
-
-                # Decrement count for old class
-                user_data["classes"][old_class] = user_data["classes"].get(old_class, 1) - 1
-                if user_data["classes"][old_class] <= 0:
-                    del user_data["classes"][old_class]
-            # Increment class count for no_annotation
-            if is_new_pair or class_changed:
-                user_data["classes"][new_class] = user_data["classes"].get(new_class, 0) + 1
-
-        else:
-            # Not "no_annotation"
-            if is_new_pair or old_class == "no_annotation":
-                user_data["total"] += 1
-                data["totalAnnotations"] += 1
-            elif class_changed and old_class != "no_annotation":
-                # Changing from one real class to another
-                user_data["classes"][old_class] = user_data["classes"].get(old_class, 1) - 1
-                if user_data["classes"][old_class] <= 0:
-                    del user_data["classes"][old_class]
-
-            if is_new_pair or class_changed:
-                user_data["classes"][new_class] = user_data["classes"].get(new_class, 0) + 1
-
-        # Always track the pair's latest state
-        user_data["pairs"][pair_id] = new_class
-        user_data["pairTimestamps"] = user_data.get("pairTimestamps", {})
-        user_data["pairTimestamps"][pair_id] = datetime.now().isoformat()
-        now = datetime.now().isoformat()
-        user_data["lastAnnotation"] = now
-        data["lastUpdated"] = now
-
-        write_data(data)  # Same call!
-
-        print(f"[SERVER] Updated {annotation.username}: pair={pair_id}, class={new_class}, total={user_data['total']}, classes={user_data['classes']}")
+        # sqlite write runs in the threadpool, the event loop keeps serving reads
+        totals = _record(await run_in_threadpool(
+            apply_annotations, [(annotation.username, annotation.pairId, annotation.className)]
+        ))
+        user_total = totals["users"][annotation.username]["total"]
+
+        print(f"[SERVER] Updated {annotation.username}: pair={annotation.pairId}, class={annotation.className}, total={user_total}")
 
         return {
             "success": True,
-            "userTotal": user_data["total"],
-            "grandTotal": data["totalAnnotations"]
+            "userTotal": user_total,
+            "grandTotal": totals["grandTotal"]
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to update annotation: {e}")
 
-@app.get("/api/leaderboard", response_model=LeaderboardResponse)
-async def get_leaderboard():
-    """Get the leaderboard sorted by total annotations (UNCHANGED)"""
+class AnnotationBulk(BaseModel):
+    annotations: List[AnnotationUpdate]
+
+MAX_BULK_ANNOTATIONS = 50_000
+
+
+def latest_per_pair(annotations):
+    """
+    Indices of the events that survive when only the last event per (username, pairId) counts.
+    Pair states end up the same as applying every event; the counters move straight from the
+    stored state to the final one, intermediate states inside the batch are not counted.
+    """
+    last = {}
+    for i, (username, pair_id, _) in enumerate(annotations):
+        last[(username, pair_id)] = i
+    return sorted(last.values())
+
+
+@app.post("/api/annotate/bulk")
+def update_annotations_bulk(bulk: AnnotationBulk):
+    """
+    Many annotation events in one request, e.g. an offline client catching up.
+    Events are taken in list order; per (username, pairId) only the latest one is applied,
+    all in a single transaction. Returns one result per event.
+    """
+    if len(bulk.annotations) > MAX_BULK_ANNOTATIONS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ANNOTATIONS} annotations per request")
+
+    events = [(a.username, a.pairId, a.className) for a in bulk.annotations]
+    survivors = latest_per_pair(events)
     try:
-        data = read_data()  # Same call!
-        
-        # Convert users dict to sorted leaderboard list
-        leaderboard = []
-        for username, stats in data["users"].items():
-            leaderboard.append({
+        totals = _record(apply_annotations([events[i] for i in survivors]))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to update annotations: {e}")
+
+    applied = set(survivors)
+    print(f"[SERVER] Bulk annotate: {len(events)} events, {len(applied)} applied")
+    return {
+        "success": True,
+        "results": [
+            {
+                "index": i,
                 "username": username,
-                "total": stats["total"],
-                "classes": stats["classes"],
-                "lastAnnotation": stats["lastAnnotation"]
-            })
-        
-        # Sort by total annotations (descending)
-        leaderboard.sort(key=lambda x: x["total"], reverse=True)
-        
-        return {
-            "leaderboard": leaderboard,
-            "totalAnnotations": data["totalAnnotations"],
-            "lastUpdated": data["lastUpdated"]
-        }
+                "pairId": pair_id,
+                "className": class_name,
+                "status": "applied" if i in applied else "superseded",
+            }
+            for i, (username, pair_id, class_name) in enumerate(events)
+        ],
+        "userTotals": {username: stats["total"] for username, stats in totals["users"].items()},
+        "grandTotal": totals["grandTotal"],
+    }
+
+@app.get("/api/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(request: Request):
+    """Get the leaderboard sorted by total annotations (from memory, with ETag)"""
+    try:
+        etag, body = leaderboard_view.body()
+        return _cached_json(request, etag, body)
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get leaderboard")
 
+@app.get("/api/leaderboard/stream")
+async def leaderboard_stream(request: Request):
+    """
+    Server-Sent Events: one "snapshot" event with the full leaderboard, then a "delta"
+    event with the changed users after every write.
+    """
+    queue = leaderboard_view.subscribe()
+
+    async def events():
+        try:
+            while not getattr(queue, "dropped", False):
+                if await request.is_disconnected():
+                    break
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+        finally:
+            leaderboard_view.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class PairLookup(BaseModel):
+    pairIds: List[str]
+
+MAX_PAIR_LOOKUP = 10_000
+
+
+@app.get("/api/users/{username}/pairs/{pair_id:path}")
+def get_user_pair(username: str, pair_id: str):
+    """
+    Latest state of one pair for one user, instead of downloading /api/stats.
+    pair_id may contain "/" (the %2F is decoded before routing, hence :path).
+    """
+    state = get_pair_states(username, [pair_id]).get(pair_id)
+    return {
+        "username": username,
+        "pairId": pair_id,
+        "annotated": state is not None,
+        "className": state[0] if state else None,
+        "timestamp": state[1] if state else None,
+    }
+
+
+@app.post("/api/users/{username}/pairs/lookup")
+def lookup_user_pairs(username: str, lookup: PairLookup):
+    """Batched membership check, e.g. all pairs of a session in one request."""
+    if len(lookup.pairIds) > MAX_PAIR_LOOKUP:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_PAIR_LOOKUP} pair ids per request")
+
+    states = get_pair_states(username, list(dict.fromkeys(lookup.pairIds)))
+    return {
+        "username": username,
+        "pairs": {pair_id: class_name for pair_id, (class_name, _) in states.items()},
+        "missing": [pair_id for pair_id in lookup.pairIds if pair_id not in states],
+    }
+
 # BONUS: New endpoint to check database health
 @app.get("/api/database/stats")
-async def get_database_stats_endpoint():
+def get_database_stats_endpoint():
     """Get database statistics and health info"""
     try:
-        return get_database_stats()  # No await needed!
+        return get_database_stats()
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to get database stats")
 
@@ -216,55 +317,32 @@ async def read_index():
 
 
 
-def _iter_annotation_files():
-    return sorted(ANNOTATIONS_DIR.glob("*.json"))
+# unsure pairs of the uploaded annotation files, kept current by a background rescan
+unsure_index = UnsureIndex(ANNOTATIONS_DIR)
+unsure_index.start()
 
 @app.get("/unsure")
-def list_unsure_pairs(limit: int = 1000):
+def list_unsure_pairs(limit: int = 1000, cursor: Optional[str] = None):
     """
-    Returns items like:
+    Returns one page:
     {
-      "session_id": "...",
-      "session_path": "<meta root or session_id>",
-      "pair_id": 42,
-      "im1_url": "/images/<relative_path>",
-      "im2_url": "/images/<relative_path>"
+      "items": [{
+        "session_id": "...",
+        "session_path": "<meta root or session_id>",
+        "pair_id": 42,
+        "im1_url": "/images/<relative_path>",
+        "im2_url": "/images/<relative_path>"
+      }, ...],
+      "nextCursor": "<pass as ?cursor= for the next page>" | null
     }
     """
-    out = []
-    total = 0
-    for ann_file in _iter_annotation_files():
-        session_id = ann_file.stem
-        try:
-            data = json.loads(ann_file.read_text())
-        except Exception as e:
-            print("[UNSURE] skip", ann_file, "->", e)
-            continue
-
-        meta_root = (data.get("_meta") or {}).get("root")  # optional; used for context only
-
-        for k, entry in data.items():
-            if k == "_meta":
-                continue
-            ps = entry.get("pair_state")
-            if ps not in (None, "no_annotation"):   # only unsure
-                continue
-            im1_rel = entry.get("im1_path")
-            im2_rel = entry.get("im2_path")
-            if not im1_rel or not im2_rel:
-                continue
-
-            out.append({
-                "session_id": session_id,
-                "session_path": meta_root or session_id,
-                "pair_id": int(k),
-                "im1_url": f"/images/{im1_rel}",
-                "im2_url": f"/images/{im2_rel}",
-            })
-            total += 1
-            if total >= limit:
-                return out
-    return out
+    if not 1 <= limit <= 10_000:
+        raise HTTPException(400, "limit must be between 1 and 10000")
+    try:
+        items, next_cursor = unsure_index.page(limit, cursor)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"items": items, "nextCursor": next_cursor}
 
 
 
@@ -272,9 +350,10 @@ def list_unsure_pairs(limit: int = 1000):
 
 from left_for_review import (
     get_left_for_review_count,
+    get_reviewed_count,
     get_annotator_review_progress,
 )
-from review_pair_registry import get_total_pairs
+from review_pair_registry import get_total_pairs, get_annotators
 
 from review_db import (
     init_review_db,
@@ -284,7 +363,6 @@ from review_db import (
     get_model_review_stats,
     get_model_class_stats,
     get_total_review_count,
-    get_reviewed_pair_ids_by_model,
     get_user_review_stats_by_model,
     get_annotator_review_stats_by_model,
 )
@@ -301,9 +379,9 @@ class InconsistentReview(BaseModel):
 
 @app.post("/api/inconsistent/review")
 async def receive_inconsistent_review(rec: InconsistentReview):
-    print("rec: ", rec)
     try:
-        insert_review(
+        await run_in_threadpool(
+            insert_review,
             pair_id=rec.pairId,
             annotated_by=rec.annotated_by,
             reviewer=rec.reviewer,
@@ -317,8 +395,70 @@ async def receive_inconsistent_review(rec: InconsistentReview):
         raise HTTPException(500, f"Failed to save review: {e}")
 
 
+class ClientEvent(BaseModel):
+    eventId: str          # idempotency key, generated by the client
+    kind: str             # "annotation" | "inconsistent_review"
+    payload: Dict[str, Any]
+
+class EventBatch(BaseModel):
+    events: List[ClientEvent]
+
+
+@app.post("/api/events/bulk")
+def receive_event_batch(batch: EventBatch):
+    """
+    Queued client events (see src/event_shipper.py), applied in order.
+    Events whose eventId was applied before are answered with "duplicate", so clients
+    can safely resend a batch whose response got lost: checking, applying and marking
+    the ids happens in one transaction (apply_events). Reviews live in their own database
+    and commit on their own, which is fine because re-inserting a review is a no-op.
+    """
+    results = []
+    applied = []
+
+    def handle(new_ids):
+        annotations = []
+        for event in batch.events:
+            if event.eventId not in new_ids:
+                results.append({"eventId": event.eventId, "status": "duplicate"})
+                continue
+            try:
+                if event.kind == "annotation":
+                    annotation = AnnotationUpdate(**event.payload)
+                    annotations.append((annotation.username, annotation.pairId, annotation.className))
+                elif event.kind == "inconsistent_review":
+                    rec = InconsistentReview(**event.payload)
+                    insert_review(
+                        pair_id=rec.pairId,
+                        annotated_by=rec.annotated_by,
+                        reviewer=rec.reviewer,
+                        predicted=rec.predicted,
+                        expected=rec.expected,
+                        decision=rec.decision,
+                        model_name=rec.modelName
+                    )
+                else:
+                    raise ValueError(f"unknown event kind {event.kind!r}")
+            except ValueError as e:  # includes pydantic validation errors
+                results.append({"eventId": event.eventId, "status": "rejected", "detail": str(e)})
+                continue
+
+            new_ids.discard(event.eventId)  # same id twice in one batch
+            applied.append(event.eventId)
+            results.append({"eventId": event.eventId, "status": "ok"})
+        return applied, [annotations[i] for i in latest_per_pair(annotations)]
+
+    try:
+        _record(apply_events([event.eventId for event in batch.events], handle))
+        print(f"[SERVER] Event batch: {len(applied)} applied, {len(batch.events) - len(applied)} skipped")
+        return {"results": results}
+
+    except Exception as e:
+        raise HTTPException(500, f"Failed to apply events: {e}")
+
+
 @app.get("/api/inconsistent/userstats")
-async def inconsistent_user_stats():
+def inconsistent_user_stats():
     """
     Groups reviewers into two categories:
     - 'has': more (or equal) accepted predictions than corrected
@@ -327,7 +467,6 @@ async def inconsistent_user_stats():
 
     raw = get_user_review_stats()  # already returns { user: {accepted, corrected, total} }
 
-    print("raw user stats: ", raw)
     grouped = {
         "has": {},
     }
@@ -346,7 +485,7 @@ async def inconsistent_user_stats():
     return grouped
 
 @app.get("/api/inconsistent/stats/annotators")
-async def inconsistent_annotator_stats():
+def inconsistent_annotator_stats():
 
     raw = get_annotator_review_stats()
 
@@ -369,7 +508,7 @@ async def inconsistent_annotator_stats():
     return grouped
 
 @app.get("/api/inconsistent/total")
-async def inconsistent_total():
+def inconsistent_total():
     """
     Returns the total number of reviewed items in the database.
     """
@@ -381,44 +520,33 @@ async def inconsistent_total():
 
 
 @app.get("/api/inconsistent/modelstats")
-async def inconsistent_model_stats():
+def inconsistent_model_stats():
     return get_model_review_stats()
 
 @app.get("/api/inconsistent/modelstats/{model_name}/classes")
-async def model_class_stats(model_name: str):
+def model_class_stats(model_name: str):
     return get_model_class_stats(model_name)
 
 
 @app.get("/api/inconsistent/progress/{model_name}")
-async def inconsistent_progress(model_name: str):
-    reviewed = get_reviewed_pair_ids_by_model(model_name)
+def inconsistent_progress(model_name: str):
+    reviewed = get_reviewed_count(model_name)
     total = get_total_pairs(model_name)
     left = get_left_for_review_count(model_name)
 
     return {
         "model": model_name,
-        "reviewed": len(reviewed),
+        "reviewed": reviewed,
         "total": total,
         "left": left,
-        "progress": len(reviewed) / total if total > 0 else 0.0
+        "progress": reviewed / total if total > 0 else 0.0
     }
 
 @app.get("/api/inconsistent/progress/{model_name}/annotators")
-async def annotator_progress(model_name: str):
-    from review_pair_registry import _load_pairs
-
-    data = _load_pairs(model_name)
-
-    annotators = sorted({
-        entry["annotated_by"].strip()
-        for entry in data.values()
-        if isinstance(entry.get("annotated_by"), str)
-           and entry.get("annotated_by").strip()
-    })
-
+def annotator_progress(model_name: str):
     return [
         get_annotator_review_progress(model_name, annotator)
-        for annotator in annotators
+        for annotator in get_annotators(model_name)
     ]
 
 
@@ -1,30 +1,36 @@
-# database.py - Synchronous drop-in replacement for your JSON operations
-import sqlite3
+# database.py - Highscore store (normalized SQLite tables)
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-from typing import Dict, Any
-import threading
+from typing import Callable, Dict, Any, List, Set, Tuple
+from sqlite_store import SQLiteStore
 
 class DatabaseManager:
     """
-    Synchronous drop-in replacement for JSON file operations.
-    Provides the exact same interface but uses SQLite for reliability.
+    Highscore store.
+
+    Normalized tables, each annotation touches O(1) rows:
+      user_pair_state    latest class per (username, pair_id)
+      users              per-user total + last annotation
+      user_class_counts  per-user, per-class counters
+      leaderboard_meta   grand total + last update (single row)
+    The old single JSON document (json_data 'main' / highscore_list.json) is migrated once.
     """
     
     def __init__(self, db_path: str = "annotations.db", json_backup_path: str = "highscore_list.json"):
         self.db_path = db_path
         self.json_backup_path = json_backup_path
-        self._lock = threading.Lock()  # Thread safety for concurrent requests
+        self._store = SQLiteStore(db_path)  # persistent per-thread connections, WAL
         self._initialized = False
+        self._revision = 0  # bumped by every apply_annotations(), in commit order
     
     def initialize(self):
         """Initialize the database - call this once at startup"""
         if self._initialized:
             return
             
-        with sqlite3.connect(self.db_path) as conn:
-            # Store the entire JSON structure as a single document
+        with self._store.write() as conn:
+            # legacy: the entire JSON structure as a single document, only read for migration
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS json_data (
                     key TEXT PRIMARY KEY,
@@ -33,128 +39,344 @@ class DatabaseManager:
                     updated_at TEXT
                 )
             """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS users (
+                    username TEXT PRIMARY KEY,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    last_annotation TEXT
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_class_counts (
+                    username TEXT NOT NULL,
+                    class_name TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (username, class_name)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS user_pair_state (
+                    username TEXT NOT NULL,
+                    pair_id TEXT NOT NULL,
+                    class_name TEXT NOT NULL,
+                    updated_at TEXT,
+                    PRIMARY KEY (username, pair_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS leaderboard_meta (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_annotations INTEGER NOT NULL,
+                    created_at TEXT,
+                    last_updated TEXT
+                )
+            """)
+
+            # idempotency keys of client events that were already applied
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_events (
+                    event_id TEXT PRIMARY KEY,
+                    received_at TEXT
+                )
+            """)
+
+            # the meta row doubles as "migration done" marker
+            if conn.execute("SELECT 1 FROM leaderboard_meta WHERE id = 1").fetchone() is None:
+                self._migrate(conn)
             
-            # Check if we have data
-            cursor = conn.execute("SELECT value FROM json_data WHERE key = 'main'")
-            result = cursor.fetchone()
-            
-            if not result:
-                # Try to migrate from existing JSON file
-                self._migrate_from_json(conn)
-            
-            conn.commit()
         
         self._initialized = True
         print(f"[DATABASE] Initialized SQLite database at {self.db_path}")
     
-    def read_data(self) -> Dict[str, Any]:
+    # ---------------- writes ----------------
+
+    def _apply(self, conn, username: str, pair_id: str, new_class: str, now: str):
+        """Same counting rules as the old JSON implementation, as row deltas."""
+        row = conn.execute(
+            "SELECT class_name FROM user_pair_state WHERE username = ? AND pair_id = ?",
+            (username, pair_id),
+        ).fetchone()
+        old_class = row[0] if row else None
+
+        is_new_pair = old_class is None
+        class_changed = old_class != new_class
+
+        total_delta = 0
+        class_deltas = {}
+
+        if new_class == "no_annotation":
+            # Remove previous class if changing to "no_annotation"
+            if old_class and old_class != "no_annotation":
+                total_delta -= 1
+                class_deltas[old_class] = -1
+            if is_new_pair or class_changed:
+                class_deltas[new_class] = class_deltas.get(new_class, 0) + 1
+        else:
+            if is_new_pair or old_class == "no_annotation":
+                total_delta += 1
+            elif class_changed:
+                # Changing from one real class to another
+                class_deltas[old_class] = -1
+            if is_new_pair or class_changed:
+                class_deltas[new_class] = class_deltas.get(new_class, 0) + 1
+
+        conn.execute("""
+            INSERT INTO users (username, total, last_annotation) VALUES (?, ?, ?)
+            ON CONFLICT(username) DO UPDATE SET total = total + excluded.total, last_annotation = excluded.last_annotation
+        """, (username, total_delta, now))
+
+        for class_name, delta in class_deltas.items():
+            conn.execute("""
+                INSERT INTO user_class_counts (username, class_name, count) VALUES (?, ?, ?)
+                ON CONFLICT(username, class_name) DO UPDATE SET count = count + excluded.count
+            """, (username, class_name, delta))
+            if delta < 0:
+                conn.execute(
+                    "DELETE FROM user_class_counts WHERE username = ? AND class_name = ? AND count <= 0",
+                    (username, class_name),
+                )
+
+        # Always track the pair's latest state
+        conn.execute("""
+            INSERT INTO user_pair_state (username, pair_id, class_name, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(username, pair_id) DO UPDATE SET class_name = excluded.class_name, updated_at = excluded.updated_at
+        """, (username, pair_id, new_class, now))
+
+        conn.execute(
+            "UPDATE leaderboard_meta SET total_annotations = total_annotations + ?, last_updated = ? WHERE id = 1",
+            (total_delta, now),
+        )
+
+    def apply_annotations(self, annotations: List[Tuple[str, str, str]]) -> Dict[str, Any]:
         """
-        Read data - exact same interface as your JSON version!
-        Returns: dict with 'users', 'totalAnnotations', 'lastUpdated'
+        Apply (username, pair_id, class_name) events in order, in one transaction.
+        Returns the touched users' stats afterwards plus "grandTotal", "lastUpdated" and
+        "revision", which increases in commit order (callers may see results out of order).
         """
         if not self._initialized:
             self.initialize()
-            
-        with self._lock:  # Thread safety
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.execute("SELECT value FROM json_data WHERE key = 'main'")
-                result = cursor.fetchone()
-                
-                if result:
-                    return json.loads(result[0])
-                else:
-                    # Return empty structure if no data
-                    return {
-                        "users": {},
-                        "totalAnnotations": 0,
-                        "lastUpdated": datetime.now().isoformat()
-                    }
-    
-    def write_data(self, data: Dict[str, Any]):
-        """
-        Write data - exact same interface as your JSON version!
-        Args: data dict with 'users', 'totalAnnotations', 'lastUpdated'
-        """
+
+        with self._store.write() as conn:  # commits on success, rolls back on error
+            return self._apply_all(conn, annotations)
+
+    def _apply_all(self, conn, annotations: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+        now = datetime.now().isoformat()
+        for username, pair_id, class_name in annotations:
+            self._apply(conn, username, pair_id, class_name, now)
+
+        names = sorted({a[0] for a in annotations})
+        users = self._user_rows(conn, names)
+        grand_total, last_updated = conn.execute(
+            "SELECT total_annotations, last_updated FROM leaderboard_meta WHERE id = 1"
+        ).fetchone()
+        self._revision += 1  # under the write lock, so in commit order
+        return {"users": users, "grandTotal": grand_total, "lastUpdated": last_updated, "revision": self._revision}
+
+    @staticmethod
+    def _user_rows(conn, names=None):
+        """{username: {"total", "classes", "lastAnnotation"}} for the given users (all if None)."""
+        where, params = "", []
+        if names is not None:
+            if not names:
+                return {}
+            where, params = f" WHERE username IN ({','.join('?' * len(names))})", list(names)
+
+        users = {
+            username: {"total": total, "classes": {}, "lastAnnotation": last_annotation}
+            for username, total, last_annotation in conn.execute(
+                "SELECT username, total, last_annotation FROM users" + where, params
+            )
+        }
+        for username, class_name, count in conn.execute(
+            "SELECT username, class_name, count FROM user_class_counts" + where, params
+        ):
+            users[username]["classes"][class_name] = count
+        return users
+
+    # ---------------- reads ----------------
+
+    def get_leaderboard(self) -> Dict[str, Any]:
+        """Users with totals and class counts, sorted by total (descending)."""
         if not self._initialized:
             self.initialize()
-            
-        with self._lock:  # Thread safety
-            with sqlite3.connect(self.db_path) as conn:
-                now = datetime.now().isoformat()
-                
-                # Update or insert the main data
-                conn.execute("""
-                    INSERT OR REPLACE INTO json_data (key, value, updated_at) 
-                    VALUES ('main', ?, ?)
-                """, (json.dumps(data, indent=2), now))
-                
-                conn.commit()
-    
-    def _migrate_from_json(self, conn):
-        """Migrate data from existing JSON file if it exists"""
-        if not os.path.exists(self.json_backup_path):
-            # No existing file, create empty structure
-            initial_data = {
-                "users": {},
-                "totalAnnotations": 0,
-                "lastUpdated": datetime.now().isoformat()
+
+        with self._store.read() as conn:
+            users = self._user_rows(conn)
+            total, last_updated = conn.execute(
+                "SELECT total_annotations, last_updated FROM leaderboard_meta WHERE id = 1"
+            ).fetchone()
+
+        leaderboard = [{"username": username, **stats} for username, stats in users.items()]
+        leaderboard.sort(key=lambda x: x["total"], reverse=True)
+        return {
+            "leaderboard": leaderboard,
+            "totalAnnotations": total,
+            "lastUpdated": last_updated,
+        }
+
+    def get_pair_states(self, username: str, pair_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+        """{pair_id: (class_name, updated_at)} for the given pairs the user has a state for (primary key lookups)."""
+        if not self._initialized:
+            self.initialize()
+
+        found = {}
+        with self._store.read() as conn:
+            for i in range(0, len(pair_ids), 500):
+                chunk = pair_ids[i:i + 500]
+                rows = conn.execute(f"""
+                    SELECT pair_id, class_name, updated_at FROM user_pair_state
+                    WHERE username = ? AND pair_id IN ({','.join('?' * len(chunk))})
+                """, [username, *chunk]).fetchall()
+                found.update((pair_id, (class_name, updated_at)) for pair_id, class_name, updated_at in rows)
+        return found
+
+    def read_data(self) -> Dict[str, Any]:
+        """
+        The full document in the old JSON layout (including every user's pairs).
+        Returns: dict with 'users', 'totalAnnotations', 'lastUpdated'
+        """
+        board = self.get_leaderboard()
+
+        users = {}
+        for entry in board["leaderboard"]:
+            users[entry["username"]] = {
+                "total": entry["total"],
+                "classes": entry["classes"],
+                "lastAnnotation": entry["lastAnnotation"],
+                "pairs": {},
+                "pairTimestamps": {},
             }
-            
-            conn.execute("""
-                INSERT INTO json_data (key, value, created_at, updated_at) 
-                VALUES ('main', ?, ?, ?)
-            """, (
-                json.dumps(initial_data, indent=2), 
-                datetime.now().isoformat(),
-                datetime.now().isoformat()
-            ))
-            
+
+        with self._store.read() as conn:
+            for username, pair_id, class_name, updated_at in conn.execute(
+                "SELECT username, pair_id, class_name, updated_at FROM user_pair_state"
+            ):
+                user = users.setdefault(username, {
+                    "total": 0, "classes": {}, "lastAnnotation": None, "pairs": {}, "pairTimestamps": {}
+                })
+                user["pairs"][pair_id] = class_name
+                if updated_at:
+                    user["pairTimestamps"][pair_id] = updated_at
+
+        return {
+            "users": users,
+            "totalAnnotations": board["totalAnnotations"],
+            "lastUpdated": board["lastUpdated"],
+        }
+
+    # ---------------- migration ----------------
+
+    def _migrate(self, conn):
+        """One-shot import of the old JSON document (json_data 'main' or highscore_list.json)."""
+        now = datetime.now().isoformat()
+
+        row = conn.execute("SELECT value FROM json_data WHERE key = 'main'").fetchone()
+        if row:
+            print("[DATABASE] Migrating json_data 'main' to normalized tables...")
+            data = json.loads(row[0])
+        elif os.path.exists(self.json_backup_path):
+            print(f"[DATABASE] Migrating from {self.json_backup_path}...")
+            with open(self.json_backup_path, 'r') as f:
+                data = json.load(f)
+        else:
+            data = None
+
+        if data is None:
+            conn.execute(
+                "INSERT INTO leaderboard_meta (id, total_annotations, created_at, last_updated) VALUES (1, 0, ?, ?)",
+                (now, now),
+            )
             print("[DATABASE] Created new empty database")
             return
-        
-        # Migrate from existing JSON file
-        print(f"[DATABASE] Migrating from {self.json_backup_path}...")
-        
-        with open(self.json_backup_path, 'r') as f:
-            json_data = json.load(f)
-        
-        conn.execute("""
-            INSERT INTO json_data (key, value, created_at, updated_at) 
-            VALUES ('main', ?, ?, ?)
-        """, (
-            json.dumps(json_data, indent=2),
-            datetime.now().isoformat(),
-            datetime.now().isoformat()
-        ))
-        
-        # Backup the original file
-        backup_name = f"{self.json_backup_path}.backup"
-        os.rename(self.json_backup_path, backup_name)
-        print(f"[DATABASE] Migration complete! Original file backed up as {backup_name}")
+
+        for username, user in data.get("users", {}).items():
+            conn.execute(
+                "INSERT INTO users (username, total, last_annotation) VALUES (?, ?, ?)",
+                (username, user.get("total", 0), user.get("lastAnnotation")),
+            )
+            conn.executemany(
+                "INSERT INTO user_class_counts (username, class_name, count) VALUES (?, ?, ?)",
+                [(username, c, n) for c, n in user.get("classes", {}).items()],
+            )
+            timestamps = user.get("pairTimestamps", {})
+            conn.executemany(
+                "INSERT INTO user_pair_state (username, pair_id, class_name, updated_at) VALUES (?, ?, ?, ?)",
+                [(username, pid, c, timestamps.get(pid)) for pid, c in user.get("pairs", {}).items()],
+            )
+
+        conn.execute(
+            "INSERT INTO leaderboard_meta (id, total_annotations, created_at, last_updated) VALUES (1, ?, ?, ?)",
+            (data.get("totalAnnotations", 0), now, data.get("lastUpdated") or now),
+        )
+
+        if row:
+            # keep the old document around, but out of the way
+            conn.execute("UPDATE json_data SET key = 'main_migrated', updated_at = ? WHERE key = 'main'", (now,))
+        else:
+            backup_name = f"{self.json_backup_path}.backup"
+            os.rename(self.json_backup_path, backup_name)
+            print(f"[DATABASE] Original file backed up as {backup_name}")
+        print(f"[DATABASE] Migration complete: {len(data.get('users', {}))} users")
     
+    def apply_events(self, event_ids: List[str], handle: Callable[[Set[str]], Tuple[List[str], List[Tuple[str, str, str]]]],
+                     keep_days: int = 30) -> Dict[str, Any]:
+        """
+        Idempotent client events, in one transaction: handle(new_ids) gets the event_ids not applied
+        before and returns (applied ids, annotations); the annotations are applied and the ids marked
+        processed before the commit. A concurrent resend of the same batch waits for the write lock and
+        then sees them as applied; an error marks nothing. Returns what apply_annotations() returns.
+        """
+        if not self._initialized:
+            self.initialize()
+
+        with self._store.write() as conn:
+            seen = set()
+            for i in range(0, len(event_ids), 500):
+                chunk = event_ids[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT event_id FROM processed_events WHERE event_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                seen.update(row[0] for row in rows)
+
+            applied, annotations = handle(set(event_ids) - seen)
+            result = self._apply_all(conn, annotations)
+
+            now = datetime.now()
+            conn.executemany(
+                "INSERT OR IGNORE INTO processed_events (event_id, received_at) VALUES (?, ?)",
+                [(event_id, now.isoformat()) for event_id in applied],
+            )
+            # clients retry for minutes or days, not months
+            conn.execute(
+                "DELETE FROM processed_events WHERE received_at < ?",
+                ((now - timedelta(days=keep_days)).isoformat(),),
+            )
+        return result
+
     def get_stats(self) -> Dict[str, Any]:
         """Get database statistics"""
         if not self._initialized:
             self.initialize()
             
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.execute("""
-                SELECT created_at, updated_at 
-                FROM json_data 
-                WHERE key = 'main'
-            """)
-            result = cursor.fetchone()
-            
-            data = self.read_data()
-            
-            return {
-                "database_path": self.db_path,
-                "database_created": result[0] if result else None,
-                "database_updated": result[1] if result else None,
-                "total_users": len(data["users"]),
-                "total_annotations": data["totalAnnotations"],
-                "last_updated": data["lastUpdated"]
-            }
+        with self._store.read() as conn:
+            created, updated, total = conn.execute("""
+                SELECT created_at, last_updated, total_annotations
+                FROM leaderboard_meta
+                WHERE id = 1
+            """).fetchone()
+            (users,) = conn.execute("SELECT COUNT(*) FROM users").fetchone()
+            (pairs,) = conn.execute("SELECT COUNT(*) FROM user_pair_state").fetchone()
+
+        return {
+            "database_path": self.db_path,
+            "database_created": created,
+            "database_updated": updated,
+            "total_users": users,
+            "total_pair_states": pairs,
+            "total_annotations": total,
+            "last_updated": updated
+        }
 
 # Create global instance
 _db_manager = DatabaseManager()
@@ -169,9 +391,19 @@ def read_data() -> Dict[str, Any]:
     """EXACT drop-in replacement for your read_data() function"""
     return _db_manager.read_data()
 
-def write_data(data: Dict[str, Any]):
-    """EXACT drop-in replacement for your write_data() function"""
-    _db_manager.write_data(data)
+def apply_annotations(annotations: List[Tuple[str, str, str]]) -> Dict[str, Any]:
+    """Apply (username, pair_id, class_name) events in one transaction."""
+    return _db_manager.apply_annotations(annotations)
+
+def read_leaderboard() -> Dict[str, Any]:
+    return _db_manager.get_leaderboard()
+
+def apply_events(event_ids: List[str], handle) -> Dict[str, Any]:
+    """Filter, apply and mark client events in one transaction, see DatabaseManager.apply_events."""
+    return _db_manager.apply_events(event_ids, handle)
+
+def get_pair_states(username: str, pair_ids: List[str]) -> Dict[str, Tuple[str, str]]:
+    return _db_manager.get_pair_states(username, pair_ids)
 
 # Bonus: Additional utility functions
 def get_database_stats():
@@ -0,0 +1,137 @@
+# leaderboard_view.py - in-memory leaderboard, updated on every write
+import asyncio
+import json
+import threading
+import uuid
+from typing import Any, Dict, Optional
+
+
+class LeaderboardView:
+    """
+    Materialized leaderboard.
+
+    Loaded once from the database, then patched with the user rows every write returns,
+    so reads never touch SQLite. Every change bumps `version`, which is also the ETag.
+    Writes commit in the threadpool and may be applied here out of order, so each user row
+    and the grand total only move forward in the write's revision.
+    Server-Sent-Event subscribers get the changed users as a delta.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._total = 0
+        self._last_updated: Optional[str] = None
+        self._revision = 0  # of the grand total / lastUpdated shown
+        self._user_revisions: Dict[str, int] = {}
+        self._boot = uuid.uuid4().hex[:8]  # ETags must not repeat across restarts
+        self.version = 0
+
+        self._body = None  # (version, serialized leaderboard) of the current version
+        self._subscribers = []  # (loop, asyncio.Queue)
+
+    def load(self, board: Dict[str, Any]):
+        """board: highscore_db.read_leaderboard()"""
+        with self._lock:
+            self._users = {
+                entry["username"]: {k: entry[k] for k in ("total", "classes", "lastAnnotation")}
+                for entry in board["leaderboard"]
+            }
+            self._total = board["totalAnnotations"]
+            self._last_updated = board["lastUpdated"]
+            self.version += 1
+            self._body = None
+
+    @property
+    def etag(self) -> str:
+        return f'"{self._boot}-{self.version}"'
+
+    def apply(self, result: Dict[str, Any]):
+        """result: return value of highscore_db.apply_annotations()"""
+        if not result["users"]:
+            return
+        revision = result["revision"]
+        with self._lock:
+            users = {
+                username: stats for username, stats in result["users"].items()
+                if revision > self._user_revisions.get(username, 0)
+            }
+            if not users and revision <= self._revision:
+                return  # a later write was applied already
+            for username in users:
+                self._user_revisions[username] = revision
+            self._users.update(users)
+            if revision > self._revision:
+                self._revision = revision
+                self._total = result["grandTotal"]
+                self._last_updated = result["lastUpdated"]
+            self.version += 1
+            self._body = None
+            delta = {
+                "version": self.version,
+                "users": users,
+                "totalAnnotations": self._total,
+                "lastUpdated": self._last_updated,
+            }
+            subscribers = list(self._subscribers)
+
+        message = _sse("delta", delta)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(self._offer, queue, message)
+
+    # ---------------- reads ----------------
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        leaderboard = [{"username": username, **stats} for username, stats in self._users.items()]
+        total, last_updated, version = self._total, self._last_updated, self.version
+        leaderboard.sort(key=lambda x: x["total"], reverse=True)
+        return {
+            "leaderboard": leaderboard,
+            "totalAnnotations": total,
+            "lastUpdated": last_updated,
+            "version": version,
+        }
+
+    def body(self):
+        """(etag, JSON of the snapshot), serialized once per version."""
+        with self._lock:
+            cached = self._body
+        if cached is None:
+            snapshot = self.snapshot()
+            cached = (snapshot["version"], json.dumps(snapshot).encode())
+            with self._lock:
+                if self.version == snapshot["version"]:
+                    self._body = cached
+        return f'"{self._boot}-{cached[0]}"', cached[1]
+
+    # ---------------- server-sent events ----------------
+
+    def subscribe(self, max_backlog=100):
+        """Queue of SSE messages for one client, starting with a full snapshot. Call from the event loop."""
+        queue = asyncio.Queue(maxsize=max_backlog)
+        loop = asyncio.get_running_loop()
+        # one lock for both: every apply() is either in the snapshot or sent as a delta
+        with self._lock:
+            queue.put_nowait(_sse("snapshot", self._snapshot()))
+            self._subscribers.append((loop, queue))
+        return queue
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers = [(l, q) for l, q in self._subscribers if q is not queue]
+
+    def _offer(self, queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # client stopped reading: drop it, EventSource reconnects and starts from a snapshot
+            self.unsubscribe(queue)
+            queue.dropped = True
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
@@ -1,24 +1,119 @@
+import threading
+from collections import Counter
+
 from review_pair_registry import get_all_pair_ids, get_pair_ids_by_annotator
-from review_db import get_reviewed_pair_ids_by_model, get_reviewed_pair_ids_by_annotator_and_model
+from review_db import add_review_listener, get_review_keys_by_model
 
 
-def get_left_for_review_pair_ids(model_name: str) -> set[str]:
-    all_pairs = get_all_pair_ids(model_name)
-    reviewed_pairs = get_reviewed_pair_ids_by_model(model_name)
+class ModelProgress:
+    """
+    Reviewed pairs of one model, kept in memory.
+
+    A pair counts as reviewed while at least one review of it belongs to this model,
+    so every (pair_id, reviewer) is tracked; adding or removing one is O(1) and idempotent.
+    """
+
+    def __init__(self, review_keys):
+        self._reviews = {}  # (pair_id, reviewer) -> annotated_by
+        self._pairs = Counter()  # pair_id -> reviews
+        self._by_annotator = {}  # annotated_by -> Counter(pair_id -> reviews)
+        self._total_ids = None  # pair ids of the registry the next count refers to
+        self._reviewed_in_total = 0
+        for pair_id, reviewer, annotated_by in review_keys:
+            self.add(pair_id, reviewer, annotated_by)
+
+    def add(self, pair_id, reviewer, annotated_by):
+        if (pair_id, reviewer) in self._reviews:
+            return
+        self._reviews[(pair_id, reviewer)] = annotated_by
+        self._pairs[pair_id] += 1
+        self._by_annotator.setdefault(annotated_by, Counter())[pair_id] += 1
+        if self._pairs[pair_id] == 1 and self._total_ids is not None and pair_id in self._total_ids:
+            self._reviewed_in_total += 1
+
+    def remove(self, pair_id, reviewer):
+        annotated_by = self._reviews.pop((pair_id, reviewer), None)
+        if annotated_by is None:
+            return
+        _decrement(self._pairs, pair_id)
+        _decrement(self._by_annotator[annotated_by], pair_id)
+        if pair_id not in self._pairs and self._total_ids is not None and pair_id in self._total_ids:
+            self._reviewed_in_total -= 1
+
+    def reviewed(self) -> int:
+        return len(self._pairs)
+
+    def reviewed_by_annotator(self, annotator: str) -> int:
+        return len(self._by_annotator.get(annotator, ()))
+
+    def reviewed_in(self, all_pair_ids) -> int:
+        """Reviewed pairs that are also in all_pair_ids; recounted only when the registry reloaded."""
+        if all_pair_ids is not self._total_ids:
+            self._total_ids = all_pair_ids
+            self._reviewed_in_total = sum(1 for pair_id in self._pairs if pair_id in all_pair_ids)
+        return self._reviewed_in_total
+
+
+def _decrement(counter, key):
+    counter[key] -= 1
+    if counter[key] <= 0:
+        del counter[key]
+
+
+class ReviewedIndex:
+    """ModelProgress per model, loaded from review_db on first use, then kept current by insert_review."""
 
-    return all_pairs - reviewed_pairs
+    def __init__(self):
+        # held while loading too, so no review can slip in between the load and the listener
+        self._lock = threading.Lock()
+        self._models = {}
+
+    def model(self, model_name: str) -> ModelProgress:
+        with self._lock:
+            progress = self._models.get(model_name)
+            if progress is None:
+                progress = ModelProgress(get_review_keys_by_model(model_name))
+                self._models[model_name] = progress
+            return progress
+
+    def on_review(self, pair_id, reviewer, annotated_by, model_name, old_model_name):
+        with self._lock:
+            if old_model_name is not None and old_model_name in self._models:
+                self._models[old_model_name].remove(pair_id, reviewer)
+            if model_name in self._models:
+                self._models[model_name].add(pair_id, reviewer, annotated_by)
+
+    def reviewed_in(self, model_name: str, all_pair_ids) -> int:
+        progress = self.model(model_name)
+        with self._lock:
+            return progress.reviewed_in(all_pair_ids)
+
+    def not_reviewed(self, model_name: str, all_pair_ids) -> set[str]:
+        progress = self.model(model_name)
+        with self._lock:
+            return {pair_id for pair_id in all_pair_ids if pair_id not in progress._pairs}
+
+
+_index = ReviewedIndex()
+add_review_listener(_index.on_review)
+
+
+def get_left_for_review_pair_ids(model_name: str) -> set[str]:
+    return _index.not_reviewed(model_name, get_all_pair_ids(model_name))
 
 
 def get_left_for_review_count(model_name: str) -> int:
-    return len(get_left_for_review_pair_ids(model_name))
+    all_pairs = get_all_pair_ids(model_name)
+    return len(all_pairs) - _index.reviewed_in(model_name, all_pairs)
 
 
-def get_annotator_review_progress(model_name: str, annotator: str) -> dict:
-    all_pairs = get_pair_ids_by_annotator(model_name, annotator)
-    reviewed = get_reviewed_pair_ids_by_annotator_and_model(model_name, annotator)
+def get_reviewed_count(model_name: str) -> int:
+    return _index.model(model_name).reviewed()
+
 
-    total = len(all_pairs)
-    reviewed_cnt = len(reviewed)
+def get_annotator_review_progress(model_name: str, annotator: str) -> dict:
+    total = len(get_pair_ids_by_annotator(model_name, annotator))
+    reviewed_cnt = _index.model(model_name).reviewed_by_annotator(annotator)
     left = total - reviewed_cnt
 
     return {
@@ -27,4 +122,4 @@ def get_annotator_review_progress(model_name: str, annotator: str) -> dict:
         "reviewed": reviewed_cnt,
         "left": left,
         "progress": reviewed_cnt / total if total > 0 else 0.0
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,150 @@
+"""
+load_benchmark.py - N simulated annotators against a local annotation_api_server
+
+    python highscore/load_benchmark.py --annotators 20 --seconds 20
+
+Starts uvicorn in a temporary directory (fresh annotations.db / reviews.db), lets every
+annotator post annotations and reviews while polling the stats pages like the web UI does,
+and prints p50 / p99 latency per route. Pass --url to measure a server that is already running,
+--seed N to fill the database with N annotations first (the stats routes scan them).
+"""
+import argparse
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+HERE = Path(__file__).resolve().parent
+CLASSES = ["no_change", "added", "removed", "moved", "unsure"]
+
+# (route label, method, weight)
+WORKLOAD = [
+    ("POST /api/annotate", "annotate", 6),
+    ("POST /api/inconsistent/review", "review", 2),
+    ("GET /api/leaderboard", "leaderboard", 1),
+    ("GET /api/inconsistent/userstats", "userstats", 1),
+    ("GET /api/inconsistent/modelstats", "modelstats", 1),
+    ("GET /api/database/stats", "dbstats", 1),
+]
+
+
+def start_server(port):
+    workdir = Path(tempfile.mkdtemp(prefix="highscore_bench_"))
+    (workdir / "static").symlink_to(HERE / "static")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "annotation_api_server:app",
+         "--app-dir", str(HERE), "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT,
+    )
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/api/leaderboard", timeout=1)
+            return proc, url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("uvicorn did not start")
+
+
+def seed(url, n, chunk=50_000):
+    session = requests.Session()
+    for start in range(0, n, chunk):
+        session.post(f"{url}/api/annotate/bulk", json={"annotations": [
+            {"username": f"seed{i % 50}", "pairId": f"seed-{i}", "className": CLASSES[i % len(CLASSES)]}
+            for i in range(start, min(n, start + chunk))
+        ]}).raise_for_status()
+    print(f"seeded {n} annotations")
+
+
+def annotator(url, name, deadline, latencies, lock):
+    session = requests.Session()
+    rng = random.Random(name)
+    actions = [action for _, action, weight in WORKLOAD for _ in range(weight)]
+    labels = {action: label for label, action, _ in WORKLOAD}
+    n = 0
+    while time.monotonic() < deadline:
+        action = rng.choice(actions)
+        n += 1
+        start = time.perf_counter()
+        if action == "annotate":
+            resp = session.post(f"{url}/api/annotate", json={
+                "username": name, "pairId": f"{name}-{n}", "className": rng.choice(CLASSES)})
+        elif action == "review":
+            resp = session.post(f"{url}/api/inconsistent/review", json={
+                "pairId": f"pair-{rng.randrange(100_000)}", "predicted": rng.choice(CLASSES),
+                "expected": rng.choice(CLASSES), "annotated_by": f"annotator{rng.randrange(10)}",
+                "reviewer": name, "decision": rng.choice(["accepted", "corrected"]),
+                "modelName": f"model{rng.randrange(3)}.pth"})
+        elif action == "leaderboard":
+            resp = session.get(f"{url}/api/leaderboard")
+        elif action == "userstats":
+            resp = session.get(f"{url}/api/inconsistent/userstats")
+        elif action == "modelstats":
+            resp = session.get(f"{url}/api/inconsistent/modelstats")
+        else:
+            resp = session.get(f"{url}/api/database/stats")
+        elapsed = time.perf_counter() - start
+        resp.raise_for_status()
+        with lock:
+            latencies[labels[action]].append(elapsed)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--annotators", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="benchmark a running server instead of starting one")
+    parser.add_argument("--seed", type=int, default=0, help="annotations to insert before measuring")
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if url is None:
+        proc, url = start_server(args.port)
+    try:
+        if args.seed:
+            seed(url, args.seed)
+        latencies = defaultdict(list)
+        lock = threading.Lock()
+        deadline = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(target=annotator, args=(url, f"user{i}", deadline, latencies, lock))
+            for i in range(args.annotators)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{args.annotators} annotators, {args.seconds:.0f}s")
+    print(f"{'route':36} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    everything = []
+    for label, _, _ in WORKLOAD:
+        values = latencies[label]
+        everything += values
+        if values:
+            print(f"{label:36} {len(values):8} {percentile(values, 50) * 1000:8.1f} {percentile(values, 99) * 1000:8.1f}")
+    if everything:
+        print(f"{'all':36} {len(everything):8} {percentile(everything, 50) * 1000:8.1f} "
+              f"{percentile(everything, 99) * 1000:8.1f}   ({len(everything) / args.seconds:.0f} req/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,19 @@
 # review_db.py
-import sqlite3
 from datetime import datetime
-import threading
+from sqlite_store import SQLiteStore
 
 class ReviewDatabaseManager:
     def __init__(self, db_path="reviews.db"):
         self.db_path = db_path
-        self._lock = threading.Lock()
+        self._store = SQLiteStore(db_path)
         self._initialized = False
+        self._listeners = []  # called after a review was inserted / changed, see add_listener
 
     def initialize(self):
         if self._initialized:
             return
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.write() as conn:
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS reviews (
                     pair_id TEXT NOT NULL,
@@ -39,7 +39,31 @@ class ReviewDatabaseManager:
             conn.execute("INSERT OR IGNORE INTO review_stats(decision, count) VALUES ('accepted', 0)")
             conn.execute("INSERT OR IGNORE INTO review_stats(decision, count) VALUES ('corrected', 0)")
 
-            conn.commit()
+            # like review_stats, but per model / reviewer / annotator; maintained by insert_review
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS review_counts (
+                    model_name TEXT NOT NULL,
+                    reviewer TEXT NOT NULL,
+                    annotated_by TEXT NOT NULL,
+                    decision TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (model_name, reviewer, annotated_by, decision)
+                ) WITHOUT ROWID
+            """)
+            if conn.execute("SELECT 1 FROM review_counts LIMIT 1").fetchone() is None:
+                # first start with this table: build it from the existing reviews
+                conn.execute("""
+                    INSERT INTO review_counts (model_name, reviewer, annotated_by, decision, count)
+                    SELECT COALESCE(model_name, 'unknown'), reviewer, annotated_by, COALESCE(decision, ''), COUNT(*)
+                    FROM reviews
+                    GROUP BY 1, 2, 3, 4
+                """)
+
+            # covering indexes for the per-model queries
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_model_reviewer ON reviews (model_name, reviewer, decision)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_model_annotator ON reviews (model_name, annotated_by, pair_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_model_expected ON reviews (model_name, expected, decision)")
+
 
         self._initialized = True
         print(f"[REVIEW_DB] Initialized review DB at {self.db_path}")
@@ -52,121 +76,154 @@ class ReviewDatabaseManager:
             self.initialize()
 
         normalized_new = (decision or "").strip().lower()
+        changes = []
+
+        def notify():
+            # after the COMMIT, so a listener never sees a review that is rolled back and a model
+            # loaded from the database meanwhile already has it; under the write lock, so listeners
+            # see changes of the same review in commit order
+            for change in changes:
+                for listener in self._listeners:
+                    try:
+                        listener(*change)
+                    except Exception as e:
+                        print(f"[WARN] review listener failed: {e}")
+
+        with self._store.write(after_commit=notify) as conn:
+
+            # DEBUG: Eingehende Daten
+            print("\n[DEBUG] --- insert_review call ---")
+            print("[DEBUG] incoming pair:", pair_id)
+            print("[DEBUG] incoming reviewer:", reviewer)
+            print("[DEBUG] incoming decision:", repr(normalized_new))
+
+
+            model_name = model_name or "unknown"
+            predicted = predicted or "unknown"
+            expected = expected or "unknown"
+
+            # 1. existierende Review holen
+            row = conn.execute("""
+                SELECT decision, model_name, annotated_by
+                FROM reviews
+                WHERE pair_id = ? AND reviewer = ?
+            """, (pair_id, reviewer)).fetchone()
 
-        with self._lock:
-            with sqlite3.connect(self.db_path) as conn:
-
-                # DEBUG: Eingehende Daten
-                print("\n[DEBUG] --- insert_review call ---")
-                print("[DEBUG] incoming pair:", pair_id)
-                print("[DEBUG] incoming reviewer:", reviewer)
-                print("[DEBUG] incoming decision:", repr(normalized_new))
-
+            if row is not None:
+                normalized_old = (row[0] or "").strip().lower()
 
-                model_name = model_name or "unknown"
-                predicted = predicted or "unknown"
-                expected = expected or "unknown"
+                print("[DEBUG] existing review found.")
+                print("[DEBUG] old decision:", repr(normalized_old))
 
-                # 1. existierende Review holen
-                row = conn.execute("""
-                    SELECT decision
-                    FROM reviews
-                    WHERE pair_id = ? AND reviewer = ?
-                """, (pair_id, reviewer)).fetchone()
-
-                if row is not None:
-                    normalized_old = (row[0] or "").strip().lower()
-
-                    print("[DEBUG] existing review found.")
-                    print("[DEBUG] old decision:", repr(normalized_old))
-
-                    # 2. gleiche decision → nichts tun
-                    if normalized_old == normalized_new:
-                        print("[INFO] Identical review detected → skipping")
-                        return
-
-                    print("[INFO] Decision changed → adjusting counters")
-
-                    # 3. Counter: alte -1
-                    conn.execute("""
-                        UPDATE review_stats
-                        SET count = count - 1
-                        WHERE decision = ?
-                    """, (normalized_old,))
-
-                    # 4. Counter: neue +1
-                    conn.execute("""
-                        INSERT INTO review_stats(decision, count)
-                        VALUES (?, 1)
-                        ON CONFLICT(decision)
-                        DO UPDATE SET count = count + 1
-                    """, (normalized_new,))
-
-                    # 5. Review updaten
-                    conn.execute("""
-                        UPDATE reviews
-                        SET predicted=?, expected=?, decision=?, model_name=?, timestamp=?
-                        WHERE pair_id=? AND reviewer=?
-                    """, (
-                        predicted,
-                        expected,
-                        normalized_new,
-                        model_name,
-                        datetime.now().isoformat(),
-                        pair_id,
-                        reviewer
-                    ))
-                    conn.commit()
-
-                    print(f"[INFO] Review updated: {normalized_old} → {normalized_new}")
-                    print("[DEBUG] counters updated.")
+                # 2. gleiche decision → nichts tun
+                if normalized_old == normalized_new:
+                    print("[INFO] Identical review detected → skipping")
                     return
 
-                else:
-                    print("[DEBUG] no existing review found → inserting new one.")
-
-                    # counter +1
-                    conn.execute("""
-                        INSERT INTO review_stats(decision, count)
-                        VALUES (?, 1)
-                        ON CONFLICT(decision)
-                        DO UPDATE SET count = count + 1
-                    """, (normalized_new,))
-
-                    # review Insert
-                    conn.execute("""
-                        INSERT INTO reviews
-                        (pair_id, annotated_by, reviewer, predicted, expected, decision, model_name, timestamp)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        pair_id,
-                        annotated_by,
-                        reviewer,
-                        predicted,
-                        expected,
-                        normalized_new,
-                        model_name,
-                        datetime.now().isoformat()
-                    ))
-                    conn.commit()
-
-                    print("[INFO] New review inserted.")
-                    print("[DEBUG] counter incremented.")
-
-
+                print("[INFO] Decision changed → adjusting counters")
+
+                # 3. Counter: alte -1
+                conn.execute("""
+                    UPDATE review_stats
+                    SET count = count - 1
+                    WHERE decision = ?
+                """, (normalized_old,))
+
+                # 4. Counter: neue +1
+                conn.execute("""
+                    INSERT INTO review_stats(decision, count)
+                    VALUES (?, 1)
+                    ON CONFLICT(decision)
+                    DO UPDATE SET count = count + 1
+                """, (normalized_new,))
+
+                self._count(conn, row[1] or "unknown", reviewer, row[2], row[0] or "", -1)
+                self._count(conn, model_name, reviewer, row[2], normalized_new, +1)
+
+                # 5. Review updaten
+                conn.execute("""
+                    UPDATE reviews
+                    SET predicted=?, expected=?, decision=?, model_name=?, timestamp=?
+                    WHERE pair_id=? AND reviewer=?
+                """, (
+                    predicted,
+                    expected,
+                    normalized_new,
+                    model_name,
+                    datetime.now().isoformat(),
+                    pair_id,
+                    reviewer
+                ))
+
+                print(f"[INFO] Review updated: {normalized_old} → {normalized_new}")
+                print("[DEBUG] counters updated.")
+                changes.append((pair_id, reviewer, row[2], model_name, row[1] or "unknown"))
+
+            else:
+                print("[DEBUG] no existing review found → inserting new one.")
+
+                # counter +1
+                conn.execute("""
+                    INSERT INTO review_stats(decision, count)
+                    VALUES (?, 1)
+                    ON CONFLICT(decision)
+                    DO UPDATE SET count = count + 1
+                """, (normalized_new,))
+                self._count(conn, model_name, reviewer, annotated_by, normalized_new, +1)
+
+                # review Insert
+                conn.execute("""
+                    INSERT INTO reviews
+                    (pair_id, annotated_by, reviewer, predicted, expected, decision, model_name, timestamp)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    pair_id,
+                    annotated_by,
+                    reviewer,
+                    predicted,
+                    expected,
+                    normalized_new,
+                    model_name,
+                    datetime.now().isoformat()
+                ))
+
+                print("[INFO] New review inserted.")
+                print("[DEBUG] counter incremented.")
+                changes.append((pair_id, reviewer, annotated_by, model_name, None))
+
+    def add_listener(self, listener):
+        """listener(pair_id, reviewer, annotated_by, model_name, old_model_name or None)"""
+        self._listeners.append(listener)
+
+
+
+    @staticmethod
+    def _count(conn, model_name, reviewer, annotated_by, decision, delta):
+        conn.execute("""
+            INSERT INTO review_counts (model_name, reviewer, annotated_by, decision, count)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(model_name, reviewer, annotated_by, decision)
+            DO UPDATE SET count = count + excluded.count
+        """, (model_name, reviewer, annotated_by, decision, delta))
+        if delta < 0:
+            conn.execute("""
+                DELETE FROM review_counts
+                WHERE model_name = ? AND reviewer = ? AND annotated_by = ? AND decision = ? AND count <= 0
+            """, (model_name, reviewer, annotated_by, decision))
 
     # ------------ ANALYTICS -----------------
+    # aggregates read review_counts (O(models x reviewers x annotators)), not reviews
 
     def get_user_stats(self):
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             cursor = conn.execute("""
                 SELECT reviewer,
-                    SUM(CASE WHEN decision='accepted' THEN 1 ELSE 0 END) AS accepted,
-                    SUM(CASE WHEN decision='corrected' THEN 1 ELSE 0 END) AS corrected
-                FROM reviews
+                    SUM(CASE WHEN decision='accepted' THEN count ELSE 0 END) AS accepted,
+                    SUM(CASE WHEN decision='corrected' THEN count ELSE 0 END) AS corrected
+                FROM review_counts
                 GROUP BY reviewer
             """)
 
@@ -184,12 +241,12 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             cursor = conn.execute("""
                 SELECT annotated_by,
-                    SUM(CASE WHEN decision='accepted' THEN 1 ELSE 0 END) AS accepted,
-                    SUM(CASE WHEN decision='corrected' THEN 1 ELSE 0 END) AS corrected
-                FROM reviews
+                    SUM(CASE WHEN decision='accepted' THEN count ELSE 0 END) AS accepted,
+                    SUM(CASE WHEN decision='corrected' THEN count ELSE 0 END) AS corrected
+                FROM review_counts
                 GROUP BY annotated_by
             """)
 
@@ -209,8 +266,8 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
-            (count,) = conn.execute("SELECT COUNT(*) FROM reviews").fetchone()
+        with self._store.read() as conn:
+            (count,) = conn.execute("SELECT COALESCE(SUM(count), 0) FROM review_counts").fetchone()
             return count
 
 
@@ -219,14 +276,14 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             cursor = conn.execute("""
                 SELECT
-                        COALESCE(model_name, 'unknown') AS model_name,
-                        SUM(CASE WHEN decision='accepted' THEN 1 ELSE 0 END),
-                        SUM(CASE WHEN decision='corrected' THEN 1 ELSE 0 END)
-                FROM reviews 
-                GROUP BY COALESCE(model_name, 'unknown')
+                        model_name,
+                        SUM(CASE WHEN decision='accepted' THEN count ELSE 0 END),
+                        SUM(CASE WHEN decision='corrected' THEN count ELSE 0 END)
+                FROM review_counts
+                GROUP BY model_name
             """)
 
             out = []
@@ -244,7 +301,7 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             cursor = conn.execute("""
                 SELECT
                     COALESCE(expected, 'unknown') AS class,
@@ -282,7 +339,7 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             rows = conn.execute("""
                 SELECT DISTINCT pair_id
                 FROM reviews
@@ -292,13 +349,26 @@ class ReviewDatabaseManager:
         return {row[0] for row in rows}
 
 
+    def get_review_keys_by_model(self, model_name: str) -> list[tuple]:
+        """(pair_id, reviewer, annotated_by) of every review of model_name"""
+        if not self._initialized:
+            self.initialize()
+
+        with self._store.read() as conn:
+            return conn.execute("""
+                SELECT pair_id, reviewer, annotated_by
+                FROM reviews
+                WHERE model_name = ?
+            """, (model_name,)).fetchall()
+
+
     def get_reviewed_pair_ids_by_annotator_and_model(
         self, model_name: str, annotator: str
     ) -> set[str]:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             rows = conn.execute("""
                 SELECT DISTINCT pair_id
                 FROM reviews
@@ -314,12 +384,12 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             cursor = conn.execute("""
                 SELECT reviewer,
-                    SUM(CASE WHEN decision='accepted' THEN 1 ELSE 0 END) AS accepted,
-                    SUM(CASE WHEN decision='corrected' THEN 1 ELSE 0 END) AS corrected
-                FROM reviews
+                    SUM(CASE WHEN decision='accepted' THEN count ELSE 0 END) AS accepted,
+                    SUM(CASE WHEN decision='corrected' THEN count ELSE 0 END) AS corrected
+                FROM review_counts
                 WHERE model_name = ?
                 GROUP BY reviewer
             """, (model_name,))
@@ -341,12 +411,12 @@ class ReviewDatabaseManager:
         if not self._initialized:
             self.initialize()
 
-        with sqlite3.connect(self.db_path) as conn:
+        with self._store.read() as conn:
             cursor = conn.execute("""
                 SELECT annotated_by,
-                    SUM(CASE WHEN decision='accepted' THEN 1 ELSE 0 END) AS accepted,
-                    SUM(CASE WHEN decision='corrected' THEN 1 ELSE 0 END) AS corrected
-                FROM reviews
+                    SUM(CASE WHEN decision='accepted' THEN count ELSE 0 END) AS accepted,
+                    SUM(CASE WHEN decision='corrected' THEN count ELSE 0 END) AS corrected
+                FROM review_counts
                 WHERE model_name = ?
                 GROUP BY annotated_by
             """, (model_name,))
@@ -376,6 +446,9 @@ def init_review_db():
 def insert_review(**kwargs):
     _review_manager.insert_review(**kwargs)
 
+def add_review_listener(listener):
+    _review_manager.add_listener(listener)
+
 def get_user_review_stats():
     return _review_manager.get_user_stats()
 
@@ -394,6 +467,9 @@ def get_model_class_stats(model_name):
 def get_reviewed_pair_ids_by_model(model_name: str) -> set[str]:
     return _review_manager.get_reviewed_pair_ids_by_model(model_name)
 
+def get_review_keys_by_model(model_name: str):
+    return _review_manager.get_review_keys_by_model(model_name)
+
 def get_reviewed_pair_ids_by_annotator_and_model(model_name, annotator):
     return _review_manager.get_reviewed_pair_ids_by_annotator_and_model(
         model_name, annotator
@@ -1,12 +1,19 @@
 # review_pair_registry.py
 import json
-from functools import lru_cache
+import os
+import sys
+import threading
+from collections import OrderedDict
 from pathlib import Path
 
 REVIEW_BATCH_DIR = Path(
     "/opt/datasets/change_detection/change_data/review_batches"
 )
 
+# models kept in memory at once, least recently used is dropped first
+MAX_CACHED_MODELS = 8
+
+
 def _model_to_json_path(model_name: str) -> Path:
 
     if not model_name.endswith(".pth"):
@@ -16,37 +23,93 @@ def _model_to_json_path(model_name: str) -> Path:
     return REVIEW_BATCH_DIR / json_name
 
 
-@lru_cache(maxsize=None)
-def _load_pairs(model_name: str) -> dict:
-    json_path = _model_to_json_path(model_name)
-
-    if not json_path.exists():
-        raise FileNotFoundError(f"Review JSON not found: {json_path}")
-
-    with json_path.open("r") as f:
-        data = json.load(f)
-
-    print(f"[REVIEW_REGISTRY] Loaded {len(data)} pairs for {model_name}")
-    return data
+class ModelPairs:
+    """
+    What the review endpoints need from one extractor output, without the entries themselves:
+    all pair ids and the pair ids per annotator, as frozensets of interned strings.
+    """
+
+    def __init__(self, data: dict):
+        by_annotator = {}
+        names = set()
+        for pair_id, entry in data.items():
+            annotator = entry.get("annotated_by") if isinstance(entry, dict) else None
+            if not isinstance(annotator, str):
+                continue
+            by_annotator.setdefault(annotator.strip().lower(), []).append(sys.intern(pair_id))
+            if annotator.strip():
+                names.add(annotator.strip())
+
+        self.pair_ids = frozenset(sys.intern(pair_id) for pair_id in data)
+        self.by_annotator = {name: frozenset(ids) for name, ids in by_annotator.items()}
+        self.annotators = sorted(names)
+
+
+class PairRegistry:
+    """
+    LRU cache of ModelPairs, keyed by model name.
+
+    Every lookup stats the JSON file; if mtime or size changed since it was loaded
+    (the extractor rewrote it), the model is loaded again.
+    """
+
+    def __init__(self, max_models: int = MAX_CACHED_MODELS):
+        self.max_models = max_models
+        self._lock = threading.Lock()
+        self._models = OrderedDict()  # model_name -> ((mtime_ns, size), ModelPairs)
+
+    def get(self, model_name: str) -> ModelPairs:
+        json_path = _model_to_json_path(model_name)
+        try:
+            st = os.stat(json_path)
+        except FileNotFoundError:
+            self.invalidate(model_name)
+            raise FileNotFoundError(f"Review JSON not found: {json_path}")
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            cached = self._models.get(model_name)
+            if cached is not None and cached[0] == stamp:
+                self._models.move_to_end(model_name)
+                return cached[1]
+
+        # parse outside the lock, other models stay readable meanwhile
+        with json_path.open("r") as f:
+            pairs = ModelPairs(json.load(f))
+        print(f"[REVIEW_REGISTRY] Loaded {len(pairs.pair_ids)} pairs for {model_name}")
+
+        with self._lock:
+            self._models[model_name] = (stamp, pairs)
+            self._models.move_to_end(model_name)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+        return pairs
+
+    def invalidate(self, model_name: str = None):
+        with self._lock:
+            if model_name is None:
+                self._models.clear()
+            else:
+                self._models.pop(model_name, None)
+
+
+_registry = PairRegistry()
 
 
 # -------- Public API --------
 
 def get_total_pairs(model_name: str) -> int:
-    return len(_load_pairs(model_name))
+    return len(_registry.get(model_name).pair_ids)
+
 
+def get_all_pair_ids(model_name: str) -> frozenset:
+    return _registry.get(model_name).pair_ids
 
-def get_all_pair_ids(model_name: str) -> set[str]:
-    return set(_load_pairs(model_name).keys())
 
+def get_pair_ids_by_annotator(model_name: str, annotator: str) -> frozenset:
+    return _registry.get(model_name).by_annotator.get(annotator.strip().lower(), frozenset())
 
-def get_pair_ids_by_annotator(model_name: str, annotator: str) -> set[str]:
-    data = _load_pairs(model_name)
-    annotator_norm = annotator.strip().lower()
 
-    return {
-        pair_id
-        for pair_id, entry in data.items()
-        if isinstance(entry.get("annotated_by"), str)
-           and entry["annotated_by"].strip().lower() == annotator_norm
-    }
+def get_annotators(model_name: str) -> list[str]:
+    """Annotator names as written in the extractor output (stripped), sorted."""
+    return _registry.get(model_name).annotators
@@ -0,0 +1,57 @@
+# sqlite_store.py - shared SQLite access for highscore_db and review_db
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SQLiteStore:
+    """
+    One persistent connection per thread (the FastAPI threadpool reuses its threads),
+    in WAL mode so readers never wait for the writer and the writer never waits for readers.
+
+    read():  no lock, every thread reads on its own connection
+    write(): one writer at a time (in this process), BEGIN IMMEDIATE ... COMMIT / ROLLBACK;
+             after_commit() runs once the COMMIT succeeded, still under the write lock
+
+    sqlite3 keeps compiled statements per connection (cached_statements), so with
+    persistent connections the queries are prepared once per thread, not once per call.
+    """
+
+    def __init__(self, db_path: str, cached_statements: int = 256, busy_timeout: float = 30.0):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.db_path,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints, WAL keeps it consistent
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def read(self):
+        yield self.connection()
+
+    @contextmanager
+    def write(self, after_commit=None):
+        with self._write_lock:
+            conn = self.connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+                if after_commit is not None:
+                    after_commit()
@@ -1,9 +1,65 @@
-// Fetch and display leaderboard
+// Latest leaderboard as { username: {total, classes, lastAnnotation} } + totals,
+// kept up to date by the /api/leaderboard/stream deltas
+let leaderboardState = null;
+
+// Fetch and display leaderboard (fallback when EventSource is not available).
+// The server sends an ETag, so unchanged polls are answered with 304 from the browser cache.
 async function updateLeaderboard() {
     try {
         const response = await fetch(`${API_URL}/api/leaderboard`);
-        const data = await response.json();
+        renderLeaderboard(await response.json());
+    } catch (error) {
+        showLeaderboardError(error);
+    }
+}
+
+// Subscribe to pushed leaderboard updates instead of polling
+function subscribeLeaderboard() {
+    const source = new EventSource(`${API_URL}/api/leaderboard/stream`);
+
+    source.addEventListener('snapshot', (event) => {
+        const data = JSON.parse(event.data);
+        leaderboardState = {
+            users: Object.fromEntries(data.leaderboard.map(({ username, ...stats }) => [username, stats])),
+            totalAnnotations: data.totalAnnotations,
+            lastUpdated: data.lastUpdated,
+        };
+        renderLeaderboard(data);
+    });
 
+    source.addEventListener('delta', (event) => {
+        if (!leaderboardState) return;
+        const delta = JSON.parse(event.data);
+        Object.assign(leaderboardState.users, delta.users);
+        leaderboardState.totalAnnotations = delta.totalAnnotations;
+        leaderboardState.lastUpdated = delta.lastUpdated;
+        renderLeaderboard(leaderboardFromState());
+    });
+
+    // EventSource reconnects by itself and starts again with a snapshot
+    source.onerror = () => console.warn('Leaderboard stream interrupted, reconnecting...');
+    return source;
+}
+
+function leaderboardFromState() {
+    const leaderboard = Object.entries(leaderboardState.users)
+        .map(([username, stats]) => ({ username, ...stats }))
+        .sort((a, b) => b.total - a.total);
+    return {
+        leaderboard,
+        totalAnnotations: leaderboardState.totalAnnotations,
+        lastUpdated: leaderboardState.lastUpdated,
+    };
+}
+
+function showLeaderboardError(error) {
+    console.error('Failed to fetch leaderboard:', error);
+    document.getElementById('leaderboardList').innerHTML = 
+        '<p style="color: red;">Failed to load leaderboard. Please try again later.</p>';
+}
+
+function renderLeaderboard(data) {
+    try {
         // Update total counter with animation
         const totalElement = document.getElementById('totalNumber');
         totalElement.classList.add('updating');
@@ -43,8 +99,6 @@ async function updateLeaderboard() {
         lastUpdated.textContent = `Last updated: ${updateTime.toLocaleString()}`;
 
     } catch (error) {
-        console.error('Failed to fetch leaderboard:', error);
-        document.getElementById('leaderboardList').innerHTML = 
-            '<p style="color: red;">Failed to load leaderboard. Please try again later.</p>';
+        showLeaderboardError(error);
     }
 }
\ No newline at end of file
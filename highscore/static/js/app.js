@@ -6,8 +6,15 @@ const REFRESH_INTERVAL = 5000; // Refresh every 5 seconds
 
 
 document.addEventListener("DOMContentLoaded", () => {
+    // Leaderboard is pushed by the server; poll only where EventSource is missing
+    const pushLeaderboard = !!window.EventSource;
+    if (pushLeaderboard) {
+        subscribeLeaderboard();
+    } else {
+        updateLeaderboard();
+    }
+
     // Initial load
-    updateLeaderboard();
     // updateInconsistentStats();
     updateModelClassStats();
     updateTotalReviewed();
@@ -15,7 +22,7 @@ document.addEventListener("DOMContentLoaded", () => {
 
     // Auto-refresh
     setInterval(() => {
-        updateLeaderboard();
+        if (!pushLeaderboard) updateLeaderboard();
         // updateInconsistentStats();
         updateModelClassStats();
         updateTotalReviewed();
@@ -0,0 +1,163 @@
+# unsure_index.py - pairs still marked unsure in the uploaded annotation files
+import json
+import os
+import threading
+from pathlib import Path
+
+from sqlite_store import SQLiteStore
+
+
+class UnsureIndex:
+    """
+    SQLite index of the unsure pairs (pair_state missing or "no_annotation") in
+    <annotations_dir>/<session_id>.json.
+
+    A background thread stats the directory every `rescan_interval` seconds and re-parses
+    only files whose mtime or size changed; call index_file() right after writing a file
+    to have it listed immediately. Listing reads only the index, one page at a time.
+    """
+
+    def __init__(self, annotations_dir, db_path="unsure_index.db", rescan_interval=30.0):
+        self.annotations_dir = Path(annotations_dir)
+        self.rescan_interval = rescan_interval
+        self._store = SQLiteStore(db_path)
+        self._thread = None
+
+        with self._store.write() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS unsure_pairs (
+                    session_id TEXT NOT NULL,
+                    pair_id INTEGER NOT NULL,
+                    session_path TEXT NOT NULL,
+                    im1_path TEXT NOT NULL,
+                    im2_path TEXT NOT NULL,
+                    PRIMARY KEY (session_id, pair_id)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS indexed_files (
+                    session_id TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+
+    # ---------------- indexing ----------------
+
+    def index_file(self, ann_file, stamp=None):
+        ann_file = Path(ann_file)
+        session_id = ann_file.stem
+        if stamp is None:
+            st = ann_file.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        try:
+            data = json.loads(ann_file.read_text())
+        except Exception as e:
+            print("[UNSURE] skip", ann_file, "->", e)
+            data = {}  # remember the stamp anyway, so a broken file is not re-read every scan
+
+        rows = list(_unsure_rows(session_id, data))
+        with self._store.write() as conn:
+            conn.execute("DELETE FROM unsure_pairs WHERE session_id = ?", (session_id,))
+            conn.executemany("INSERT INTO unsure_pairs VALUES (?, ?, ?, ?, ?)", rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO indexed_files (session_id, mtime_ns, size) VALUES (?, ?, ?)",
+                (session_id, *stamp),
+            )
+        return len(rows)
+
+    def refresh(self):
+        """Re-index new and changed files, drop deleted ones. Unchanged files are only stat()ed."""
+        with self._store.read() as conn:
+            known = {sid: (mtime, size) for sid, mtime, size in conn.execute("SELECT * FROM indexed_files")}
+
+        seen = set()
+        changed = 0
+        if self.annotations_dir.is_dir():
+            with os.scandir(self.annotations_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    session_id = entry.name[:-len(".json")]
+                    seen.add(session_id)
+                    st = entry.stat()
+                    stamp = (st.st_mtime_ns, st.st_size)
+                    if known.get(session_id) != stamp:
+                        self.index_file(entry.path, stamp)
+                        changed += 1
+
+        gone = [(sid,) for sid in known if sid not in seen]
+        if gone:
+            with self._store.write() as conn:
+                conn.executemany("DELETE FROM unsure_pairs WHERE session_id = ?", gone)
+                conn.executemany("DELETE FROM indexed_files WHERE session_id = ?", gone)
+        if changed or gone:
+            print(f"[UNSURE] re-indexed {changed} files, removed {len(gone)}")
+
+    def start(self):
+        """Refresh now and then every rescan_interval seconds, in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="unsure-index", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        stop = threading.Event()
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] unsure index refresh failed: {e}")
+            stop.wait(self.rescan_interval)
+
+    # ---------------- listing ----------------
+
+    def page(self, limit=1000, cursor=None):
+        """(items, next_cursor) ordered by session and pair id; next_cursor is None on the last page."""
+        after = _parse_cursor(cursor)
+        with self._store.read() as conn:
+            rows = conn.execute("""
+                SELECT session_id, pair_id, session_path, im1_path, im2_path
+                FROM unsure_pairs
+                WHERE (session_id, pair_id) > (?, ?)
+                ORDER BY session_id, pair_id
+                LIMIT ?
+            """, (*after, limit + 1)).fetchall()
+
+        items = [
+            {
+                "session_id": session_id,
+                "session_path": session_path,
+                "pair_id": pair_id,
+                "im1_url": f"/images/{im1}",
+                "im2_url": f"/images/{im2}",
+            }
+            for session_id, pair_id, session_path, im1, im2 in rows[:limit]
+        ]
+        next_cursor = f"{rows[limit - 1][0]}:{rows[limit - 1][1]}" if len(rows) > limit else None
+        return items, next_cursor
+
+
+def _unsure_rows(session_id, data):
+    meta_root = (data.get("_meta") or {}).get("root")  # optional; used for context only
+
+    for k, entry in data.items():
+        if k == "_meta" or not isinstance(entry, dict) or not k.isdigit():
+            continue
+        if entry.get("pair_state") not in (None, "no_annotation"):  # only unsure
+            continue
+        im1_rel = entry.get("im1_path")
+        im2_rel = entry.get("im2_path")
+        if not im1_rel or not im2_rel:
+            continue
+        yield session_id, int(k), meta_root or session_id, im1_rel, im2_rel
+
+
+def _parse_cursor(cursor):
+    """'<session_id>:<pair_id>' of the last item of the previous page"""
+    if not cursor:
+        return ("", -1)
+    session_id, _, pair_id = cursor.rpartition(":")
+    try:
+        return (session_id, int(pair_id))
+    except ValueError:
+        raise ValueError(f"invalid cursor: {cursor!r}")
@@ -0,0 +1,192 @@
+# batch_registry.py
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+ACTIVE_STATUSES = ("assigned", "in_progress")
+
+
+def item_key(item: Dict[str, Any]) -> str:
+    # key = store_session_path|pair_id (mirrors extractor upsert key)
+    return f"{item['store_session_path']}|{int(item['pair_id'])}"
+
+
+class BatchRegistry:
+    """
+    Index over all review_batch_*.json in batch_dir, read once at startup.
+
+    Keeps the keys assigned to any batch, the active batches per reviewer and which
+    batches already have results, so handing out a batch does not depend on how many
+    were written before. Batch payloads themselves stay on disk; only the active one a
+    reviewer asks for is read back.
+
+    Several server processes (uvicorn workers on one host) can share batch_dir: reserve() holds
+    an exclusive flock on state_dir/batches.lock and first replays state_dir/batches.log, the
+    append-only list of
+    batches and results the other workers wrote, so "find active batch / pick free items /
+    create" always decides on the current state and two reviewers never get the same item.
+    create() and results_uploaded() must run inside reserve(); they write the file, then
+    log it, then index it. state_dir must be on local disk (flock on NFS is not reliable);
+    it defaults to batch_dir.
+    """
+
+    def __init__(self, batch_dir: Path, results_path: Callable[[str, Optional[str]], Optional[Path]],
+                 state_dir: Optional[Path] = None):
+        self.batch_dir = Path(batch_dir)
+        self._results_path = results_path  # (batch_id, model_name) -> Path, or None if unknown
+        self.lock = threading.RLock()
+        state_dir = Path(state_dir) if state_dir is not None else self.batch_dir
+        self.lock_path = state_dir / "batches.lock"
+        self.log_path = state_dir / "batches.log"
+        self._log_offset = 0
+        self._lock_file = None
+        self._depth = 0  # reserve() is re-entrant within a thread, flock is taken once
+
+        self._assigned = set()
+        self._batches: Dict[str, Dict[str, Any]] = {}  # batch_id -> reviewer, batch_type, model_name, status
+        self._has_results = set()
+        self._active: Dict[str, List[str]] = {}  # reviewer -> batch ids, oldest first
+        self.load()
+
+    def _batch_path(self, batch_id: str) -> Path:
+        return self.batch_dir / f"review_batch_{batch_id}.json"
+
+    def load(self):
+        with self.reserve(catch_up=False):
+            self._assigned.clear()
+            self._batches.clear()
+            self._has_results.clear()
+            self._active.clear()
+            count = 0
+            for jf in sorted(self.batch_dir.glob("review_batch_*.json")):
+                try:
+                    data = json.loads(jf.read_text())
+                except Exception as e:
+                    print("[BATCH] skip", jf, "->", e)
+                    continue
+                self._index(data)
+                results = self._results_path(data["batch_id"], data.get("model_name"))
+                if results is not None and results.exists():
+                    self._results_done(data["batch_id"])
+                count += 1
+            # everything logged so far is in the files just read
+            self._log_offset = self.log_path.stat().st_size if self.log_path.exists() else 0
+            print(f"[BATCH] registry: {count} batches, {len(self._assigned)} assigned keys")
+
+    # ---------------- cross-process ----------------
+
+    @contextmanager
+    def reserve(self, catch_up: bool = True):
+        """Exclusive across threads and processes; the index is current inside."""
+        with self.lock:
+            if self._depth == 0:
+                self._lock_file = open(self.lock_path, "a")
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            self._depth += 1
+            try:
+                if catch_up:
+                    self._catch_up()
+                yield self
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+                    self._lock_file.close()
+                    self._lock_file = None
+
+    def _catch_up(self):
+        """Apply what other processes logged since we last looked."""
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                new = f.read()
+        except FileNotFoundError:
+            return
+        end = new.rfind(b"\n") + 1  # a torn last line (crashed writer) is skipped
+        for line in new[:end].decode().splitlines():
+            event, _, batch_id = line.partition(" ")
+            if event == "batch" and batch_id not in self._batches:
+                path = self._batch_path(batch_id)
+                try:
+                    self._index(json.loads(path.read_text()))
+                except Exception as e:
+                    print("[BATCH] skip", path, "->", e)
+            elif event == "results":
+                self._results_done(batch_id)
+        self._log_offset += end
+
+    def _log(self, event: str, batch_id: str):
+        with open(self.log_path, "ab") as f:
+            f.write(f"{event} {batch_id}\n".encode())
+            f.flush()
+            os.fsync(f.fileno())
+            self._log_offset = f.tell()  # we hold the flock, so nobody else appended in between
+
+    def _index(self, batch: Dict[str, Any]):
+        batch_id = batch["batch_id"]
+        for item in batch.get("items", []):
+            self._assigned.add(item_key(item))
+        self._batches[batch_id] = {
+            "reviewer": batch.get("reviewer"),
+            "batch_type": batch.get("batch_type"),
+            "model_name": batch.get("model_name"),
+            "status": batch.get("status"),
+        }
+        if batch.get("status") in ACTIVE_STATUSES:
+            self._active.setdefault(batch.get("reviewer"), []).append(batch_id)
+
+    def _results_done(self, batch_id: str):
+        self._has_results.add(batch_id)
+        meta = self._batches.get(batch_id)
+        if meta is not None:
+            active = self._active.get(meta["reviewer"], [])
+            if batch_id in active:
+                active.remove(batch_id)
+
+    # ---------------- queries ----------------
+
+    def is_assigned(self, key: str) -> bool:
+        return key in self._assigned
+
+    def model_name(self, batch_id: str) -> Optional[str]:
+        meta = self._batches.get(batch_id)
+        return meta["model_name"] if meta else None
+
+    def has_results(self, batch_id: str) -> bool:
+        return batch_id in self._has_results
+
+    def find_active(self, user: str, batch_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Oldest batch of `user` (of `batch_type`) without results, as stored on disk."""
+        with self.lock:
+            candidates = [
+                batch_id for batch_id in self._active.get(user, [])
+                if not batch_type or self._batches[batch_id]["batch_type"] == batch_type
+            ]
+        for batch_id in candidates:
+            path = self._batch_path(batch_id)
+            try:
+                data = json.loads(path.read_text())
+            except Exception as e:
+                print("[BATCH] skip", path, "->", e)
+                continue
+            data["_path"] = str(path)
+            return data
+        return None
+
+    # ---------------- updates ----------------
+
+    def create(self, payload: Dict[str, Any], write: Callable[[Path, Dict[str, Any]], None]):
+        """Write a new batch with `write(path, payload)`, log it, then index it."""
+        with self.reserve():
+            write(self._batch_path(payload["batch_id"]), payload)
+            self._log("batch", payload["batch_id"])
+            self._index(payload)
+
+    def results_uploaded(self, batch_id: str):
+        with self.reserve():
+            self._log("results", batch_id)
+            self._results_done(batch_id)
@@ -0,0 +1,171 @@
+# extractor_store.py
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class ExtractorStore:
+    """
+    SQLite copy of the extractor output (batches_<model>/<model>.json), one row per record.
+
+    A model's file is imported once and again only when its mtime or size changes. The
+    key, annotator and image-existence columns are computed on import, so picking a batch
+    is an indexed query over unassigned records with both images, in file order.
+    """
+
+    def __init__(self, db_path: Path, image_exists: Callable[[str], bool],
+                 is_assigned: Callable[[str], bool] = lambda key: False, recheck_interval: float = 300.0):
+        self.image_exists = image_exists  # relative image path -> bool, e.g. ImageCatalog.exists
+        self.is_assigned = is_assigned
+        self.recheck_interval = recheck_interval
+        self._rechecked: Dict[str, float] = {}  # model -> time.monotonic() of the last missing-image recheck
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(Path(db_path), timeout=30, check_same_thread=False)  # shared by all workers
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS records (
+                model TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                annotator TEXT,
+                im1_path TEXT NOT NULL,
+                im2_path TEXT NOT NULL,
+                images_exist INTEGER NOT NULL,
+                assigned INTEGER NOT NULL,
+                record TEXT NOT NULL,
+                PRIMARY KEY (model, seq)
+            )
+        """)
+        self._conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_records_open ON records (model, annotator, seq)
+            WHERE assigned = 0 AND images_exist = 1
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_records_key ON records (model, key)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                model TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def ensure(self, model: str, path: Path) -> bool:
+        """Import `path` for `model` if it is new or changed. False if the file does not exist."""
+        try:
+            st = Path(path).stat()
+        except OSError:
+            return False
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            row = self._conn.execute("SELECT mtime_ns, size FROM sources WHERE model = ?", (model,)).fetchone()
+            if row != stamp:
+                self._import(model, Path(path), stamp)
+            elif time.monotonic() - self._rechecked.get(model, 0.0) > self.recheck_interval:
+                self._recheck_missing(model)
+        return True
+
+    def _recheck_missing(self, model: str):
+        """Records whose images were missing on import: pick up the ones that arrived since."""
+        rows = self._conn.execute(
+            "SELECT seq, im1_path, im2_path FROM records WHERE model = ? AND images_exist = 0", (model,)
+        ).fetchall()
+        found = [(model, seq) for seq, raw1, raw2 in rows if self.image_exists(raw1) and self.image_exists(raw2)]
+        if found:
+            self._conn.executemany("UPDATE records SET images_exist = 1 WHERE model = ? AND seq = ?", found)
+            self._conn.commit()
+            print(f"[InconsistentBatch] {len(found)} records of {model} have their images now")
+        self._rechecked[model] = time.monotonic()
+
+    def _import(self, model: str, path: Path, stamp):
+        try:
+            raw = json.loads(path.read_text())
+        except Exception as e:
+            print("[INCONSISTENT] read error:", e)
+            return
+        records = raw.values() if isinstance(raw, dict) else raw if isinstance(raw, list) else []
+
+        rows = []
+        for seq, rec in enumerate(records):
+            row = _row(rec, self.image_exists)
+            if row is None:
+                continue
+            key, annotator, raw1, raw2, images_exist = row
+            rows.append((model, seq, key, annotator, raw1, raw2, images_exist,
+                         int(self.is_assigned(key)), json.dumps(rec)))
+
+        self._conn.execute("DELETE FROM records WHERE model = ?", (model,))
+        self._conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self._conn.execute("INSERT OR REPLACE INTO sources (model, mtime_ns, size) VALUES (?, ?, ?)", (model, *stamp))
+        self._conn.commit()
+        self._rechecked[model] = time.monotonic()
+        missing = sum(1 for r in rows if not r[6])
+        print(f"[InconsistentBatch] imported {len(rows)} records for {model} ({missing} with missing images)")
+
+    def take(self, model: str, size: int, selected_users: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """First `size` open records of `model` (file order), optionally only those of selected_users."""
+        users = list(selected_users or [])
+        where = "model = ? AND assigned = 0 AND images_exist = 1"
+        params: List[Any] = [model]
+        if users:
+            where += f" AND annotator IN ({','.join('?' * len(users))})"
+            params += users
+
+        out = []
+        after = -1
+        while len(out) < size:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT seq, key, record FROM records WHERE {where} AND seq > ? ORDER BY seq LIMIT ?",
+                    (*params, after, size * 2),
+                ).fetchall()
+            if not rows:
+                break
+            for seq, key, record in rows:
+                after = seq
+                if self.is_assigned(key):  # assigned by a batch written after the import
+                    continue
+                out.append(json.loads(record))
+                if len(out) >= size:
+                    break
+        return out
+
+    def mark_assigned(self, model: str, keys: Iterable[str]):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE records SET assigned = 1 WHERE model = ? AND key = ?", [(model, k) for k in keys]
+            )
+            self._conn.commit()
+
+
+def record_images(rec: Dict[str, Any]):
+    raw1 = rec.get("im1_path") or f"{rec['store_session_path']}/{rec['im1_name']}"
+    raw2 = rec.get("im2_path") or f"{rec['store_session_path']}/{rec['im2_name']}"
+    return raw1, raw2
+
+
+def record_key(rec: Dict[str, Any]) -> str:
+    return f"{rec.get('store_session_path')}|{int(rec.get('pair_id', -1))}"
+
+
+def record_annotator(rec: Dict[str, Any]):
+    return rec.get("annotated_by", {}) or rec.get("unsure_by", {}) or rec.get("reviewed_by", {})
+
+
+def _row(rec, image_exists: Callable[[str], bool]):
+    if not isinstance(rec, dict):
+        return None
+    try:
+        raw1, raw2 = record_images(rec)
+        key = record_key(rec)
+    except (KeyError, TypeError, ValueError):
+        return None
+    annotator = record_annotator(rec)
+    images_exist = image_exists(raw1) and image_exists(raw2)
+    # selected_users are names; anything else never matches a filter
+    return key, annotator if isinstance(annotator, str) else None, raw1, raw2, int(images_exist)
@@ -0,0 +1,188 @@
+# image_catalog.py
+import os
+import posixpath
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from PIL import Image
+
+
+class ImageCatalog:
+    """
+    Server-side index of the images under IMAGES_DIR, keyed by relative path.
+
+    exists() / stat() answer from an in-memory map of (mtime_ns, bytes), filled by a
+    background scanner (start()) and persisted in the `files` table, so a restart does not
+    wait for a full walk of the (NFS) image tree. A path the map does not know is stat()ed
+    once and added, so images uploaded between two scans are found too; a path that is not
+    there either is remembered as missing until the next scan. Processes that
+    share the database but do not scan themselves pick up the scanner's map with reload().
+
+    size() returns verified dimensions: entries are checked against mtime/size, and opening
+    with PIL only parses the header, pixels are never decoded.
+    """
+
+    def __init__(self, images_dir: Path, db_path: Path):
+        self.images_dir = Path(images_dir)
+        self.db_path = Path(db_path)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._scanned_at = None
+        self._missing = set()  # stat()ed and not found since the map was last replaced
+
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)  # shared by all workers
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                bytes INTEGER NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)")
+        self._conn.commit()
+
+        self._files: Dict[str, Tuple[int, int]] = {
+            path: (mtime_ns, size) for path, mtime_ns, size in self._conn.execute("SELECT * FROM files")
+        }
+
+    # ---------------- lookups ----------------
+
+    def stat(self, rel_path: str) -> Optional[Tuple[int, int]]:
+        """(mtime_ns, bytes) of IMAGES_DIR/rel_path, or None if it does not exist."""
+        rel_path = _normalize(rel_path)
+        entry = self._files.get(rel_path)
+        if entry is not None:
+            return entry
+        if rel_path in self._missing:
+            return None
+        try:
+            st = (self.images_dir / rel_path).stat()
+        except OSError:
+            with self._lock:
+                self._missing.add(rel_path)
+            return None
+        entry = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            self._files[rel_path] = entry
+            self._conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (rel_path, *entry))
+            self._conn.commit()
+        return entry
+
+    def exists(self, rel_path: str) -> bool:
+        return self.stat(rel_path) is not None
+
+    def size(self, rel_path: str) -> Optional[Tuple[int, int]]:
+        """(width, height) of IMAGES_DIR/rel_path, or None if missing/unreadable."""
+        rel_path = _normalize(rel_path)
+        stat = self.stat(rel_path)
+        if stat is None:
+            return None
+        mtime_ns, size = stat
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, bytes, width, height FROM images WHERE path = ?", (rel_path,)
+            ).fetchone()
+        if row and row[0] == mtime_ns and row[1] == size:
+            return (row[2], row[3])
+
+        path = self.images_dir / rel_path
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+        except Exception as e:
+            print(f"[CATALOG] cannot read {path}: {e}")
+            return None
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO images (path, mtime_ns, bytes, width, height) VALUES (?, ?, ?, ?, ?)",
+                (rel_path, mtime_ns, size, width, height),
+            )
+            self._conn.commit()
+        return (width, height)
+
+    # ---------------- scanning ----------------
+
+    def scan(self):
+        """Walk IMAGES_DIR once and replace the map; only the differences are written to sqlite."""
+        start = time.monotonic()
+        found: Dict[str, Tuple[int, int]] = {}
+        stack = [""]
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                with os.scandir(self.images_dir / rel_dir) as entries:
+                    for entry in entries:
+                        rel = posixpath.join(rel_dir, entry.name) if rel_dir else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(rel)
+                            elif entry.is_file():
+                                st = entry.stat()
+                                found[rel] = (st.st_mtime_ns, st.st_size)
+                        except OSError:
+                            continue
+            except OSError as e:
+                print(f"[CATALOG] cannot list {self.images_dir / rel_dir}: {e}")
+
+        scanned_at = time.time()
+        with self._lock:
+            old = self._files
+            changed = [(path, *entry) for path, entry in found.items() if old.get(path) != entry]
+            # from the table, not the map: other processes add the paths they stat()ed there too
+            gone = [(path,) for (path,) in self._conn.execute("SELECT path FROM files") if path not in found]
+            self._files = found
+            self._missing = set()
+            self._scanned_at = scanned_at
+            self._conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", changed)
+            self._conn.executemany("DELETE FROM files WHERE path = ?", gone)
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('scanned_at', ?)", (scanned_at,))
+            self._conn.commit()
+        print(f"[CATALOG] scanned {len(found)} images in {time.monotonic() - start:.1f}s "
+              f"({len(changed)} new/changed, {len(gone)} gone)")
+
+    def reload(self):
+        """Take over the map the last scan() wrote (in any process); a no-op if nothing was scanned since."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'scanned_at'").fetchone()
+            if row is None or row[0] == self._scanned_at:
+                return
+            self._files = {
+                path: (mtime_ns, size) for path, mtime_ns, size in self._conn.execute("SELECT * FROM files")
+            }
+            self._missing = set()
+            self._scanned_at = row[0]
+
+    def start(self, interval: float = 300.0):
+        """scan() now and then every `interval` seconds, in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="image-catalog", daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        stop = threading.Event()
+        while True:
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"[WARN] image catalog scan failed: {e}")
+            stop.wait(interval)
+
+
+def _normalize(rel_path: str) -> str:
+    # "a/./b", "a//b" and "a/x/../b" are the same file, like (IMAGES_DIR / raw).resolve() made them
+    return posixpath.normpath(rel_path)
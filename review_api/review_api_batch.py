@@ -4,18 +4,24 @@ from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from datetime import datetime
 import subprocess
+import fcntl
+import threading
+import time
 import json
-from typing import Any, Dict, Iterable, List, Optional
+import os
+from typing import Any, Dict, List, Optional
 import uuid
 from collections import Counter
 from validate_uploads import validate_results_payload
+from image_catalog import ImageCatalog
+from batch_registry import BatchRegistry, item_key
+from unsure_queue import UnsureQueue
+from extractor_store import ExtractorStore, record_images
 import logging
 from loguru import logger
 
 
 
-_missing_counter = Counter()
-
 app = FastAPI(title="Unsure Review API (read-only)")
 
 # --- Hardcoded paths on ml01 ---
@@ -30,6 +36,15 @@ INCONSISTENT_PATH = CHANGE_ROOT / "review_batches"
 BATCH_DIR = CHANGE_ROOT / "review_batches"
 BATCH_DIR.mkdir(parents=True, exist_ok=True)
 
+# Local disk for the sqlite indexes below: SQLite's WAL and file locking are not reliable on
+# the NFS mount under /opt/datasets. They only cache what is in CHANGE_ROOT and rebuild if missing.
+STATE_DIR = Path(os.getenv("REVIEW_API_STATE_DIR", "/var/lib/review_api"))
+STATE_DIR.mkdir(parents=True, exist_ok=True)
+
+# existence / mtime / size of every image under IMAGES_DIR, plus verified dimensions sent with
+# every batch item; batch builders ask it instead of stat()ing the NFS mount per pair
+image_catalog = ImageCatalog(IMAGES_DIR, STATE_DIR / "image_catalog.sqlite")
+
 MODELS_DIR = Path("/opt/software/change_detection/models")
 REVIEW_BATCH_DIR = Path("/opt/datasets/change_detection/change_data/review_batches")
 
@@ -68,32 +83,31 @@ def list_available_models():
 # Serve image files at /images/<relative_path>
 app.mount("/images", StaticFiles(directory=str(IMAGES_DIR)), name="images")
 
-def _iter_annotation_files():
-    """Yield (user, file Path) for all *.json inside each user dir."""
-    for user_dir in USER_DIRS:
-        if not user_dir.exists():
-            continue
-        user = user_dir.name
-        for jf in sorted(user_dir.glob("*.json")):
-            yield user, jf
+def _unsure_item_usable(rec: Dict[str, Any]) -> bool:
+    if not (image_catalog.exists(rec["im1_path"]) and image_catalog.exists(rec["im2_path"])):
+        print(f"[UnsureBatch] Missing: {rec['im1_path']} or {rec['im2_path']} (user={rec['unsure_by']['name']})")
+        return False
+    return True
 
-def _sorted_unsure_unassigned(exclude_user) -> List[Dict[str, Any]]:
-    assigned = _assigned_keys()
-    items: List[Dict[str, Any]] = []
-    for rec in list_unsure_pairs(limit=999999):  # reuse your existing code
-        k = f"{rec['store_session_path']}|{int(rec['pair_id'])}"
-        if k in assigned:
-            continue
-        if exclude_user and rec.get("unsure_by", {}).get("name") == exclude_user:
-            continue 
-        items.append(rec)
-    # sort if needed (e.g. FIFO by pair_id or no sorting)
-    def _ts(x):
-        try:
-            return datetime.fromisoformat(x.get("timestamp") or "")
-        except Exception:
-            return datetime.min
-    items.sort(key=_ts, reverse=False)
+
+def _next_unsure_items(exclude_user, size: int) -> List[Dict[str, Any]]:
+    """Oldest unassigned unsure pairs (FIFO by file timestamp) not annotated by exclude_user."""
+    items = []
+    for rec in unsure_queue.take(size, exclude_user=exclude_user, usable=_unsure_item_usable):
+        raw1, raw2 = rec["im1_path"], rec["im2_path"]
+        items.append({
+            "session_id": rec["store_session_path"],   # keep full store/session combo
+            "store_session_path": rec["store_session_path"],
+            "pair_id": rec["pair_id"],
+            "im1_name": Path(raw1).name,
+            "im2_name": Path(raw2).name,
+            "im1_url": _image_url(raw1),
+            "im2_url": _image_url(raw2),
+            "image1_size": image_catalog.size(raw1),
+            "image2_size": image_catalog.size(raw2),
+            "unsure_by": rec["unsure_by"],
+            "timestamp": rec["timestamp"],
+        })
     return items
 
 @app.get("/unsure/batch")
@@ -101,110 +115,33 @@ def get_or_create_unsure_batch(user: str, size: int = 50):
     if not user:
         raise HTTPException(400, "user is required")
 
-    active = _find_active_batch_for_user(user, batch_type="unsure")
-    if active:
-        return active
-
-    pool = _sorted_unsure_unassigned(exclude_user=user)
-    if not pool:
-        return {"message": "no unassigned unsure items left", "items": [], "count": 0}
-
-    batch_items = pool[:max(1, int(size))]
-    batch_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
-    payload = {
-        "batch_id": batch_id,
-        "batch_type": "unsure",
-        "created": datetime.now().isoformat(),
-        "status": "assigned",
-        "reviewer": user,
-        "size_requested": int(size),
-        "count": len(batch_items),
-        "items": batch_items,
-        "results": {},
-    }
-    _write_json_atomic(_batch_path(batch_id), payload)
+    # one reservation at a time (across workers), so two requests can't hand out the same items
+    with batch_registry.reserve():
+        active = _find_active_batch_for_user(user, batch_type="unsure")
+        if active:
+            return active
+
+        batch_items = _next_unsure_items(exclude_user=user, size=max(1, int(size)))
+        if not batch_items:
+            return {"message": "no unassigned unsure items left", "items": [], "count": 0}
+
+        batch_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        payload = {
+            "batch_id": batch_id,
+            "batch_type": "unsure",
+            "created": datetime.now().isoformat(),
+            "status": "assigned",
+            "reviewer": user,
+            "size_requested": int(size),
+            "count": len(batch_items),
+            "items": batch_items,
+            "results": {},
+        }
+        batch_registry.create(payload, _write_json_atomic)
+        unsure_queue.remove(item_key(it) for it in batch_items)
     return payload
 
 
-def list_unsure_pairs(limit: int = 999999):
-    global _missing_counter
-    _missing_counter = Counter()
-
-    out = []
-    for user, jf in _iter_annotation_files():
-        try:
-            data = json.loads(jf.read_text())
-        except Exception as e:
-            print("[UNSURE] skip", jf, "->", e)
-            continue
-
-        for k, entry in data.items():
-            if k == "_meta":
-                continue
-            ps = entry.get("pair_state")
-            if ps not in (None, "no_annotation"):
-                continue
-
-            raw1 = entry.get("im1_path")
-            raw2 = entry.get("im2_path")
-            if not raw1 or not raw2:
-                continue
-
-            p1 = (IMAGES_DIR / raw1).resolve()
-            p2 = (IMAGES_DIR / raw2).resolve()
-            if not (p1.exists() and p2.exists()):
-                print(f"[UnsureBatch] Missing: {p1} or {p2} (user={user})")
-                _missing_counter[user] += 1
-                continue
-
-            # 🔑 Normalize session/store path from the relative image path
-            store_session_path = str(Path(raw1).parent.parent.as_posix())
-            session_id = store_session_path   # keep full store/session combo
-
-            file_ts = datetime.fromtimestamp(jf.stat().st_mtime).isoformat()
-
-            out.append({
-                "session_id": session_id,
-                "store_session_path": store_session_path,
-                "pair_id": int(k),
-                "im1_name": Path(raw1).name,
-                "im2_name": Path(raw2).name,
-                "im1_url": _image_url(raw1),
-                "im2_url": _image_url(raw2),
-                "unsure_by": {"name": user},
-                "timestamp": file_ts,
-            })
-
-            if len(out) >= limit:
-                return out
-
-    if _missing_counter:
-        print("[UnsureBatch] Missing images summary:")
-        for usr, cnt in _missing_counter.items():
-            print(f"  {usr}: {cnt} missing images")
-
-    return out
-
-
-def _records_from_inconsistent(path: Path) -> Iterable[Dict[str, Any]]:
-    """
-    Reads inconsistent_reviews.json which our extractor writes as a dict {key: record}.
-    Supports list fallback just in case.
-    """
-    if not path.exists():
-        return []
-    try:
-        raw = json.loads(path.read_text())
-    except Exception as e:
-        print("[INCONSISTENT] read error:", e)
-        return []
-    if isinstance(raw, dict):
-        return raw.values()
-    if isinstance(raw, list):
-        return raw
-    return []
-
-
 def _image_url(rel_path: Optional[str]) -> Optional[str]:
     if not rel_path:
         return None
@@ -236,69 +173,24 @@ def _write_json_atomic(path: Path, payload: Dict[str, Any]) -> None:
     tmp.replace(path)
 
 
-def _all_batches() -> List[Dict[str, Any]]:
-    out = []
-    for jf in sorted(BATCH_DIR.glob("review_batch_*.json")):
-        try:
-            data = json.loads(jf.read_text())
-            data["_path"] = str(jf)
-            out.append(data)
-        except Exception as e:
-            print("[BATCH] skip", jf, "->", e)
-    return out
-
-
-def _assigned_keys() -> set:
-    """Collect keys already assigned to any batch to avoid duplicates across users."""
-    keys = set()
-    for b in _all_batches():
-        for it in b.get("items", []):
-            # key = store_session_path|pair_id (mirrors extractor upsert key)
-            k = f"{it['store_session_path']}|{int(it['pair_id'])}"
-            keys.add(k)
-    return keys
-
-
-def _sorted_inconsistent_unassigned(selected_users, selected_model) -> List[Dict[str, Any]]:
-    assigned = _assigned_keys()
-    items: List[Dict[str, Any]] = []
-    for rec in _records_from_inconsistent(INCONSISTENT_PATH / f"batches_{selected_model}" / f"{selected_model}.json"):
-        raw1 = rec.get("im1_path") or f"{rec['store_session_path']}/{rec['im1_name']}"
-        raw2 = rec.get("im2_path") or f"{rec['store_session_path']}/{rec['im2_name']}"
-        if not raw1 or not raw2:
-            continue
-
-        p1 = (IMAGES_DIR / raw1).resolve()
-        p2 = (IMAGES_DIR / raw2).resolve()
-        if not (p1.exists() and p2.exists()):
-            print(f"[InconsistentBatch] Missing: {p1} or {p2}")
-            continue
-
-        # Normalize session/store path from relative image path
-        store_session_path = rec.get("store_session_path")
-        # session_id = store_session_path
+def _inconsistent_path(selected_model) -> Path:
+    return INCONSISTENT_PATH / f"batches_{selected_model}" / f"{selected_model}.json"
 
-        k = f"{store_session_path}|{int(rec.get('pair_id', -1))}"
 
-        if k in assigned:
-            logger.info(f"{selected_users} already assigned")
-            continue
-        annotator = (
-            rec.get("annotated_by", {})
-            or rec.get("unsure_by", {})
-            or rec.get("reviewed_by", {})
-        )
-
-        if selected_users and annotator not in selected_users:
+def _next_inconsistent_items(selected_users, selected_model, size: int) -> List[Dict[str, Any]]:
+    """First `size` unassigned extractor records of selected_model (file order) with both images."""
+    items: List[Dict[str, Any]] = []
+    for rec in extractor_store.take(selected_model, size, selected_users):
+        raw1, raw2 = record_images(rec)
+        # existence was checked on import; recheck the few we hand out
+        if not (image_catalog.exists(raw1) and image_catalog.exists(raw2)):
+            print(f"[InconsistentBatch] Missing: {raw1} or {raw2}")
             continue
 
-
-
         items.append({
-            # "session_id": session_id,
             "timestampExtractor": rec.get("timestampExtractor"),
             "timestampOriginalAnnotation": rec.get("timestampOriginalAnnotation"),
-            "store_session_path": store_session_path,
+            "store_session_path": rec.get("store_session_path"),
             "pair_id": int(rec.get("pair_id", -1)),
             "im1_url": _image_url(raw1),
             "im2_url": _image_url(raw2),
@@ -307,39 +199,20 @@ def _sorted_inconsistent_unassigned(selected_users, selected_model) -> List[Dict
             "annotated_by": rec.get("annotated_by") or {},
             "boxes_expected": rec.get("boxes_expected", []),
             "boxes_predicted": rec.get("boxes_predicted", []),
-            "image1_size": rec.get("image1_size"),
-            "image2_size": rec.get("image2_size"),
+            "image1_size": image_catalog.size(raw1) or rec.get("image1_size"),
+            "image2_size": image_catalog.size(raw2) or rec.get("image2_size"),
             "model_name": rec.get("model_name"),
             "confidence": rec.get("confidence"),
         })
-        logger.info(f"new batch created: {items}")
-        # logger.info("items:")
-        # logger.info(items)
-    # FIFO -> oldest first
-    def _ts(x):
-        try:
-            return datetime.fromisoformat(x.get("timestamp") or "")
-        except Exception:
-            return datetime.min
-    items.sort(key=_ts, reverse=False)
-    logger.info(f"new batch created: {items}")
+    logger.info(f"picked {len(items)} inconsistent items for model={selected_model} users={selected_users}")
     return items
 
 
 def _find_active_batch_for_user(user: str, batch_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    for b in _all_batches():
-        if b.get("reviewer") != user:
-            continue
-        if batch_type and b.get("batch_type") != batch_type:
-            continue
-        # check if result already exists
-        results_path = _results_path(b["batch_id"])
-        if results_path.exists():
-            continue  # batch already finished
-        if b.get("status") in ("assigned", "in_progress"):
-            logger.info(f"got active batch: {b}")
-            return b
-    return None
+    b = batch_registry.find_active(user, batch_type)
+    if b:
+        logger.info(f"got active batch: {b['batch_id']}")
+    return b
 
 
 
@@ -353,48 +226,48 @@ def get_or_create_inconsistent_batch(user: str, size: int = 5, selected_users: l
     if not user:
         raise HTTPException(400, "user is required")
 
-    # reuse existing active batch
-    active = _find_active_batch_for_user(user, batch_type="inconsistent")
-    if active:
-        logger.info("takes active batch")
-        return active
-
-    # create a new batch
-    pool = _sorted_inconsistent_unassigned(selected_users=selected_users, selected_model=selected_model)
-
-    logger.info("getting from pool")
-    if not pool:
-        return {"message": "no unassigned items left", "items": [], "count": 0}
-
-    batch_items = pool[:max(1, int(size))]
-    batch_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
-    payload = {
-        "batch_id": batch_id,
-        "batch_type": "inconsistent",
-        "created": datetime.now().isoformat(),
-        "status": "assigned",
-        "reviewer": user,
-        "size_requested": int(size),
-        "count": len(batch_items),
-        "items": batch_items,
-	    "model_name": batch_items[0].get("model_name") if batch_items else None,
-        "confidence": batch_items[0].get("confidence") if batch_items else None,
-        "results": {},  # client will POST corrections here
-    }
-    _write_json_atomic(_batch_path(batch_id), payload)
+    # (re-)import a changed extractor file before locking: it is a full json parse and bulk insert,
+    # and every worker's batch requests wait while the lock is held
+    extractor_ready = extractor_store.ensure(selected_model, _inconsistent_path(selected_model))
+
+    with batch_registry.reserve():
+        # reuse existing active batch
+        active = _find_active_batch_for_user(user, batch_type="inconsistent")
+        if active:
+            logger.info("takes active batch")
+            return active
+
+        # create a new batch
+        batch_items = []
+        if extractor_ready:
+            batch_items = _next_inconsistent_items(selected_users, selected_model, size=max(1, int(size)))
+        if not batch_items:
+            return {"message": "no unassigned items left", "items": [], "count": 0}
+
+        batch_id = datetime.now().strftime("%Y%m%d_%H%M%S_") + uuid.uuid4().hex[:6]
+        payload = {
+            "batch_id": batch_id,
+            "batch_type": "inconsistent",
+            "created": datetime.now().isoformat(),
+            "status": "assigned",
+            "reviewer": user,
+            "size_requested": int(size),
+            "count": len(batch_items),
+            "items": batch_items,
+            "model_name": batch_items[0].get("model_name") if batch_items else None,
+            "confidence": batch_items[0].get("confidence") if batch_items else None,
+            "results": {},  # client will POST corrections here
+        }
+        batch_registry.create(payload, _write_json_atomic)
+        extractor_store.mark_assigned(selected_model, (item_key(it) for it in batch_items))
     return payload
 
 
-def _results_path(batch_id: str) -> Path:
-    batch = _load_batch(batch_id)
-
-    model_name = batch.get("model_name")
-
-    base = Path("/opt/datasets/change_detection/change_data/review_batches")
-
+def _results_path_for(batch_id: str, model_name: Optional[str]) -> Optional[Path]:
     if not model_name:
-        raise ValueError(f"Batch {batch_id} has no model_name")
+        return None
 
+    base = Path("/opt/datasets/change_detection/change_data/review_batches")
 
     return (
             base
@@ -404,6 +277,54 @@ def _results_path(batch_id: str) -> Path:
         )
 
 
+def _results_path(batch_id: str) -> Path:
+    model_name = batch_registry.model_name(batch_id) or _load_batch(batch_id).get("model_name")
+    path = _results_path_for(batch_id, model_name)
+    if path is None:
+        raise ValueError(f"Batch {batch_id} has no model_name")
+    return path
+
+
+# assigned keys, active batches per reviewer and result flags of every batch written so far
+batch_registry = BatchRegistry(BATCH_DIR, _results_path_for, state_dir=STATE_DIR)
+
+# unassigned unsure pairs of all user dirs, oldest first; rebuilt incrementally as files change
+unsure_queue = UnsureQueue(USER_DIRS, STATE_DIR / "unsure_queue.sqlite", is_assigned=batch_registry.is_assigned)
+
+# extractor output per model, imported into sqlite once per file change
+extractor_store = ExtractorStore(STATE_DIR / "extractor_index.sqlite", image_catalog.exists, is_assigned=batch_registry.is_assigned)
+
+
+SCANNER_LOCK = STATE_DIR / "scanner.lock"
+_scanner_lock_file = None  # held open (and flock'ed) for the life of the scanning worker
+
+
+def _run_scanners(interval: float = 60.0):
+    """
+    Only one worker walks IMAGES_DIR and the user dirs: the one holding scanner.lock. The others
+    only read the sqlite files it writes, and take over when it exits (the lock goes with it).
+    """
+    global _scanner_lock_file
+    lock_file = open(SCANNER_LOCK, "a")
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            break
+        except BlockingIOError:
+            try:
+                image_catalog.reload()
+            except Exception as e:
+                print(f"[WARN] image catalog reload failed: {e}")
+            time.sleep(interval)
+    _scanner_lock_file = lock_file
+    print(f"[SCANNER] pid {os.getpid()} runs the image and unsure scans")
+    image_catalog.start()
+    unsure_queue.start()
+
+
+threading.Thread(target=_run_scanners, name="scanner-lock", daemon=True).start()
+
+
 
 
 
@@ -435,6 +356,7 @@ def upload_batch_results(batch_id: str, results: Dict[str, Any]):
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     _write_json_atomic(out_path, results)
+    batch_registry.results_uploaded(batch_id)
 
 
     return {"ok": True, "status": status, "count_results": len(results)}
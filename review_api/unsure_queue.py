@@ -0,0 +1,192 @@
+# unsure_queue.py
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class UnsureQueue:
+    """
+    Persistent queue of unassigned unsure pairs from <user_dir>/*.json, oldest file first.
+
+    refresh() stats the annotation files and re-parses only new or changed ones, replacing
+    that file's candidates. take() walks the queue in timestamp order and stops after `size`
+    usable items; remove() drops keys once they are in a batch. So handing out a batch costs
+    O(size) plus whatever it has to skip, not a parse and sort of every annotation file.
+    """
+
+    def __init__(self, user_dirs: Iterable[Path], db_path: Path,
+                 is_assigned: Callable[[str], bool] = lambda key: False):
+        self.user_dirs = [Path(d) for d in user_dirs]
+        self.db_path = Path(db_path)
+        self.is_assigned = is_assigned
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)  # shared by all workers
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS candidates (
+                seq INTEGER PRIMARY KEY,
+                key TEXT NOT NULL,
+                user TEXT NOT NULL,
+                source TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                pair_id INTEGER NOT NULL,
+                im1_path TEXT NOT NULL,
+                im2_path TEXT NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_candidates_order ON candidates (timestamp, seq)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_candidates_key ON candidates (key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_candidates_source ON candidates (source)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    # ---------------- building ----------------
+
+    def refresh(self):
+        """Re-read new and changed annotation files, forget deleted ones."""
+        with self._lock:
+            known = {path: (mtime, size) for path, mtime, size in self._conn.execute("SELECT * FROM sources")}
+
+        seen = set()
+        changed = 0
+        for user_dir in self.user_dirs:
+            if not user_dir.is_dir():
+                continue
+            with os.scandir(user_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith(".json") or not entry.is_file():
+                        continue
+                    seen.add(entry.path)
+                    st = entry.stat()
+                    if known.get(entry.path) != (st.st_mtime_ns, st.st_size):
+                        self._index_file(user_dir.name, Path(entry.path), st)
+                        changed += 1
+
+        gone = [(path,) for path in known if path not in seen]
+        if gone:
+            with self._lock:
+                self._conn.executemany("DELETE FROM candidates WHERE source = ?", gone)
+                self._conn.executemany("DELETE FROM sources WHERE path = ?", gone)
+                self._conn.commit()
+        if changed or gone:
+            print(f"[UnsureQueue] re-indexed {changed} files, removed {len(gone)}")
+
+    def _index_file(self, user: str, jf: Path, st: os.stat_result):
+        try:
+            data = json.loads(jf.read_text())
+        except Exception as e:
+            print("[UNSURE] skip", jf, "->", e)
+            data = {}
+
+        file_ts = datetime.fromtimestamp(st.st_mtime).isoformat()
+        rows = []
+        for k, entry in data.items():
+            if k == "_meta" or not isinstance(entry, dict) or not k.isdigit():
+                continue
+            if entry.get("pair_state") not in (None, "no_annotation"):
+                continue
+            raw1 = entry.get("im1_path")
+            raw2 = entry.get("im2_path")
+            if not raw1 or not raw2:
+                continue
+            key = f"{_store_session_path(raw1)}|{int(k)}"
+            if self.is_assigned(key):
+                continue
+            rows.append((key, user, str(jf), file_ts, int(k), raw1, raw2))
+
+        with self._lock:
+            self._conn.execute("DELETE FROM candidates WHERE source = ?", (str(jf),))
+            self._conn.executemany("""
+                INSERT INTO candidates (key, user, source, timestamp, pair_id, im1_path, im2_path)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sources (path, mtime_ns, size) VALUES (?, ?, ?)",
+                (str(jf), st.st_mtime_ns, st.st_size),
+            )
+            self._conn.commit()
+
+    def start(self, interval: float = 30.0):
+        """refresh() now and then every `interval` seconds, in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="unsure-queue", daemon=True)
+            self._thread.start()
+
+    def _run(self, interval):
+        stop = threading.Event()
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[WARN] unsure queue refresh failed: {e}")
+            stop.wait(interval)
+
+    # ---------------- handing out ----------------
+
+    def take(self, size: int, exclude_user: Optional[str] = None,
+             usable: Callable[[Dict[str, Any]], bool] = lambda rec: True, chunk: int = 256) -> List[Dict[str, Any]]:
+        """
+        Oldest `size` candidates not annotated by `exclude_user` and accepted by `usable`
+        (e.g. both images exist). Candidates stay queued until remove().
+        """
+        out = []
+        taken = set()  # the same pair can be unsure in two users' files
+        after = ("", -1)
+        while len(out) < size:
+            with self._lock:
+                rows = self._conn.execute("""
+                    SELECT seq, key, user, timestamp, pair_id, im1_path, im2_path
+                    FROM candidates
+                    WHERE (timestamp, seq) > (?, ?) AND user != ?
+                    ORDER BY timestamp, seq
+                    LIMIT ?
+                """, (*after, exclude_user or "", chunk)).fetchall()
+            if not rows:
+                break
+            for seq, key, user, timestamp, pair_id, raw1, raw2 in rows:
+                after = (timestamp, seq)
+                if key in taken or self.is_assigned(key):
+                    continue
+                rec = {
+                    "key": key,
+                    "store_session_path": _store_session_path(raw1),
+                    "pair_id": pair_id,
+                    "im1_path": raw1,
+                    "im2_path": raw2,
+                    "unsure_by": {"name": user},
+                    "timestamp": timestamp,
+                }
+                if not usable(rec):
+                    continue
+                out.append(rec)
+                taken.add(key)
+                if len(out) >= size:
+                    break
+        return out
+
+    def remove(self, keys: Iterable[str]):
+        with self._lock:
+            self._conn.executemany("DELETE FROM candidates WHERE key = ?", [(k,) for k in keys])
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+
+def _store_session_path(raw1: str) -> str:
+    # 🔑 Normalize session/store path from the relative image path
+    return str(Path(raw1).parent.parent.as_posix())
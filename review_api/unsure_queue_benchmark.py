@@ -0,0 +1,112 @@
+"""
+unsure_queue_benchmark.py - handing out an unsure batch: full scan vs. UnsureQueue
+
+    python review_api/unsure_queue_benchmark.py --pairs 1000000
+
+Writes a synthetic corpus (4 user dirs, every pair unsure) to a temp dir and times
+- the old way: parse every annotation file, two exists() and one file stat() per pair,
+  sort everything by timestamp, take `size` (image sizes left out, which favours it),
+- UnsureQueue: cold build, refresh with nothing changed, refresh after one file changed,
+  and take(size) + remove() of one batch.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from unsure_queue import UnsureQueue
+
+USERS = ["almas", "niklas", "santiago", "sarah"]
+IMAGES_PER_SESSION = 4
+
+
+def write_corpus(root: Path, pairs: int, pairs_per_file: int):
+    images = root / "images"
+    n_files = max(1, pairs // pairs_per_file)
+    for f in range(n_files):
+        user = USERS[f % len(USERS)]
+        session = f"store_{f % 50}/session_{f}/top"  # key = store/session, see _store_session_path
+        (images / session).mkdir(parents=True, exist_ok=True)
+        for i in range(IMAGES_PER_SESSION):
+            (images / session / f"{i}.jpeg").touch()
+        data = {"_meta": {"user": user}}
+        for k in range(pairs_per_file):
+            data[str(k)] = {
+                "pair_state": None,
+                "im1_path": f"{session}/{k % IMAGES_PER_SESSION}.jpeg",
+                "im2_path": f"{session}/{(k + 1) % IMAGES_PER_SESSION}.jpeg",
+            }
+        user_dir = root / user
+        user_dir.mkdir(exist_ok=True)
+        (user_dir / f"session_{f}.json").write_text(json.dumps(data))
+        os.utime(user_dir / f"session_{f}.json", (1_700_000_000 + f, 1_700_000_000 + f))
+    return images, [root / u for u in USERS], n_files * pairs_per_file
+
+
+def full_scan(images: Path, user_dirs, size, exclude_user):
+    """What _sorted_unsure_unassigned did before the queue."""
+    out = []
+    for user_dir in user_dirs:
+        for jf in sorted(user_dir.glob("*.json")):
+            data = json.loads(jf.read_text())
+            for k, entry in data.items():
+                if k == "_meta" or entry.get("pair_state") not in (None, "no_annotation"):
+                    continue
+                raw1, raw2 = entry["im1_path"], entry["im2_path"]
+                if not ((images / raw1).resolve().exists() and (images / raw2).resolve().exists()):
+                    continue
+                if user_dir.name == exclude_user:
+                    continue
+                out.append({
+                    "store_session_path": str(Path(raw1).parent.parent.as_posix()),
+                    "pair_id": int(k),
+                    "timestamp": datetime.fromtimestamp(jf.stat().st_mtime).isoformat(),
+                })
+    out.sort(key=lambda x: datetime.fromisoformat(x["timestamp"]))
+    return out[:size]
+
+
+def timed(label, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:44} {(time.perf_counter() - start) * 1000:10.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pairs", type=int, default=1_000_000)
+    parser.add_argument("--pairs-per-file", type=int, default=250)
+    parser.add_argument("--size", type=int, default=50)
+    parser.add_argument("--skip-full-scan", action="store_true")
+    args = parser.parse_args()
+
+    root = Path(tempfile.mkdtemp(prefix="unsure_bench_"))
+    try:
+        images, user_dirs, total = timed("write corpus", lambda: write_corpus(root, args.pairs, args.pairs_per_file))
+        print(f"{total} unsure pairs in {total // args.pairs_per_file} files")
+
+        if not args.skip_full_scan:
+            timed(f"full scan + sort, take {args.size}", lambda: full_scan(images, user_dirs, args.size, "sarah"))
+
+        queue = UnsureQueue(user_dirs, root / "unsure_queue.sqlite")
+        usable = lambda rec: (images / rec["im1_path"]).exists() and (images / rec["im2_path"]).exists()
+        timed("queue: cold build", queue.refresh)
+        timed("queue: refresh, nothing changed", queue.refresh)
+        changed = next(user_dirs[0].glob("*.json"))
+        changed.write_text(changed.read_text())
+        timed("queue: refresh, one file changed", queue.refresh)
+        batch = timed(f"queue: take {args.size}",
+                      lambda: queue.take(args.size, exclude_user="sarah", usable=usable))
+        timed(f"queue: remove {len(batch)}", lambda: queue.remove(rec["key"] for rec in batch))
+        print(f"{len(queue)} candidates left")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,14 @@ FONT_SCALING=2.5
 SERVER_AVAILABLE = None
 SERVER = "http://172.30.20.31:8010/"
 
+# background image prefetching (ui)
+PREFETCH_NEXT = 3       # pairs ahead of the current one
+PREFETCH_PREV = 1       # pairs behind the current one
+PREFETCH_WORKERS = 2
+IMAGE_CACHE_MB = 256    # budget for decoded, scaled images
+FLICKER_EXTRA_FRAME = None  # None, "diff" or "blend": extra frame shown while flickering
+SAVE_DEBOUNCE_S = 0.5   # annotation changes are written in the background at most this often
+
 # DATASET_NAME="complex"
 DATASET_NAME="gemuese_netz_sub"
 
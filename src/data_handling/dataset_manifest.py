@@ -0,0 +1,303 @@
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+from src.data_handling.image_size import probe_image_size
+
+MANIFEST_NAME = ".manifest.sqlite"
+
+
+def _image_sort_key(path):
+    return int(path.name.split("-")[0])
+
+
+def _mtime_ns(path):
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _read_session_flags(ann_file):
+    """(completed, usable) from an annotations.json, defaults if missing or broken."""
+    if not ann_file.exists():
+        return False, True
+    try:
+        with open(ann_file, "r") as f:
+            data = json.load(f)
+        meta = data.get("_meta", {})
+        return bool(meta.get("completed", False)), bool(meta.get("usable", True))
+    except Exception as e:
+        print(f"Warning: could not read {ann_file}: {e}")
+        return False, True
+
+
+class DatasetManifest:
+    """
+    SQLite index of the dataset tree (stores, sessions, ordered images, image sizes, session flags),
+    stored as .manifest.sqlite in the dataset root.
+
+    Updated incrementally: on startup only the root and store folders are stat'ed and re-listed
+    if their mtime changed. Session folders are checked when a session is opened.
+    """
+
+    def __init__(self, dataset_dir):
+        self.dataset_dir = Path(dataset_dir)
+        self.file = self.dataset_dir / MANIFEST_NAME
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(self.file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                store TEXT NOT NULL,
+                session TEXT NOT NULL,
+                dir_mtime_ns INTEGER,
+                ann_mtime_ns INTEGER,
+                completed INTEGER NOT NULL DEFAULT 0,
+                usable INTEGER NOT NULL DEFAULT 1,
+                PRIMARY KEY(store, session)
+            );
+            CREATE TABLE IF NOT EXISTS images (
+                store TEXT NOT NULL,
+                session TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                width INTEGER,
+                height INTEGER,
+                mtime_ns INTEGER,
+                bytes INTEGER,
+                PRIMARY KEY(store, session, name)
+            );
+            CREATE INDEX IF NOT EXISTS idx_images_order ON images(store, session, idx);
+        """)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    # ---------------- sessions ----------------
+
+    def _dir_changed(self, path):
+        """Return the new mtime if the folder changed since the last scan, else None."""
+        mtime = _mtime_ns(path)
+        row = self._conn.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (str(path),)).fetchone()
+        if row is not None and row[0] == mtime:
+            return None
+        return mtime
+
+    def _scan_store(self, store_dir, mtime):
+        on_disk = {p.name for p in store_dir.glob("session_*") if p.is_dir()}
+        known = {
+            row[0] for row in self._conn.execute(
+                "SELECT session FROM sessions WHERE store = ?", (store_dir.name,)
+            )
+        }
+
+        for session in known - on_disk:
+            self._conn.execute("DELETE FROM sessions WHERE store = ? AND session = ?", (store_dir.name, session))
+            self._conn.execute("DELETE FROM images WHERE store = ? AND session = ?", (store_dir.name, session))
+
+        for session in on_disk - known:
+            ann_file = store_dir / session / "annotations.json"
+            completed, usable = _read_session_flags(ann_file)
+            self._conn.execute("""
+                INSERT INTO sessions (store, session, dir_mtime_ns, ann_mtime_ns, completed, usable)
+                VALUES (?, ?, NULL, ?, ?, ?)
+            """, (store_dir.name, session, _mtime_ns(ann_file), int(completed), int(usable)))
+
+        # the store folder changed (sessions copied in, restored, ...): re-read the flags of its
+        # sessions whose annotations.json changed outside the tool; otherwise the saver keeps them current
+        for session, ann_mtime in self._conn.execute(
+            "SELECT session, ann_mtime_ns FROM sessions WHERE store = ?", (store_dir.name,)
+        ).fetchall():
+            ann_file = store_dir / session / "annotations.json"
+            current = _mtime_ns(ann_file)
+            if current != ann_mtime:
+                completed, usable = _read_session_flags(ann_file)
+                self._conn.execute("""
+                    UPDATE sessions SET ann_mtime_ns = ?, completed = ?, usable = ?
+                    WHERE store = ? AND session = ?
+                """, (current, int(completed), int(usable), store_dir.name, session))
+
+        self._conn.execute("INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)", (str(store_dir), mtime))
+
+    def refresh(self):
+        """Pick up added/removed stores and sessions. Only re-lists folders whose mtime changed."""
+        with self._lock:
+            root_mtime = self._dir_changed(self.dataset_dir)
+            if root_mtime is not None:
+                stores = {p.name for p in self.dataset_dir.glob("store_*") if p.is_dir()}
+                known = {row[0] for row in self._conn.execute("SELECT DISTINCT store FROM sessions")}
+                for store in known - stores:
+                    self._conn.execute("DELETE FROM sessions WHERE store = ?", (store,))
+                    self._conn.execute("DELETE FROM images WHERE store = ?", (store,))
+                    self._conn.execute("DELETE FROM dirs WHERE path = ?", (str(self.dataset_dir / store),))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO dirs (path, mtime_ns) VALUES (?, ?)",
+                    (str(self.dataset_dir), root_mtime),
+                )
+            else:
+                stores = {row[0] for row in self._conn.execute("SELECT DISTINCT store FROM sessions")}
+                stores |= {
+                    Path(row[0]).name for row in self._conn.execute(
+                        "SELECT path FROM dirs WHERE path != ?", (str(self.dataset_dir),)
+                    )
+                }
+
+            for store in stores:
+                store_dir = self.dataset_dir / store
+                mtime = self._dir_changed(store_dir)
+                if mtime is not None:
+                    self._scan_store(store_dir, mtime)
+
+            self._conn.commit()
+
+    def sessions(self, skip_completed=False):
+        """Sorted (store, session) tuples, optionally without completed or unusable sessions."""
+        self.refresh()
+        query = "SELECT store, session FROM sessions"
+        if skip_completed:
+            query += " WHERE completed = 0 AND usable = 1"
+        query += " ORDER BY store, session"
+        with self._lock:
+            return self._conn.execute(query).fetchall()
+
+    def update_session_flags(self, store, session, completed, usable):
+        """Called by the saver after writing annotations.json, so startup never has to parse it."""
+        ann_file = self.dataset_dir / store / session / "annotations.json"
+        with self._lock:
+            self._conn.execute("""
+                UPDATE sessions SET completed = ?, usable = ?, ann_mtime_ns = ?
+                WHERE store = ? AND session = ?
+            """, (int(completed), int(usable), _mtime_ns(ann_file), store, session))
+            self._conn.commit()
+
+    # ---------------- images ----------------
+
+    def session_images(self, store, session):
+        """
+        Ordered image paths of one session. The folder is only re-listed if its mtime changed;
+        annotations.json is only re-parsed if it was modified outside the tool.
+        """
+        session_dir = self.dataset_dir / store / session
+        dir_mtime = _mtime_ns(session_dir)
+        ann_file = session_dir / "annotations.json"
+        ann_mtime = _mtime_ns(ann_file)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT dir_mtime_ns, ann_mtime_ns FROM sessions WHERE store = ? AND session = ?",
+                (store, session),
+            ).fetchone()
+
+            if row is None or row[0] != dir_mtime:
+                images = sorted(session_dir.glob("*.jpeg"), key=_image_sort_key)
+                names = [p.name for p in images]
+
+                # one row per removed image, a NOT IN list would exceed SQLite's variable limit
+                known = {
+                    name for (name,) in self._conn.execute(
+                        "SELECT name FROM images WHERE store = ? AND session = ?", (store, session)
+                    )
+                }
+                self._conn.executemany(
+                    "DELETE FROM images WHERE store = ? AND session = ? AND name = ?",
+                    [(store, session, name) for name in known - set(names)],
+                )
+                self._conn.executemany("""
+                    INSERT INTO images (store, session, idx, name) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(store, session, name) DO UPDATE SET idx = excluded.idx
+                """, [(store, session, idx, name) for idx, name in enumerate(names)])
+
+            if row is None or row[0] != dir_mtime or row[1] != ann_mtime:
+                completed, usable = _read_session_flags(ann_file)
+                self._conn.execute("""
+                    INSERT INTO sessions (store, session, dir_mtime_ns, ann_mtime_ns, completed, usable)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(store, session) DO UPDATE SET
+                        dir_mtime_ns = excluded.dir_mtime_ns,
+                        ann_mtime_ns = excluded.ann_mtime_ns,
+                        completed = excluded.completed,
+                        usable = excluded.usable
+                """, (store, session, dir_mtime, ann_mtime, int(completed), int(usable)))
+                self._conn.commit()
+
+            rows = self._conn.execute(
+                "SELECT name FROM images WHERE store = ? AND session = ? ORDER BY idx",
+                (store, session),
+            ).fetchall()
+
+        return [session_dir / name for (name,) in rows]
+
+    def size_index(self, store, session):
+        """Size index for one session with the same interface as ImageSizeIndex."""
+        return ManifestSizeIndex(self, store, session)
+
+    def _get_size(self, store, session, img_path):
+        img_path = Path(img_path)
+        try:
+            stat = img_path.stat()
+        except FileNotFoundError:
+            return None
+
+        with self._lock:
+            row = self._conn.execute("""
+                SELECT width, height, mtime_ns, bytes FROM images
+                WHERE store = ? AND session = ? AND name = ?
+            """, (store, session, img_path.name)).fetchone()
+
+        if row and row[0] is not None and row[2] == stat.st_mtime_ns and row[3] == stat.st_size:
+            return (row[0], row[1])
+
+        size = probe_image_size(img_path)
+        with self._lock:
+            self._conn.execute("""
+                UPDATE images SET width = ?, height = ?, mtime_ns = ?, bytes = ?
+                WHERE store = ? AND session = ? AND name = ?
+            """, (size[0], size[1], stat.st_mtime_ns, stat.st_size, store, session, img_path.name))
+        return size
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+
+
+class ManifestSizeIndex:
+    """ImageSizeIndex backed by the dataset manifest instead of a per-session file."""
+
+    def __init__(self, manifest, store, session):
+        self.manifest = manifest
+        self.store = store
+        self.session = session
+
+    def get(self, img_path):
+        return self.manifest._get_size(self.store, self.session, img_path)
+
+    def flush(self):
+        self.manifest.flush()
+
+
+def open_manifest(dataset_dir):
+    """Open the manifest, or return None if the dataset root is not writable."""
+    try:
+        return DatasetManifest(dataset_dir)
+    except sqlite3.Error as e:
+        print(f"[WARN] dataset manifest unavailable, scanning folders instead: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+    from src.config import DATASET_DIR
+
+    manifest = DatasetManifest(sys.argv[1] if len(sys.argv) > 1 else DATASET_DIR)
+    sessions = manifest.sessions()
+    print(f"[MANIFEST] {len(sessions)} sessions indexed in {manifest.file}")
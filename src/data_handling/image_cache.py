@@ -1,52 +1,202 @@
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import threading
-from PIL import Image, ImageTk
-from utils import resize_with_aspect_ratio
+from PIL import Image
+
+try:
+    resample_filter = Image.Resampling.LANCZOS
+except AttributeError:
+    resample_filter = Image.ANTIALIAS
+
+
+def fit_size(size, max_w, max_h):
+    """Largest size with the proportions of `size` that fits into max_w x max_h."""
+    w, h = size
+    scale = min(max_w / w, max_h / h)
+    return (int(w * scale), int(h * scale))
+
+
+def scale_to_fit(pil_img, max_w, max_h):
+    """Resize preserving proportions so the image fits into max_w x max_h."""
+    return pil_img.resize(fit_size(pil_img.size, max_w, max_h), resample_filter)
+
+
+def decode_scaled(annot_img, max_w, max_h):
+    """
+    Decode an image at display resolution. For JPEGs the DCT scaling of draft() decodes
+    at 1/2, 1/4 or 1/8 size (never below the target), so only the last step needs LANCZOS.
+    Returns (scaled_image, original_size); the original size is read before draft() changes it.
+    """
+    pil_img = load_pil_image(annot_img)
+    orig_size = pil_img.size
+    target = fit_size(orig_size, max_w, max_h)
+
+    if pil_img.format == "JPEG":
+        pil_img.draft(pil_img.mode, target)
+
+    if hasattr(annot_img, "load_image") and annot_img._img_size is None:
+        annot_img._img_size = orig_size  # spare the remote image another download for its size
+
+    if pil_img.size == target:
+        pil_img.load()
+        return pil_img, orig_size
+    return pil_img.resize(target, resample_filter), orig_size
+
+
+def image_key(annot_img):
+    """Cache key of an AnnotatableImage / RemoteAnnotatableImage."""
+    return getattr(annot_img, "url", None) or str(annot_img.img_path)
+
+
+def load_pil_image(annot_img):
+    if hasattr(annot_img, "load_image"):
+        return annot_img.load_image()
+    return Image.open(annot_img.img_path)
+
+
+def _known_size(annot_img):
+    if hasattr(annot_img, "load_image"):
+        return annot_img._img_size  # don't download a remote image just to build its key
+    return annot_img.img_size
+
+
+def cache_key(annot_img, max_w, max_h):
+    """
+    (image, displayed size). Keyed by the fitted size rather than the available area,
+    so resizes that end up at the same image size reuse the cached pixels.
+    """
+    size = _known_size(annot_img)
+    if size is None:
+        return (image_key(annot_img), (max_w, max_h))
+    return (image_key(annot_img), fit_size(size, max_w, max_h))
+
+
+def _nbytes(pil_img):
+    w, h = pil_img.size
+    return w * h * len(pil_img.getbands())
 
 
 class ImageCache:
-    def __init__(self, cache_size=5):
-        self.cache_size = cache_size
+    """
+    Thread-safe LRU of scaled PIL images, bounded by decoded size in bytes.
+    Values are (scaled_image, original_size).
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
         self.cache = OrderedDict()
+        self.nbytes = 0
         self.lock = threading.Lock()
 
-    def get(self, image_path):
-        """Get image from cache or load it if not present"""
-        print("getting", str_path)
-        str_path = str(image_path)
+    def get(self, key):
+        """Return the cached entry or None."""
         with self.lock:
-            if str_path in self.cache:
+            if key in self.cache:
                 # Move to end to mark as recently used
-                self.cache.move_to_end(str_path)
-                return self.cache[str_path]
+                self.cache.move_to_end(key)
+                return self.cache[key]
             return None
 
-    def add(self, image_path, image):
-        """Add image to cache, removing oldest if necessary"""
-        str_path = str(image_path)
+    def add(self, key, entry):
+        """Add entry to cache, removing least recently used ones if over budget."""
         with self.lock:
-            self.cache[str_path] = image
-            self.cache.move_to_end(str_path)
-            
-            # Remove oldest items if cache is too big
-            while len(self.cache) > self.cache_size:
-                self.cache.popitem(last=False)
-
-    def preload_images(self, image_paths, callback=None):
-        """Preload images in a background thread"""
-        def load_images():
-            for path in image_paths:
-                if self.get(path) is None:  # Only load if not in cache
-                    try:
-                        pil_img = Image.open(path)
-                        pil_img = resize_with_aspect_ratio(pil_img, 1000, 1000)
-                        tk_image = ImageTk.PhotoImage(pil_img)
-                        self.add(path, tk_image)
-                    except Exception as e:
-                        print(f"Error preloading image {path}: {e}")
-            if callback:
-                callback()
-
-        thread = threading.Thread(target=load_images)
-        thread.daemon = True
-        thread.start()
\ No newline at end of file
+            if key in self.cache:
+                self.nbytes -= _nbytes(self.cache.pop(key)[0])
+            self.cache[key] = entry
+            self.nbytes += _nbytes(entry[0])
+
+            while self.nbytes > self.max_bytes and len(self.cache) > 1:
+                _, (old_img, _) = self.cache.popitem(last=False)
+                self.nbytes -= _nbytes(old_img)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.cache
+
+    def __len__(self):
+        return len(self.cache)
+
+
+class ImagePrefetcher:
+    """
+    Decodes and downscales images on a worker pool so the Tk thread only has to
+    build the PhotoImage. PhotoImages must never be created here, Tk is not thread-safe.
+    """
+
+    def __init__(self, cache=None, workers=2):
+        self.cache = cache if cache is not None else ImageCache()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._inflight = {}  # cache key -> Future
+        self._wanted = set()
+
+    def _decode(self, annot_img, max_w, max_h):
+        entry = decode_scaled(annot_img, max_w, max_h)
+        self.cache.add((image_key(annot_img), entry[0].size), entry)
+        return entry
+
+    def _load(self, annot_img, max_w, max_h, key):
+        if key not in self._wanted:
+            return None  # user navigated away before this was picked up
+        return self._decode(annot_img, max_w, max_h)
+
+    def _submit(self, annot_img, max_w, max_h):
+        key = cache_key(annot_img, max_w, max_h)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._pool.submit(self._load, annot_img, max_w, max_h, key)
+                self._inflight[key] = future
+                future.add_done_callback(lambda f, k=key: self._done(k, f))
+        return future
+
+    def _done(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def get(self, annot_img, max_w, max_h):
+        """
+        Return (scaled_image, original_size). Served from the cache, from a running
+        prefetch, or decoded right away if nobody asked for it yet.
+        """
+        key = cache_key(annot_img, max_w, max_h)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            try:
+                entry = future.result()
+            except Exception:
+                entry = None  # retried below, so the error surfaces on the Tk thread
+            if entry is not None:
+                return entry
+
+        return self._decode(annot_img, max_w, max_h)
+
+    def prefetch(self, pairs, max_w, max_h):
+        """Queue both images of the given pairs, dropping whatever is still queued for older requests."""
+        wanted = set()
+        images = []
+        for pair in pairs:
+            for annot_img in (pair.image1, pair.image2):
+                key = cache_key(annot_img, max_w, max_h)
+                wanted.add(key)
+                if key not in self.cache:
+                    images.append(annot_img)
+        self._wanted = wanted
+
+        for annot_img in images:
+            future = self._submit(annot_img, max_w, max_h)
+            future.add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error preloading image: {future.exception()}")
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
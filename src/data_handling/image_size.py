@@ -0,0 +1,137 @@
+import json
+import struct
+from pathlib import Path
+from PIL import Image
+
+SIZE_INDEX_NAME = ".image_sizes.json"
+
+# SOF markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) share the range but don't
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+# markers without a length field
+_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+
+def read_jpeg_size(path):
+    """
+    Read (width, height) from the SOF segment of a JPEG without decoding pixels.
+    Returns None if the file is not a JPEG or the header is broken.
+    """
+    with open(path, "rb") as f:
+        if f.read(2) != b"\xff\xd8":
+            return None
+
+        while True:
+            byte = f.read(1)
+            if not byte:
+                return None
+            if byte != b"\xff":
+                continue
+
+            # skip fill bytes
+            marker = f.read(1)
+            while marker == b"\xff":
+                marker = f.read(1)
+            if not marker:
+                return None
+            marker = marker[0]
+
+            if marker in _STANDALONE_MARKERS or marker == 0x00:
+                continue
+            if marker in (0xD9, 0xDA):
+                # end of image / start of scan before any frame header
+                return None
+
+            length_bytes = f.read(2)
+            if len(length_bytes) != 2:
+                return None
+            (length,) = struct.unpack(">H", length_bytes)
+
+            if marker in _SOF_MARKERS:
+                segment = f.read(5)
+                if len(segment) != 5:
+                    return None
+                _precision, height, width = struct.unpack(">BHH", segment)
+                if not width or not height:
+                    return None
+                return (width, height)
+
+            f.seek(length - 2, 1)
+
+
+def probe_image_size(path):
+    """
+    (width, height) of an image, as PIL would report it.
+    Uses the JPEG header parser and only falls back to PIL for other formats.
+    """
+    size = None
+    try:
+        size = read_jpeg_size(path)
+    except OSError:
+        pass
+    if size is None:
+        with Image.open(path) as img:
+            size = img.size
+    return size
+
+
+class ImageSizeIndex:
+    """
+    Per-session cache of image sizes, persisted as .image_sizes.json in the session folder.
+    Entries are keyed by file name and invalidated when mtime or file size change.
+    """
+
+    def __init__(self, session_path, flush_every=32):
+        self.session_path = Path(session_path)
+        self.file = self.session_path / SIZE_INDEX_NAME
+        self.flush_every = flush_every
+
+        self._entries = None  # loaded on first lookup
+        self._pending = 0
+
+    def _load(self):
+        self._entries = {}
+        if not self.file.exists():
+            return
+        try:
+            data = json.loads(self.file.read_text())
+            if isinstance(data, dict):
+                self._entries = data
+        except Exception as e:
+            print(f"[WARN] could not read size index {self.file}: {e}")
+
+    def get(self, img_path):
+        if self._entries is None:
+            self._load()
+
+        img_path = Path(img_path)
+        try:
+            stat = img_path.stat()
+        except FileNotFoundError:
+            return None
+
+        entry = self._entries.get(img_path.name)
+        if entry and entry.get("mtime_ns") == stat.st_mtime_ns and entry.get("bytes") == stat.st_size:
+            return tuple(entry["size"])
+
+        size = probe_image_size(img_path)
+        self._entries[img_path.name] = {
+            "size": list(size),
+            "mtime_ns": stat.st_mtime_ns,
+            "bytes": stat.st_size,
+        }
+        self._pending += 1
+        if self._pending >= self.flush_every:
+            self.flush()
+        return size
+
+    def flush(self):
+        """Write pending entries. The index is only a cache, so failures are not fatal."""
+        if not self._pending:
+            return
+        try:
+            tmp = self.file.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._entries))
+            tmp.replace(self.file)
+            self._pending = 0
+        except OSError as e:
+            print(f"[WARN] could not write size index {self.file}: {e}")
@@ -0,0 +1,219 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from io import BytesIO
+from pathlib import Path
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image
+
+
+class RemoteImageClient:
+    """
+    Shared HTTP client for review images.
+    Keeps a keep-alive connection pool, an in-memory LRU of the raw image bytes and an
+    on-disk cache that is revalidated with ETag / Last-Modified, so every image is
+    downloaded once and afterwards only costs a 304. The disk cache is bounded by
+    max_disk_bytes; the least recently used files (by atime, set on every hit) go first.
+    """
+
+    def __init__(self, cache_dir=None, pool_size=8, max_memory_bytes=128 * 1024 * 1024,
+                 max_disk_bytes=2 * 1024 * 1024 * 1024, timeout=30):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.timeout = timeout
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._disk_lock = threading.Lock()
+        self._disk_bytes = 0
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._memory = OrderedDict()  # url -> bytes
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # url -> Future
+        self._pool = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="remote-images")
+
+    # ---------------- memory cache ----------------
+
+    def _remember(self, url, data):
+        with self._lock:
+            if url in self._memory:
+                self._memory_bytes -= len(self._memory.pop(url))
+            self._memory[url] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, old = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old)
+
+    def _from_memory(self, url):
+        with self._lock:
+            data = self._memory.get(url)
+            if data is not None:
+                self._memory.move_to_end(url)
+            return data
+
+    # ---------------- disk cache ----------------
+
+    def _disk_paths(self, url):
+        name = sha1(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / name, self.cache_dir / f"{name}.json"
+
+    def _disk_entries(self):
+        """(atime, data_path, bytes) of every cached image; data files are the names without suffix."""
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix:
+                continue
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_atime, path, st.st_size))
+        return entries
+
+    def _read_disk(self, url):
+        if not self.cache_dir:
+            return None, {}
+        data_path, meta_path = self._disk_paths(url)
+        if not data_path.exists() or not meta_path.exists():
+            return None, {}
+        try:
+            data, meta = data_path.read_bytes(), json.loads(meta_path.read_text())
+            os.utime(data_path, (time.time(), data_path.stat().st_mtime))  # noatime/relatime mounts
+            return data, meta
+        except (OSError, ValueError):
+            return None, {}
+
+    def _write_disk(self, url, data, headers):
+        if not self.cache_dir:
+            return
+        data_path, meta_path = self._disk_paths(url)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+        }
+        try:
+            # drop the old data first and replace it last: a crash in between leaves a miss,
+            # never old bytes next to the new ETag
+            old_size = data_path.stat().st_size if data_path.exists() else 0
+            data_path.unlink(missing_ok=True)
+            with self._disk_lock:
+                self._disk_bytes -= old_size
+
+            tmp = meta_path.with_name(meta_path.name + ".tmp")
+            tmp.write_text(json.dumps(meta))
+            tmp.replace(meta_path)
+            tmp = data_path.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            tmp.replace(data_path)
+        except OSError as e:
+            print(f"[WARN] could not cache {url}: {e}")
+            return
+
+        with self._disk_lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Delete least recently used images until the cache is at 90% of max_disk_bytes."""
+        entries = self._disk_entries()
+        total = sum(size for _, _, size in entries)
+        for _, data_path, size in sorted(entries):
+            if total <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                data_path.unlink()
+                data_path.with_suffix(".json").unlink(missing_ok=True)
+            except OSError:
+                continue
+            total -= size
+        self._disk_bytes = total
+
+    # ---------------- fetching ----------------
+
+    def _download(self, url):
+        cached, meta = self._read_disk(url)
+
+        headers = {}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        resp = self.session.get(url, headers=headers, timeout=self.timeout)
+        if resp.status_code == 304 and cached is not None:
+            data = cached
+        else:
+            resp.raise_for_status()
+            data = resp.content
+            self._write_disk(url, data, resp.headers)
+
+        self._remember(url, data)
+        return data
+
+    def _submit(self, url):
+        with self._lock:
+            future = self._inflight.get(url)
+            if future is None:
+                future = self._pool.submit(self._download, url)
+                self._inflight[url] = future
+                future.add_done_callback(lambda f, u=url: self._done(u, f))
+        return future
+
+    def _done(self, url, future):
+        with self._lock:
+            if self._inflight.get(url) is future:
+                del self._inflight[url]
+
+    def fetch(self, url) -> bytes:
+        """Raw bytes of the image, downloaded at most once per client."""
+        data = self._from_memory(url)
+        if data is not None:
+            return data
+        return self._submit(url).result()
+
+    def open_image(self, url):
+        return Image.open(BytesIO(self.fetch(url)))
+
+    def prefetch(self, urls):
+        """Download all given urls concurrently in the background."""
+        for url in urls:
+            if self._from_memory(url) is None:
+                self._submit(url).add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"[WARN] prefetching remote image failed: {future.exception()}")
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_remote_image_client(cache_dir=None) -> RemoteImageClient:
+    """Process-wide client; cache_dir is only used when the client is first created."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = RemoteImageClient(cache_dir=cache_dir)
+        return _client
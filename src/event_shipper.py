@@ -0,0 +1,167 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import requests
+
+from src import config
+
+
+class EventShipper:
+    """
+    Sends highscore / review events to the server in the background.
+
+    enqueue() only appends to a local SQLite queue, so the Tk thread never waits for
+    the network. A worker thread posts the queue in order, in batches, to
+    /api/events/bulk and deletes what the server confirmed. Every event carries a
+    uuid as idempotency key, so resending a batch after a lost response is harmless.
+    While the server is unreachable the worker backs off exponentially; the queue
+    survives restarts.
+    """
+
+    def __init__(self, queue_file, server, batch_size=200, max_backoff=60.0, timeout=5):
+        self.queue_file = Path(queue_file)
+        self.queue_file.parent.mkdir(parents=True, exist_ok=True)
+        self.url = f"{server.rstrip('/')}/api/events/bulk"
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.queue_file, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                event_id TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+        self._session = requests.Session()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._failures = 0
+        self._thread = threading.Thread(target=self._run, name="event-shipper", daemon=True)
+        self._thread.start()
+
+    # ---------------- queue ----------------
+
+    def enqueue(self, kind, payload):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO events (event_id, kind, payload, created_at) VALUES (?, ?, ?, ?)",
+                (str(uuid.uuid4()), kind, json.dumps(payload), time.time()),
+            )
+            self._conn.commit()
+        self._wake.set()
+
+    def import_legacy_cache(self, cache_file):
+        """Queue events that older versions cached in annotation_cache.json while offline."""
+        cache_file = Path(cache_file)
+        if not cache_file.exists():
+            return
+        try:
+            cached = json.loads(cache_file.read_text())
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Could not read {cache_file}: {e}")
+            return
+        for annotation in cached:
+            self.enqueue("annotation", annotation)
+        cache_file.rename(cache_file.with_name(cache_file.name + ".imported"))
+        print(f"[INFO] Queued {len(cached)} cached annotations from {cache_file}")
+
+    def pending(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def _peek(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, event_id, kind, payload FROM events ORDER BY seq LIMIT ?",
+                (self.batch_size,),
+            ).fetchall()
+        return [
+            {"seq": seq, "eventId": event_id, "kind": kind, "payload": json.loads(payload)}
+            for seq, event_id, kind, payload in rows
+        ]
+
+    def _remove(self, seqs):
+        with self._lock:
+            self._conn.executemany("DELETE FROM events WHERE seq = ?", [(seq,) for seq in seqs])
+            self._conn.commit()
+
+    # ---------------- sending ----------------
+
+    def _send(self, batch):
+        resp = self._session.post(
+            self.url,
+            json={"events": [{k: e[k] for k in ("eventId", "kind", "payload")} for e in batch]},
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+        return {r["eventId"]: r for r in resp.json()["results"]}
+
+    def _backoff(self):
+        delay = min(self.max_backoff, 2 ** self._failures)
+        return delay * random.uniform(0.5, 1.0)  # jitter, so clients don't retry in lockstep
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._peek()
+            if not batch:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            try:
+                results = self._send(batch)
+            except Exception as e:
+                self._failures += 1
+                config.SERVER_AVAILABLE = False
+                delay = self._backoff()
+                print(f"[WARN] Could not send {len(batch)} events, retrying in {delay:.0f}s: {e}")
+                self._stop.wait(delay)
+                continue
+
+            self._failures = 0
+            config.SERVER_AVAILABLE = True
+
+            done = []
+            for event in batch:
+                result = results.get(event["eventId"])
+                if result is None:
+                    continue  # not answered, send again
+                if result["status"] == "rejected":
+                    print(f"[WARN] Server rejected {event['kind']} event, dropping it: {result.get('detail')}")
+                done.append(event["seq"])
+            self._remove(done)
+            print(f"[INFO] Sent {len(done)} events to the highscore server")
+            if not done:
+                self._stop.wait(self.max_backoff)  # server answered without confirming anything
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+
+
+LEGACY_CACHE_FILE = "annotation_cache.json"
+_shipper = None
+_shipper_lock = threading.Lock()
+
+
+def get_event_shipper() -> EventShipper:
+    global _shipper
+    with _shipper_lock:
+        if _shipper is None:
+            _shipper = EventShipper(Path(config.LOCAL_LOG_DIR) / "event_queue.sqlite", config.SERVER)
+            _shipper.import_legacy_cache(LEGACY_CACHE_FILE)
+        return _shipper
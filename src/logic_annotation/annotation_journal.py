@@ -0,0 +1,117 @@
+import json
+import os
+import time
+from pathlib import Path
+
+
+def _fsync_dir(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # not supported on windows
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_text_atomic(path, text):
+    """Write via temp file + fsync + rename, so readers never see a half written file."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(path.parent)
+
+
+def journal_line(key, value):
+    """One journal record. Serialize while the data is locked, append later."""
+    return json.dumps({"k": key, "v": value}, separators=(",", ":")) + "\n"
+
+
+class AnnotationJournal:
+    """
+    Write-ahead journal next to an annotations.json.
+
+    Every mutation is appended as one JSON line {"k": key, "v": value} holding the new value
+    of a top level key (a pair id or "_meta"). Lines are fsync'd in groups and the journal is
+    compacted into the canonical annotations.json every `compact_every` records and on close.
+    After a crash the snapshot plus the replayed journal give the last synced state.
+    """
+
+    def __init__(self, snapshot_file, compact_every=500, fsync_every=20, fsync_interval=1.0):
+        self.snapshot_file = Path(snapshot_file)
+        self.file = self.snapshot_file.with_suffix(".journal")
+        self.compact_every = compact_every
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+
+        self._fh = None
+        self._records = 0      # records since last compaction
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def load(self):
+        """Snapshot with the journal replayed on top. Folds a leftover journal into the snapshot."""
+        data = {}
+        if self.snapshot_file.exists():
+            data = json.loads(self.snapshot_file.read_text())
+
+        replayed = 0
+        if self.file.exists():
+            with open(self.file, "r") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break  # torn last line of a crashed write
+                    data[rec["k"]] = rec["v"]
+                    replayed += 1
+
+        if replayed:
+            print(f"[JOURNAL] recovered {replayed} records for {self.snapshot_file}")
+            self.compact(json.dumps(data, indent=2))
+        return data
+
+    def append(self, lines):
+        """lines: records built with journal_line()."""
+        if not lines:
+            return
+        if self._fh is None:
+            self._fh = open(self.file, "a")
+
+        self._fh.write("".join(lines))
+        self._records += len(lines)
+        self._unsynced += len(lines)
+
+        self._fh.flush()
+        if self._unsynced >= self.fsync_every or time.monotonic() - self._last_sync >= self.fsync_interval:
+            self.sync()
+
+    def needs_compaction(self, pending=0):
+        return self._records + pending >= self.compact_every
+
+    def sync(self):
+        if self._fh is not None and self._unsynced:
+            os.fsync(self._fh.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def compact(self, snapshot):
+        """Write the full state (serialized JSON) as annotations.json and start an empty journal."""
+        write_text_atomic(self.snapshot_file, snapshot)
+
+        # only drop the journal once the snapshot is durable
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if self.file.exists():
+            self.file.unlink()
+        self._records = 0
+        self._unsynced = 0
+
+    def is_dirty(self):
+        return bool(self._records) or self.file.exists()
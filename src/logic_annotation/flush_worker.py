@@ -0,0 +1,90 @@
+import atexit
+import threading
+import time
+
+from src.config import SAVE_DEBOUNCE_S
+
+
+class FlushWorker:
+    """
+    Background writer shared by all savers.
+
+    Savers call schedule(self) after changing their annotations; the worker calls
+    saver._write() once the debounce interval has passed, so a burst of changes
+    (drawing / moving boxes) ends up as a single write off the Tk thread.
+    flush() writes synchronously, for pair/session changes and closing the window.
+    """
+
+    def __init__(self, debounce=0.5):
+        self.debounce = debounce
+        self._cond = threading.Condition()
+        self._pending = {}  # saver -> due time (monotonic)
+        self._writing = set()  # savers the worker is writing right now
+        self._thread = threading.Thread(target=self._run, name="saver-flush", daemon=True)
+        self._thread.start()
+
+    def schedule(self, saver, delay=None):
+        """Mark saver dirty. The first change of a burst sets the due time, later ones join it."""
+        due = time.monotonic() + (self.debounce if delay is None else delay)
+        with self._cond:
+            self._pending[saver] = min(due, self._pending.get(saver, due))
+            self._cond.notify_all()
+
+    def discard(self, saver):
+        """Forget pending work for saver; the caller writes it itself."""
+        with self._cond:
+            return self._pending.pop(saver, None) is not None
+
+    def flush(self, saver=None):
+        """Write saver (or every pending saver) right now, in the calling thread."""
+        with self._cond:
+            if saver is None:
+                savers = list(self._pending)
+                self._pending.clear()
+            else:
+                savers = [saver] if self._pending.pop(saver, None) is not None else []
+            # a write the worker already started has to land before we return
+            while self._writing & ({saver} if saver is not None else self._writing):
+                self._cond.wait()
+        for s in savers:
+            self._write(s)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                now = time.monotonic()
+                next_due = min(self._pending.values())
+                if next_due > now:
+                    self._cond.wait(next_due - now)
+                    continue
+                due = [s for s, t in self._pending.items() if t <= now]
+                for s in due:
+                    del self._pending[s]
+                self._writing.update(due)
+            for s in due:
+                self._write(s)
+            with self._cond:
+                self._writing.difference_update(due)
+                self._cond.notify_all()
+
+    @staticmethod
+    def _write(saver):
+        try:
+            saver._write()
+        except Exception as e:
+            print(f"[WARN] writing annotations of {type(saver).__name__} failed: {e}")
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_flush_worker() -> FlushWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = FlushWorker(debounce=SAVE_DEBOUNCE_S)
+            atexit.register(_worker.flush)  # last resort if the window was not closed properly
+        return _worker
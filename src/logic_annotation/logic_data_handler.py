@@ -1,16 +1,19 @@
 from pathlib import Path
-from PIL import Image
 from dataclasses import dataclass
 from src.logic_annotation.logic_saver import AnnotationSaver, InconsistentSaver, UnsureSaver
 from abc import ABC, abstractmethod
-from src.config import LOCAL_LOG_DIR, USERNAME
-from io import BytesIO
-from urllib.parse import urljoin
+from src.config import LOCAL_LOG_DIR, USERNAME, DATASET_DIR
+from urllib.parse import urljoin, urlparse
 import requests
 import json
 from tkinter import messagebox
 from src.logic_annotation.logic_uploader import SessionUploader, BatchUploader
-from urllib.parse import urlparse
+from src.data_handling.image_size import ImageSizeIndex, probe_image_size
+from src.data_handling.dataset_manifest import open_manifest
+from src.data_handling.remote_image_client import get_remote_image_client
+from src.logic_annotation.flush_worker import get_flush_worker
+
+REMOTE_CACHE_DIR = Path(DATASET_DIR) / ".remote_cache"
 
 class BaseDataHandler(ABC):
     """
@@ -67,19 +70,44 @@ class BaseDataHandler(ABC):
     def ask_upload(self):
         pass
 
+    def close(self):
+        """Persist everything the saver still holds, e.g. before the window closes."""
+        close = getattr(self.saver, "close", None)
+        if close:
+            close()
+
+    def flush_saver(self):
+        """Write pending changes of the current pair now instead of after the debounce interval."""
+        if self.saver is not None:
+            get_flush_worker().schedule(self.saver, delay=0)
+
+    def neighbour_pairs(self, n_next=3, n_prev=1):
+        """Pairs around the current one (nearest first), used for prefetching images."""
+        return self.pairs.neighbours(n_next, n_prev) if self.pairs else []
+
 
 class AnnotatableImage:
-    def __init__(self, img_path, image_id):
+    def __init__(self, img_path, image_id, size_index=None):
         self.img_path = Path(img_path)
         self.img_name = self.img_path.name
-        self.img_size = Image.open(self.img_path).size if self.img_path.exists() else None
         self.boxes = []
         self.image_id = image_id
+        self._size_index = size_index
+        self._img_size = None  # lazy loaded
+
+    @property
+    def img_size(self):
+        if self._img_size is None:
+            if self._size_index is not None:
+                self._img_size = self._size_index.get(self.img_path)
+            elif self.img_path.exists():
+                self._img_size = probe_image_size(self.img_path)
+        return self._img_size
 
 
 class RemoteAnnotatableImage(AnnotatableImage):
     """For API-served images (http/https)."""
-    def __init__(self, url: str, image_id: int, api_base: str = None):
+    def __init__(self, url: str, image_id: int, api_base: str = None, client=None, img_size=None):
         if url.startswith("http"):
             self.url = url
         else:
@@ -90,7 +118,9 @@ class RemoteAnnotatableImage(AnnotatableImage):
         self.img_path = None  # no local path
         self.boxes = []
         self.image_id = image_id
-        self._img_size = None  # lazy loaded
+        # size sent by the server; only fetched from the image itself if missing
+        self._img_size = tuple(img_size) if img_size else None
+        self.client = client or get_remote_image_client(REMOTE_CACHE_DIR)
 
     @property
     def img_size(self):
@@ -100,9 +130,8 @@ class RemoteAnnotatableImage(AnnotatableImage):
         return self._img_size
 
     def load_image(self):
-        resp = requests.get(self.url, timeout=30)
-        resp.raise_for_status()
-        return Image.open(BytesIO(resp.content))
+        # shared client: pooled connections, every image is downloaded only once
+        return self.client.open_image(self.url)
     
 
 
@@ -112,18 +141,19 @@ def _get_name(path_or_url):
     return Path(path_or_url).name
 
 class ImagePair:
-    def __init__(self, pair_id, img1_path, img2_path, remote=False, api_base=None):
+    def __init__(self, pair_id, img1_path, img2_path, remote=False, api_base=None, size_index=None,
+                 img1_size=None, img2_size=None):
         self.pair_id = pair_id
 
         self.img1_name = _get_name(img1_path)
         self.img2_name = _get_name(img2_path)
         
         if remote:
-            self.image1 = RemoteAnnotatableImage(img1_path, image_id=1, api_base=api_base)
-            self.image2 = RemoteAnnotatableImage(img2_path, image_id=2, api_base=api_base)
+            self.image1 = RemoteAnnotatableImage(img1_path, image_id=1, api_base=api_base, img_size=img1_size)
+            self.image2 = RemoteAnnotatableImage(img2_path, image_id=2, api_base=api_base, img_size=img2_size)
         else:
-            self.image1 = AnnotatableImage(img1_path, image_id=1)
-            self.image2 = AnnotatableImage(img2_path, image_id=2)
+            self.image1 = AnnotatableImage(img1_path, image_id=1, size_index=size_index)
+            self.image2 = AnnotatableImage(img2_path, image_id=2, size_index=size_index)
 
         self.pair_annotation = None
 
@@ -167,6 +197,12 @@ class BatchImagePairList:
         self.pair_idx = len(self.image_pairs) - 1
         return self.current() if self.image_pairs else None
 
+    def neighbours(self, n_next, n_prev):
+        """Up to n_next following and n_prev preceding pairs, nearest first."""
+        following = self.image_pairs[self.pair_idx + 1:self.pair_idx + 1 + n_next]
+        preceding = self.image_pairs[max(0, self.pair_idx - n_prev):self.pair_idx][::-1]
+        return following + preceding
+
     def __len__(self):
         return len(self.image_pairs)
 
@@ -175,12 +211,15 @@ class ImagePairList:
     '''
     holds a list of ImagePair instances for one session each
     '''
-    def __init__(self, session_path):
+    def __init__(self, session_path, images=None, size_index=None):
         self.session_path = session_path
-        self.images = sorted(self.session_path.glob("*.jpeg"), key=lambda f: int(f.name.split("-")[0]))
-        
+        if images is None:
+            images = sorted(self.session_path.glob("*.jpeg"), key=lambda f: int(f.name.split("-")[0]))
+        self.images = images
+        self.size_index = size_index if size_index is not None else ImageSizeIndex(self.session_path)
+
         self.image_pairs = [
-            ImagePair(idx, self.images[idx], self.images[idx + 1])
+            ImagePair(idx, self.images[idx], self.images[idx + 1], size_index=self.size_index)
             for idx in range(len(self.images) - 1)
         ]
 
@@ -217,6 +256,12 @@ class ImagePairList:
         self.pair_idx = len(self.image_pairs) - 1
         return self.current() if self.image_pairs else None
 
+    def neighbours(self, n_next, n_prev):
+        """Up to n_next following and n_prev preceding pairs, nearest first."""
+        following = self.image_pairs[self.pair_idx + 1:self.pair_idx + 1 + n_next]
+        preceding = self.image_pairs[max(0, self.pair_idx - n_prev):self.pair_idx][::-1]
+        return following + preceding
+
     def __len__(self):
         return len(self.image_pairs)
         
@@ -228,12 +273,19 @@ class SessionInfo:
     path: Path
 
 class SessionList:
-    def __init__(self, dataset_dir, skip_completed=False):
+    def __init__(self, dataset_dir, skip_completed=False, manifest=None):
         self.dataset_dir = Path(dataset_dir)
+        self.manifest = manifest
         self.sessions = self.append_sessions(skip_completed=skip_completed)
         self.session_idx = 0
 
     def append_sessions(self, skip_completed=False):
+        if self.manifest is not None:
+            return [
+                SessionInfo(store=store, session=session, path=self.dataset_dir / store / session)
+                for store, session in self.manifest.sessions(skip_completed=skip_completed)
+            ]
+
         sessions = []
         for store in sorted(self.dataset_dir.glob("store_*")):
             for session in sorted(store.glob("session_*")):
@@ -289,20 +341,30 @@ class SessionDataHandler(BaseDataHandler):
         self.dataset_dir = dataset_dir
         self.api_base = api_base.rstrip("/")
 
-        self.all_sessions = SessionList(self.dataset_dir, skip_completed=skip_completed)
+        self.manifest = open_manifest(self.dataset_dir)
+        self.all_sessions = SessionList(self.dataset_dir, skip_completed=skip_completed, manifest=self.manifest)
 
         self.pairs = None
         self.total_pairs = None
 
         self.load_current_pairs()
 
-        self.saver = AnnotationSaver(self.current_session_info())
+        self.saver = AnnotationSaver(self.current_session_info(), manifest=self.manifest)
 
         self.uploader = SessionUploader(self)
 
     def load_current_pairs(self):
+        if self.pairs is not None:
+            self.pairs.size_index.flush()
         info = self.all_sessions.current()
-        self.pairs = ImagePairList(info.path)
+        if self.manifest is not None:
+            self.pairs = ImagePairList(
+                info.path,
+                images=self.manifest.session_images(info.store, info.session),
+                size_index=self.manifest.size_index(info.store, info.session),
+            )
+        else:
+            self.pairs = ImagePairList(info.path)
         self.total_pairs = len(self.pairs)
         if not len(self.pairs):
             print(f"Warning: session {info.session} has no pairs")
@@ -331,8 +393,9 @@ class SessionDataHandler(BaseDataHandler):
         # when last pair in session -> session over
         if self.all_sessions.next():
             print("start next session")
+            self.saver.close()
             self.load_current_pairs()
-            self.saver = AnnotationSaver(self.current_session_info())
+            self.saver = AnnotationSaver(self.current_session_info(), manifest=self.manifest)
             return self.pairs.first() if len(self.pairs) else None
         
         return None
@@ -343,8 +406,9 @@ class SessionDataHandler(BaseDataHandler):
         if prv: return prv
         if self.all_sessions.prev():
             print("go back to previous session")
+            self.saver.close()
             self.load_current_pairs()
-            self.saver = AnnotationSaver(self.current_session_info())
+            self.saver = AnnotationSaver(self.current_session_info(), manifest=self.manifest)
             return self.pairs.last() if len(self.pairs) else None
         return None  # start of all data
     
@@ -368,9 +432,10 @@ class SessionDataHandler(BaseDataHandler):
         print(f"Session {self.current_session_info().session} marked as unusable.")
 
         if self.all_sessions.has_next():
+            self.saver.close()
             self.all_sessions.next()
             self.load_current_pairs()
-            self.saver = AnnotationSaver(self.current_session_info())
+            self.saver = AnnotationSaver(self.current_session_info(), manifest=self.manifest)
 
 
     def context_info(self):
@@ -399,6 +464,7 @@ class SessionDataHandler(BaseDataHandler):
         )
     
     def ask_upload(self, session_info=None):
+        self.saver.compact()  # uploader reads annotations.json
         return self.uploader.ask_upload(session_info)
 
 class BatchDataHandler(BaseDataHandler):
@@ -428,6 +494,8 @@ class BatchDataHandler(BaseDataHandler):
 
     def load_current_pairs(self):
         """Fetch a new batch from the API and wrap into BatchImagePairList."""
+        if self.saver is not None:
+            self.close()  # results of the previous batch
         path = f"{self.batch_type}/batch"
         url = urljoin(self.api_base + "/", path.lstrip("/"))
         resp = requests.get(url, params={"user": self.user, "size": self.size, "selected_users": self.selected_users, "selected_model": self.model}, timeout=30)
@@ -448,7 +516,9 @@ class BatchDataHandler(BaseDataHandler):
                 img1_path=item["im1_url"],
                 img2_path=item["im2_url"],
                 remote=True,
-                api_base=self.api_base
+                api_base=self.api_base,
+                img1_size=item.get("image1_size"),
+                img2_size=item.get("image2_size"),
             )
 
             print("im1: ", item["im1_url"])
@@ -465,6 +535,11 @@ class BatchDataHandler(BaseDataHandler):
         self.pairs = BatchImagePairList(pairs)
         print("Loaded batch with", len(self.pairs), "pairs, starting at index", self.pairs.pair_idx)
 
+        # fetch the whole batch concurrently while the first pair is shown
+        get_remote_image_client(REMOTE_CACHE_DIR).prefetch(
+            url for pair in pairs for url in (pair.image1.url, pair.image2.url)
+        )
+
 
         if self.saver_cls:
                 self.saver = self.saver_cls(
@@ -6,7 +6,11 @@ from datetime import datetime
 from urllib.parse import urlparse
 from src.utils import report_annotation, report_inconsistent_review
 import os
+import functools
+import threading
 from tkinter import messagebox
+from src.logic_annotation.annotation_journal import AnnotationJournal, journal_line, write_text_atomic
+from src.logic_annotation.flush_worker import get_flush_worker
 
 def _shorten_path(path_or_url: str) -> str:
     """
@@ -24,6 +28,15 @@ def _shorten_path(path_or_url: str) -> str:
     return str(Path(*parts))
 
 
+def _locked(method):
+    """Mutate annotations under saver.lock, so the flush worker never serializes a half done change."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 from abc import ABC, abstractmethod
 class BaseSaver(ABC):
     @abstractmethod
@@ -60,7 +73,8 @@ class CommonSaver(BaseSaver):
         self.file = Path(file_path)
         self.file.parent.mkdir(parents=True, exist_ok=True)
 
-
+        self.lock = threading.RLock()      # guards self.annotations
+        self._io_lock = threading.Lock()   # one write at a time
         self._on_change = None
 
         # Load or create annotations JSON
@@ -78,17 +92,28 @@ class CommonSaver(BaseSaver):
         self._on_change = cb
 
     def _flush(self):
-        with open(self.file, "w") as f:
-            json.dump(self.annotations, f, indent=2)
+        get_flush_worker().schedule(self)
 
         if self._on_change:
             self._on_change()
 
+    def _write(self):
+        """Runs on the flush worker."""
+        with self._io_lock:
+            with self.lock:
+                text = json.dumps(self.annotations, indent=2)
+            write_text_atomic(self.file, text)
+
+    def close(self):
+        get_flush_worker().flush(self)
+
+    @_locked
     def save_box(self, pair, box, context, state="annotated"):
         print("DEBUG: SAVE BOXES FROM COMMONSAVER")
         self.annotations["items"].setdefault(str(pair.pair_id), {}).setdefault("boxes", []).append(box)
         self._flush()
 
+    @_locked
     def save_delete_box(self, pair, box_id, context):
         boxes = self.annotations["items"].get(str(pair.pair_id), {}).get("boxes", [])
         self.annotations["items"][str(pair.pair_id)]["boxes"] = [
@@ -96,6 +121,7 @@ class CommonSaver(BaseSaver):
         ]
         self._flush()
 
+    @_locked
     def reset_pair(self, pair, context):
         pid = str(pair.pair_id)
         if str(pair.pair_id) in self.annotations["items"]:
@@ -115,19 +141,23 @@ class CommonSaver(BaseSaver):
 
 
 class AnnotationSaver:
-    def __init__(self, info):
-        
+    def __init__(self, info, manifest=None):
+        self.info = info
+        self.manifest = manifest
+
         self.saving_path = Path(info.path)
         self.file = self.saving_path / "annotations.json"
 
-        if self.file.exists():
-            self.annotations = json.loads(self.file.read_text())
-        else:
-            self.annotations = {}
-
+        # mutations go to annotations.journal, annotations.json is rewritten on compaction
+        self.journal = AnnotationJournal(self.file)
+        self.annotations = self.journal.load()
+        self._dirty = set()  # top level keys changed since the last write
+        self.lock = threading.RLock()
+        self._io_lock = threading.Lock()
 
         self._on_change = None  # callback
 
+    @_locked
     def save_pair(self, pair, state, context):
         pid = str(pair.pair_id)
         old_state = self.annotations.get(pid, {}).get("pair_state")
@@ -155,6 +185,7 @@ class AnnotationSaver:
         print("----------")
 
         self.annotations[pid] = entry
+        self._dirty.add(pid)
         self.update_meta(context["progress"]["total"])
         self._flush()
 
@@ -181,11 +212,34 @@ class AnnotationSaver:
         self._on_change = callback
 
     def _flush(self):
-        self.file.write_text(json.dumps(self.annotations, indent=2))
+        get_flush_worker().schedule(self)
         if self._on_change:
             self._on_change()
 
+    def _write(self, compact=False):
+        """Runs on the flush worker. O(changed pairs), independent of session size."""
+        with self._io_lock:
+            with self.lock:
+                lines = [journal_line(key, self.annotations[key]) for key in self._dirty if key in self.annotations]
+                self._dirty.clear()
+                meta = dict(self.annotations.get("_meta", {}))
+                snapshot = None
+                if compact or self.journal.needs_compaction(len(lines)):
+                    snapshot = json.dumps(self.annotations, indent=2)
+
+            if snapshot is not None:
+                self.journal.compact(snapshot)  # already contains lines
+            else:
+                self.journal.append(lines)
+
+        if self.manifest is not None:
+            self.manifest.update_session_flags(
+                self.info.store, self.info.session,
+                completed=meta.get("completed", False),
+                usable=meta.get("usable", True),
+            )
 
+    @_locked
     def update_meta(self, total_pairs):
         pid_count = sum(1 for k in self.annotations if k != "_meta")
         completed = pid_count >= total_pairs
@@ -199,15 +253,19 @@ class AnnotationSaver:
             "root": str(DATASET_DIR),
             "usable": self.annotations["_meta"].get("usable", True)  # default True
         })
+        self._dirty.add("_meta")
 
+    @_locked
     def mark_session_unusable(self):
         """Mark this session as unusable in annotations.json and save."""
         if "_meta" not in self.annotations:
             self.annotations["_meta"] = {}
 
         self.annotations["_meta"]["usable"] = False
+        self._dirty.add("_meta")
         self._flush()
         
+    @_locked
     def save_box(self, pair, box, context, state="annotated"):
         """
         Save a single new box into annotations.json.
@@ -242,9 +300,11 @@ class AnnotationSaver:
 
         # Always update pair state
         self.annotations[pid]["pair_state"] = state
+        self._dirty.add(pid)
         self.update_meta(total_pairs)
         self._flush()
 
+    @_locked
     def save_delete_box(self, pair, box_id, context):
         """
         Delete a box from annotations.json by its box_id.
@@ -263,12 +323,14 @@ class AnnotationSaver:
         after = len(self.annotations[pid]["boxes"])
 
         if before != after:
+            self._dirty.add(pid)
             self.update_meta(total_pairs)
             self._flush()
             return True  # deleted something
         return False
 
     
+    @_locked
     def reset_pair(self, pair, context):
 
         pid = str(pair.pair_id)
@@ -277,12 +339,23 @@ class AnnotationSaver:
         
         self.annotations[pid]["pair_state"] = "no_annotation"
         self.annotations[pid]["boxes"] = []
+        self._dirty.add(pid)
         # clear in-memory boxes
         pair.image1.boxes.clear()
         pair.image2.boxes.clear()
 
         self._flush()
 
+    def compact(self):
+        """Bring annotations.json up to date, e.g. before it is uploaded."""
+        get_flush_worker().flush(self)
+        self._write(compact=True)
+
+    def close(self):
+        get_flush_worker().flush(self)
+        if self.journal.is_dirty():
+            self._write(compact=True)
+
 
 
 class ReviewSaver(CommonSaver):
@@ -302,6 +375,7 @@ class ReviewSaver(CommonSaver):
         self.annotations["_meta"].setdefault("total_pairs", batch_info.get("count"))
         self._flush()
 
+    @_locked
     def update_meta(self, total_pairs):
         self.annotations.setdefault("_meta", {})
 
@@ -321,8 +395,6 @@ class ReviewSaver(CommonSaver):
 
         print(f"completed? {self.annotations['_meta']['completed']}")
 
-        self._flush()
-
 
 
 class InconsistentSaver(ReviewSaver):
@@ -334,6 +406,9 @@ class InconsistentSaver(ReviewSaver):
         self.logfile = self.root / f"inconsistent_{self.batch_id}.json"
         self.model = model
         self.size=size
+        self.lock = threading.RLock()
+        self._io_lock = threading.Lock()
+        self._on_change = None
 
         print("batch size: ", self.size)
         # Load or init annotations
@@ -367,6 +442,7 @@ class InconsistentSaver(ReviewSaver):
 
 
 
+    @_locked
     def save_pair(self, state_before, pair, state, decision, ctx, expected_boxes=None):
         print("inconsistent saver is saving")
         key = self._key(pair)
@@ -464,6 +540,7 @@ class InconsistentSaver(ReviewSaver):
         self._update_completed()
         self._flush()
 
+    @_locked
     def save_box(self, pair, box, context, state="annotated"):
         pid = str(pair.pair_id)
         items = self.annotations.setdefault("items", {})
@@ -482,6 +559,7 @@ class InconsistentSaver(ReviewSaver):
         self._flush()
 
 
+    @_locked
     def reset_pair(self, pair, context):
 
         pid = str(pair.pair_id)
@@ -544,10 +622,17 @@ class InconsistentSaver(ReviewSaver):
 
     def _flush(self):
         self.annotations["_meta"]["timestamp"] = datetime.now().isoformat()
-        self.logfile.write_text(json.dumps(self.annotations, indent=2))
+        get_flush_worker().schedule(self)
+
+    def _write(self):
+        with self._io_lock:
+            with self.lock:
+                text = json.dumps(self.annotations, indent=2)
+            write_text_atomic(self.logfile, text)
 
 
 class UnsureSaver(ReviewSaver):
+    @_locked
     def save_pair(self, pair, state, context):
         key = f"{pair.source_item['store_session_path']}|{pair.pair_id}"
         self.annotations["items"][key] = {
@@ -563,6 +648,7 @@ class UnsureSaver(ReviewSaver):
         self.update_meta(context["progress"]["total"])
         self._flush()
 
+    @_locked
     def save_box(self, pair, box, context, state="annotated"):
         key = f"{pair.source_item['store_session_path']}|{pair.pair_id}"
 
@@ -0,0 +1,32 @@
+import json
+
+from src.logic_annotation.annotation_journal import AnnotationJournal, journal_line
+
+
+def test_journal_replays_after_crash(tmp_path):
+    snapshot = tmp_path / "annotations.json"
+    journal = AnnotationJournal(snapshot, fsync_every=1)
+    journal.append([journal_line("0", {"pair_state": "no_annotation"}), journal_line("_meta", {"completed": False})])
+    journal.append([journal_line("0", {"pair_state": "annotated"})])
+    # no close(): simulate a crash, plus a torn line at the end
+    with open(journal.file, "a") as f:
+        f.write('{"k": "5", "v": {"pair')
+
+    data = AnnotationJournal(snapshot).load()
+    assert data == {"0": {"pair_state": "annotated"}, "_meta": {"completed": False}}
+    # recovery folds the journal into the snapshot
+    assert json.loads(snapshot.read_text()) == data
+    assert not journal.file.exists()
+
+
+def test_journal_compacts(tmp_path):
+    snapshot = tmp_path / "annotations.json"
+    journal = AnnotationJournal(snapshot, compact_every=2)
+    data = {"0": 1, "5": 2}
+    journal.append([journal_line(k, v) for k, v in data.items()])
+    assert journal.needs_compaction()
+
+    journal.compact(json.dumps(data))
+    assert not journal.needs_compaction()
+    assert json.loads(snapshot.read_text()) == data
+    assert not journal.file.exists()
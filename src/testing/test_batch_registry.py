@@ -0,0 +1,81 @@
+import json
+import multiprocessing
+import sys
+import uuid
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "review_api"))
+
+from batch_registry import BatchRegistry, item_key  # noqa: E402
+
+POOL = [{"store_session_path": f"store_1/session_{i // 100}", "pair_id": i % 100} for i in range(400)]
+
+
+def _no_results(batch_id, model_name):
+    return None
+
+
+def _write(path, payload):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(payload))
+    tmp.replace(path)
+
+
+def _reserve_until_empty(batch_dir, state_dir, reviewer, size):
+    """What the batch endpoints do: pick unassigned items and create a batch, under reserve()."""
+    registry = BatchRegistry(batch_dir, _no_results, state_dir=state_dir)
+    while True:
+        with registry.reserve():
+            items = [item for item in POOL if not registry.is_assigned(item_key(item))][:size]
+            if not items:
+                return
+            payload = {
+                "batch_id": uuid.uuid4().hex,
+                "batch_type": "unsure",
+                "status": "assigned",
+                "reviewer": reviewer,
+                "items": items,
+            }
+            registry.create(payload, _write)
+
+
+def test_workers_never_assign_an_item_twice(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    state_dir = tmp_path / "state"
+    state_dir.mkdir()
+    workers = [ctx.Process(target=_reserve_until_empty, args=(tmp_path, state_dir, f"rev{i}", 7)) for i in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join(timeout=60)
+        assert w.exitcode == 0
+
+    keys = Counter(
+        item_key(item)
+        for batch in tmp_path.glob("review_batch_*.json")
+        for item in json.loads(batch.read_text())["items"]
+    )
+    assert [key for key, n in keys.items() if n > 1] == []
+    assert len(keys) == len(POOL)
+
+    # a registry started afterwards sees everything, and so does one catching up from the log
+    assert all(BatchRegistry(tmp_path, _no_results, state_dir=state_dir).is_assigned(item_key(item)) for item in POOL)
+    assert not (tmp_path / "batches.lock").exists() and not (tmp_path / "batches.log").exists()
+
+
+def test_reserve_catches_up_with_other_registries(tmp_path):
+    first = BatchRegistry(tmp_path, _no_results)
+    second = BatchRegistry(tmp_path, _no_results)
+    with first.reserve():
+        first.create({"batch_id": "b1", "status": "assigned", "reviewer": "alice", "items": POOL[:2]}, _write)
+
+    assert not second.is_assigned(item_key(POOL[0]))  # not looked at the log yet
+    with second.reserve():
+        assert second.is_assigned(item_key(POOL[0]))
+        assert second.find_active("alice")["batch_id"] == "b1"
+        second.results_uploaded("b1")
+
+    with first.reserve():
+        assert first.has_results("b1")
+        assert first.find_active("alice") is None
@@ -0,0 +1,76 @@
+import json
+import os
+from PIL import Image
+
+from src.data_handling.dataset_manifest import DatasetManifest
+
+
+def _make_session(root, store, session, n=3):
+    path = root / store / session
+    path.mkdir(parents=True)
+    for i in range(n):
+        Image.new("RGB", (10 + i, 20)).save(path / f"{i * 5}-000000.jpeg", format="JPEG")
+    return path
+
+
+def test_manifest_lists_sessions_and_flags(tmp_path):
+    _make_session(tmp_path, "store_1", "session_1")
+    done = _make_session(tmp_path, "store_1", "session_2")
+    (done / "annotations.json").write_text(json.dumps({"_meta": {"completed": True}}))
+
+    manifest = DatasetManifest(tmp_path)
+    assert manifest.sessions() == [("store_1", "session_1"), ("store_1", "session_2")]
+    assert manifest.sessions(skip_completed=True) == [("store_1", "session_1")]
+
+    # new sessions are picked up through the store folder mtime
+    _make_session(tmp_path, "store_1", "session_3")
+    assert ("store_1", "session_3") in manifest.sessions()
+
+
+def test_manifest_rereads_flags_changed_outside_the_tool(tmp_path):
+    open_session = _make_session(tmp_path, "store_1", "session_1")
+    done = _make_session(tmp_path, "store_1", "session_2")
+    (done / "annotations.json").write_text(json.dumps({"_meta": {"completed": True}}))
+
+    manifest = DatasetManifest(tmp_path)
+    assert manifest.sessions(skip_completed=True) == [("store_1", "session_1")]
+
+    # e.g. restored from a backup or rewritten by convert_old_to_new
+    (open_session / "annotations.json").write_text(json.dumps({"_meta": {"completed": True}}))
+    (done / "annotations.json").write_text(json.dumps({"_meta": {"completed": False, "usable": True}}))
+    os.utime(done / "annotations.json", ns=(0, 1_000_000_000))  # same-tick writes keep their mtime
+
+    # opening a session re-checks its annotations.json
+    manifest.session_images("store_1", "session_1")
+    assert manifest.sessions(skip_completed=True) == []
+
+    # a changed store folder re-checks all of its sessions
+    os.utime(tmp_path / "store_1", ns=(0, 2_000_000_000))
+    assert manifest.sessions(skip_completed=True) == [("store_1", "session_2")]
+
+
+def test_manifest_drops_removed_images(tmp_path):
+    session = _make_session(tmp_path, "store_1", "session_1", n=4)
+    manifest = DatasetManifest(tmp_path)
+    assert len(manifest.session_images("store_1", "session_1")) == 4
+
+    (session / "5-000000.jpeg").unlink()
+    os.utime(session, ns=(0, 1_000_000_000))
+    assert [p.name for p in manifest.session_images("store_1", "session_1")] == [
+        "0-000000.jpeg", "10-000000.jpeg", "15-000000.jpeg",
+    ]
+
+
+def test_manifest_orders_images_and_caches_sizes(tmp_path):
+    _make_session(tmp_path, "store_1", "session_1", n=3)
+
+    manifest = DatasetManifest(tmp_path)
+    images = manifest.session_images("store_1", "session_1")
+    assert [p.name for p in images] == ["0-000000.jpeg", "5-000000.jpeg", "10-000000.jpeg"]
+
+    sizes = manifest.size_index("store_1", "session_1")
+    assert sizes.get(images[2]) == (12, 20)
+    sizes.flush()
+
+    reopened = DatasetManifest(tmp_path)
+    assert reopened.size_index("store_1", "session_1").get(images[2]) == (12, 20)
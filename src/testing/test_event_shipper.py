@@ -0,0 +1,27 @@
+from src.event_shipper import EventShipper
+
+
+def test_queue_survives_unreachable_server(tmp_path):
+    queue_file = tmp_path / "event_queue.sqlite"
+    shipper = EventShipper(queue_file, "http://127.0.0.1:9/", timeout=0.2)
+    shipper.enqueue("annotation", {"username": "u", "className": "added", "pairId": "s_0", "count": 1})
+    shipper.enqueue("annotation", {"username": "u", "className": "removed", "pairId": "s_0", "count": 1})
+    shipper.close()
+
+    reopened = EventShipper(queue_file, "http://127.0.0.1:9/", timeout=0.2)
+    reopened.close()
+    batch = reopened._peek()
+    assert [e["payload"]["className"] for e in batch] == ["added", "removed"]  # order kept
+    assert len({e["eventId"] for e in batch}) == 2
+
+
+def test_legacy_cache_is_imported_once(tmp_path):
+    cache = tmp_path / "annotation_cache.json"
+    cache.write_text('[{"username": "u", "className": "added", "pairId": "s_0", "count": 1}]')
+
+    shipper = EventShipper(tmp_path / "event_queue.sqlite", "http://127.0.0.1:9/", timeout=0.2)
+    shipper.close()
+    shipper.import_legacy_cache(cache)
+    shipper.import_legacy_cache(cache)
+    assert shipper.pending() == 1
+    assert not cache.exists()
@@ -0,0 +1,56 @@
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "review_api"))
+
+from extractor_store import ExtractorStore  # noqa: E402
+
+
+def _record(pair_id, annotator, session="store_1/session_1"):
+    return {
+        "store_session_path": session,
+        "pair_id": pair_id,
+        "im1_name": f"{pair_id}-a.jpeg",
+        "im2_name": f"{pair_id}-b.jpeg",
+        "annotated_by": annotator,
+    }
+
+
+def _store(tmp_path, records, missing=(), assigned=()):
+    source = tmp_path / "model.json"
+    source.write_text(json.dumps({str(i): rec for i, rec in enumerate(records)}))
+    store = ExtractorStore(
+        tmp_path / "extractor.sqlite",
+        image_exists=lambda rel: rel not in missing,
+        is_assigned=lambda key: key in assigned,
+    )
+    assert store.ensure("model", source)
+    return store
+
+
+def test_take_filters_by_selected_users_in_file_order(tmp_path):
+    store = _store(tmp_path, [_record(i, ["alice", "bob", "carol"][i % 3]) for i in range(9)])
+
+    assert [r["pair_id"] for r in store.take("model", 2, ["bob", "carol"])] == [1, 2]
+    assert [r["pair_id"] for r in store.take("model", 10, ["carol"])] == [2, 5, 8]
+    assert [r["pair_id"] for r in store.take("model", 4)] == [0, 1, 2, 3]  # no filter
+    assert store.take("model", 4, ["nobody"]) == []
+
+
+def test_take_skips_missing_images_and_assigned_records(tmp_path):
+    records = [_record(i, "alice") for i in range(5)]
+    store = _store(tmp_path, records, missing={"store_1/session_1/1-b.jpeg"}, assigned={"store_1/session_1|3"})
+
+    assert [r["pair_id"] for r in store.take("model", 10, ["alice"])] == [0, 2, 4]
+    store.mark_assigned("model", ["store_1/session_1|0"])
+    assert [r["pair_id"] for r in store.take("model", 10, ["alice"])] == [2, 4]
+
+
+def test_ensure_reimports_a_changed_file(tmp_path):
+    store = _store(tmp_path, [_record(0, "alice")])
+    assert store.ensure("missing", tmp_path / "missing.json") is False
+
+    (tmp_path / "model.json").write_text(json.dumps({"0": _record(0, "alice"), "1": _record(1, "bob")}))
+    store.ensure("model", tmp_path / "model.json")
+    assert [r["pair_id"] for r in store.take("model", 10, ["bob"])] == [1]
@@ -0,0 +1,36 @@
+import threading
+import time
+
+from src.logic_annotation.flush_worker import FlushWorker
+
+
+class _CountingSaver:
+    def __init__(self):
+        self.writes = 0
+        self.written = threading.Event()
+
+    def _write(self):
+        self.writes += 1
+        self.written.set()
+
+
+def test_changes_within_debounce_are_written_once():
+    worker = FlushWorker(debounce=0.2)
+    saver = _CountingSaver()
+    for _ in range(50):
+        worker.schedule(saver)
+
+    assert saver.written.wait(2)
+    time.sleep(0.3)
+    assert saver.writes == 1
+
+
+def test_flush_writes_immediately():
+    worker = FlushWorker(debounce=60)
+    saver = _CountingSaver()
+    worker.schedule(saver)
+    worker.flush(saver)
+    assert saver.writes == 1
+
+    worker.flush(saver)  # nothing pending
+    assert saver.writes == 1
@@ -0,0 +1,56 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "review_api"))
+
+from image_catalog import ImageCatalog  # noqa: E402
+
+
+def _count_stats(monkeypatch, name):
+    calls = []
+    original = Path.stat
+
+    def stat(self, *args, **kwargs):
+        if self.name == name:
+            calls.append(self)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(Path, "stat", stat)
+    return calls
+
+
+def test_missing_image_is_statted_once_per_scan(tmp_path, monkeypatch):
+    images = tmp_path / "images"
+    (images / "store_1").mkdir(parents=True)
+    (images / "store_1" / "a.jpeg").write_bytes(b"x")
+    catalog = ImageCatalog(images, tmp_path / "catalog.sqlite")
+    catalog.scan()
+    calls = _count_stats(monkeypatch, "b.jpeg")
+
+    assert catalog.exists("store_1/a.jpeg")
+    for _ in range(5):
+        assert not catalog.exists("store_1/b.jpeg")
+    assert len(calls) == 1
+
+    # found by the next scan
+    (images / "store_1" / "b.jpeg").write_bytes(b"y")
+    assert not catalog.exists("store_1/b.jpeg")
+    catalog.scan()
+    assert catalog.exists("store_1/b.jpeg")
+
+
+def test_image_added_between_scans_is_found(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    catalog = ImageCatalog(images, tmp_path / "catalog.sqlite")
+    catalog.scan()
+
+    (images / "new.jpeg").write_bytes(b"x")
+    assert catalog.exists("new.jpeg")  # never looked up before: one stat() finds it
+
+    reader = ImageCatalog(images, tmp_path / "catalog.sqlite")  # another worker
+    assert not reader.exists("late.jpeg")
+    (images / "late.jpeg").write_bytes(b"x")
+    catalog.scan()
+    reader.reload()
+    assert reader.exists("late.jpeg")
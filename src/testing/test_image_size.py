@@ -0,0 +1,36 @@
+import json
+from PIL import Image
+
+from src.data_handling.image_size import ImageSizeIndex, probe_image_size, read_jpeg_size, SIZE_INDEX_NAME
+
+
+def test_read_jpeg_size_matches_pil(tmp_path):
+    for i, (w, h) in enumerate([(10, 10), (640, 480), (37, 1001)]):
+        path = tmp_path / f"{i}-000000.jpeg"
+        Image.new("RGB", (w, h), color="red").save(path, format="JPEG", progressive=bool(i % 2))
+        assert read_jpeg_size(path) == (w, h)
+        assert read_jpeg_size(path) == Image.open(path).size
+
+
+def test_probe_falls_back_to_pil_for_other_formats(tmp_path):
+    path = tmp_path / "0-000000.png"
+    Image.new("RGB", (20, 30)).save(path, format="PNG")
+    assert read_jpeg_size(path) is None
+    assert probe_image_size(path) == (20, 30)
+
+
+def test_size_index_persists_and_invalidates(tmp_path):
+    path = tmp_path / "0-000000.jpeg"
+    Image.new("RGB", (50, 60)).save(path, format="JPEG")
+
+    index = ImageSizeIndex(tmp_path)
+    assert index.get(path) == (50, 60)
+    index.flush()
+
+    data = json.loads((tmp_path / SIZE_INDEX_NAME).read_text())
+    assert data[path.name]["size"] == [50, 60]
+
+    # a changed file must not be served from the index
+    Image.new("RGB", (70, 80)).save(path, format="JPEG")
+    assert ImageSizeIndex(tmp_path).get(path) == (70, 80)
+    assert ImageSizeIndex(tmp_path).get(tmp_path / "missing.jpeg") is None
@@ -0,0 +1,87 @@
+import json
+import sys
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "highscore"))
+
+import left_for_review  # noqa: E402
+import review_db  # noqa: E402
+import review_pair_registry  # noqa: E402
+
+MODEL_A = "model_a.pth"
+MODEL_B = "model_b.pth"
+
+
+def _setup(tmp_path, monkeypatch):
+    for model in (MODEL_A, MODEL_B):
+        pairs = {f"p{i}": {"annotated_by": "alice" if i % 2 else "bob"} for i in range(6)}
+        (tmp_path / model.replace(".pth", ".json")).write_text(json.dumps(pairs))
+    monkeypatch.setattr(review_pair_registry, "REVIEW_BATCH_DIR", tmp_path)
+    monkeypatch.setattr(review_pair_registry, "_registry", review_pair_registry.PairRegistry())
+
+    manager = review_db.ReviewDatabaseManager(str(tmp_path / "reviews.db"))
+    index = left_for_review.ReviewedIndex()
+    manager.add_listener(index.on_review)
+    monkeypatch.setattr(review_db, "_review_manager", manager)
+    monkeypatch.setattr(left_for_review, "_index", index)
+    return manager
+
+
+def _review(manager, pair_id, reviewer, decision, model, annotated_by="alice"):
+    manager.insert_review(pair_id=pair_id, annotated_by=annotated_by, reviewer=reviewer,
+                          predicted="car", expected="car", decision=decision, model_name=model)
+
+
+def _assert_matches_sql(manager, model):
+    reviewed = {pair_id for pair_id, _, _ in manager.get_review_keys_by_model(model)}
+    all_pairs = review_pair_registry.get_all_pair_ids(model)
+    assert left_for_review.get_left_for_review_count(model) == len(all_pairs - reviewed)
+    for annotator in ("alice", "bob"):
+        progress = left_for_review.get_annotator_review_progress(model, annotator)
+        assert progress["reviewed"] == len(manager.get_reviewed_pair_ids_by_annotator_and_model(model, annotator))
+
+
+def test_incremental_index_matches_sql(tmp_path, monkeypatch):
+    manager = _setup(tmp_path, monkeypatch)
+    _review(manager, "p1", "rev1", "accepted", MODEL_A)
+
+    # load both models into the index, then keep changing reviews
+    _assert_matches_sql(manager, MODEL_A)
+    _assert_matches_sql(manager, MODEL_B)
+    assert left_for_review.get_left_for_review_count(MODEL_A) == 5
+
+    _review(manager, "p1", "rev2", "accepted", MODEL_A)  # second reviewer, same pair
+    _review(manager, "p2", "rev1", "accepted", MODEL_A, annotated_by="bob")
+    _assert_matches_sql(manager, MODEL_A)
+    assert left_for_review.get_left_for_review_count(MODEL_A) == 4
+
+    _review(manager, "p2", "rev1", "corrected", MODEL_A, annotated_by="bob")  # re-review
+    _assert_matches_sql(manager, MODEL_A)
+    assert left_for_review.get_left_for_review_count(MODEL_A) == 4
+
+    _review(manager, "p2", "rev1", "accepted", MODEL_B, annotated_by="bob")  # moves to model B
+    _assert_matches_sql(manager, MODEL_A)
+    _assert_matches_sql(manager, MODEL_B)
+    assert left_for_review.get_left_for_review_count(MODEL_A) == 5
+    assert left_for_review.get_left_for_review_count(MODEL_B) == 5
+    assert left_for_review.get_annotator_review_progress(MODEL_B, "bob")["reviewed"] == 1
+
+
+def test_first_load_of_a_model_during_an_insert(tmp_path, monkeypatch):
+    manager = _setup(tmp_path, monkeypatch)
+    _review(manager, "p1", "rev1", "accepted", MODEL_A)
+
+    def load_elsewhere(*change):
+        # another request loads MODEL_A for the first time while this review is being written;
+        # after the index listener skipped it, since the model was not loaded yet
+        if change[0] == "p2":
+            loader = threading.Thread(target=left_for_review._index.model, args=(MODEL_A,))
+            loader.start()
+            loader.join()
+
+    manager.add_listener(load_elsewhere)
+    _review(manager, "p2", "rev1", "accepted", MODEL_A, annotated_by="bob")
+
+    _assert_matches_sql(manager, MODEL_A)
+    assert left_for_review.get_left_for_review_count(MODEL_A) == 4
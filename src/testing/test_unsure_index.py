@@ -0,0 +1,46 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "highscore"))
+
+from unsure_index import UnsureIndex  # noqa: E402
+
+
+def _annotations(path, pairs):
+    data = {"_meta": {"root": "store_1"}}
+    for pair_id, state in pairs.items():
+        data[str(pair_id)] = {"pair_state": state, "im1_path": f"{pair_id}-a.jpeg", "im2_path": f"{pair_id}-b.jpeg"}
+    path.write_text(json.dumps(data))
+
+
+def test_page_walks_all_unsure_pairs_with_cursor(tmp_path):
+    annotations = tmp_path / "annotations"
+    annotations.mkdir()
+    _annotations(annotations / "session_a.json", {0: None, 1: "chosen", 2: "no_annotation", 10: None})
+    _annotations(annotations / "session_b.json", {3: None})
+
+    index = UnsureIndex(annotations, db_path=str(tmp_path / "unsure.db"))
+    index.refresh()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        items, cursor = index.page(limit=2, cursor=cursor)
+        seen += [(item["session_id"], item["pair_id"]) for item in items]
+        pages += 1
+        if cursor is None:
+            break
+    # pair ids sort numerically (10 after 2), every pair exactly once
+    assert seen == [("session_a", 0), ("session_a", 2), ("session_a", 10), ("session_b", 3)]
+    assert pages == 2
+
+    items, cursor = index.page(limit=10)
+    assert len(items) == 4 and cursor is None
+
+
+def test_page_rejects_invalid_cursor(tmp_path):
+    index = UnsureIndex(tmp_path, db_path=str(tmp_path / "unsure.db"))
+    with pytest.raises(ValueError):
+        index.page(cursor="session_a:abc")
@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "review_api"))
+
+from unsure_queue import UnsureQueue  # noqa: E402
+
+
+def _annotation_file(user_dir, name, mtime, pairs):
+    user_dir.mkdir(exist_ok=True)
+    data = {"_meta": {"user": user_dir.name}}
+    for pair_id, state in pairs.items():
+        data[str(pair_id)] = {
+            "pair_state": state,
+            "im1_path": f"store_1/{name}/top/{pair_id}-a.jpeg",
+            "im2_path": f"store_1/{name}/top/{pair_id}-b.jpeg",
+        }
+    path = user_dir / f"{name}.json"
+    path.write_text(json.dumps(data))
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_take_is_oldest_first_and_skips_own_and_unusable(tmp_path):
+    _annotation_file(tmp_path / "alice", "session_2", 2_000, {0: None, 1: "chosen"})
+    _annotation_file(tmp_path / "bob", "session_1", 1_000, {0: "no_annotation", 1: None, 2: None})
+    queue = UnsureQueue([tmp_path / "alice", tmp_path / "bob"], tmp_path / "queue.sqlite")
+    queue.refresh()
+    assert len(queue) == 4
+
+    batch = queue.take(10, exclude_user="alice")
+    assert [(r["store_session_path"], r["pair_id"]) for r in batch] == [
+        ("store_1/session_1", 0), ("store_1/session_1", 1), ("store_1/session_1", 2),
+    ]
+    assert queue.take(2) == batch[:2]  # nothing is removed by take()
+
+    usable = queue.take(10, usable=lambda rec: rec["pair_id"] != 1)
+    assert [(r["store_session_path"], r["pair_id"]) for r in usable] == [
+        ("store_1/session_1", 0), ("store_1/session_1", 2), ("store_1/session_2", 0),
+    ]
+
+
+def test_remove_and_refresh(tmp_path):
+    path = _annotation_file(tmp_path / "bob", "session_1", 1_000, {0: None, 1: None})
+    queue = UnsureQueue([tmp_path / "bob"], tmp_path / "queue.sqlite")
+    queue.refresh()
+
+    queue.remove([rec["key"] for rec in queue.take(1)])
+    assert [r["pair_id"] for r in queue.take(10)] == [1]
+
+    # a changed file replaces its candidates; a deleted one drops them
+    _annotation_file(tmp_path / "bob", "session_1", 3_000, {1: "chosen", 5: None})
+    queue.refresh()
+    assert [r["pair_id"] for r in queue.take(10)] == [5]
+    path.unlink()
+    queue.refresh()
+    assert len(queue) == 0
+
+
+def test_assigned_keys_are_never_handed_out(tmp_path):
+    _annotation_file(tmp_path / "bob", "session_1", 1_000, {0: None, 1: None})
+    assigned = {"store_1/session_1|0"}
+    queue = UnsureQueue([tmp_path / "bob"], tmp_path / "queue.sqlite", is_assigned=assigned.__contains__)
+    queue.refresh()
+    assert [r["pair_id"] for r in queue.take(10)] == [1]
+
+    assigned.add("store_1/session_1|1")  # assigned by another worker after the refresh
+    assert queue.take(10) == []
@@ -0,0 +1,55 @@
+import importlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "highscore"))
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    # the server keeps its databases and static/ in the working directory
+    root = tmp_path_factory.mktemp("highscore")
+    (root / "static").mkdir()
+    cwd, data_root = os.getcwd(), os.environ.get("ANNOTATION_DATA_ROOT")
+    os.chdir(root)
+    os.environ["ANNOTATION_DATA_ROOT"] = str(root / "data")
+    try:
+        server = importlib.import_module("annotation_api_server")
+        yield TestClient(server.app)
+    finally:
+        os.chdir(cwd)
+        if data_root is None:
+            os.environ.pop("ANNOTATION_DATA_ROOT", None)
+        else:
+            os.environ["ANNOTATION_DATA_ROOT"] = data_root
+
+
+def test_single_pair_lookup_with_slash_in_pair_id(client):
+    response = client.post("/api/annotate", json={"username": "alice", "className": "added", "pairId": "store_1/session_2_7"})
+    assert response.status_code == 200
+
+    response = client.get("/api/users/alice/pairs/store_1%2Fsession_2_7")
+    assert response.status_code == 200
+    assert response.json()["annotated"] is True
+    assert response.json()["className"] == "added"
+
+    assert client.get("/api/users/alice/pairs/session_2_8").json()["annotated"] is False
+
+
+def test_batched_lookup(client):
+    client.post("/api/annotate", json={"username": "bob", "className": "removed", "pairId": "s_1"})
+    response = client.post("/api/users/bob/pairs/lookup", json={"pairIds": ["s_1", "s_2", "s_1"]})
+    assert response.status_code == 200
+    assert response.json()["pairs"] == {"s_1": "removed"}
+    assert response.json()["missing"] == ["s_2"]
+
+
+def test_stats_has_totals_but_no_pairs(client):
+    client.post("/api/annotate", json={"username": "carol", "className": "added", "pairId": "s_9"})
+    users = client.get("/api/stats").json()["users"]
+    assert users["carol"]["total"] == 1
+    assert "pairs" not in users["carol"] and "pairTimestamps" not in users["carol"]
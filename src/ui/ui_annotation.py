@@ -1,6 +1,8 @@
 import uuid
 from src.ui.ui_annotation_displayer import AnnotationDisplayer
 import tkinter as tk
+import numpy as np
+from PIL import Image, ImageTk
 
 class BoxHandler:
     def __init__(self, data_handler, saver, ui=None):
@@ -263,12 +265,16 @@ class BoxHandler:
 
 
 class Flickerer:
-    def __init__(self, ui=None):
+    def __init__(self, ui=None, prefetcher=None, extra_frame=None):
         self.ui = ui
-        self.displayer = AnnotationDisplayer()
+        self.displayer = AnnotationDisplayer(prefetcher)
+        self.extra_frame = extra_frame  # None, "diff" or "blend"
 
         self._flicker_running = False
-        self._show_first = True
+        self._frame_idx = 0
+        self._frames = []  # Tk images, built once per flicker
+        self._item = None
+        self._after_id = None
 
         # will be set when flicker starts
         self.canvas = None
@@ -277,6 +283,19 @@ class Flickerer:
         self.h = None
         self.interval = 500
 
+    def _build_frames(self):
+        pil1, orig_size = self.displayer.scaled_image(self.pair.image1, self.w, self.h)
+        pil2, _ = self.displayer.scaled_image(self.pair.image2, self.w, self.h)
+        if pil2.size != pil1.size:
+            pil2 = pil2.resize(pil1.size)
+
+        frames = [pil1, pil2]
+        if self.extra_frame:
+            frames.append(combine_frames(pil1, pil2, self.extra_frame))
+
+        self.canvas.img_size = orig_size
+        return [ImageTk.PhotoImage(f) for f in frames], pil1.size
+
     def start_flicker(self, canvas, pair, w, h, interval=500):
         self.canvas = canvas
         self.pair = pair
@@ -284,26 +303,36 @@ class Flickerer:
         self.h = h
         self.interval = interval
 
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+
+        # decode + scale once, afterwards only the canvas item is swapped
+        self._frames, (img_w, img_h) = self._build_frames()
+        self.canvas.delete("all")
+        self.canvas.config(width=img_w, height=img_h)
+        self._item = self.canvas.create_image(img_w // 2, img_h // 2, image=self._frames[0], anchor="center")
+
         self._flicker_running = True
-        self._show_first = True  # reset toggle
+        self._frame_idx = 0  # reset toggle
         self._flicker_step()
 
     def _flicker_step(self):
+        self._after_id = None
         if not self._flicker_running:
+            self._frames = []
             return
 
-        self.canvas.delete("all")
-        if self._show_first:
-            self.displayer._draw_image(self.canvas, self.pair.image1, self.w, self.h)
-        else:
-            self.displayer._draw_image(self.canvas, self.pair.image2, self.w, self.h)
-
-        self._show_first = not self._show_first
-        self.canvas.after(self.interval, self._flicker_step)
+        self.canvas.itemconfigure(self._item, image=self._frames[self._frame_idx])
+        self._frame_idx = (self._frame_idx + 1) % len(self._frames)
+        self._after_id = self.canvas.after(self.interval, self._flicker_step)
 
     def stop_flicker(self):
         self._flicker_running = False
+        if self._after_id is not None:
+            self.canvas.after_cancel(self._after_id)
+            self._after_id = None
         self.canvas.delete("all")
+        self._frames = []
         # always stop on image2
         self.displayer._draw_image(self.canvas, self.pair.image2, self.w, self.h)
         if self.ui:
@@ -315,6 +344,19 @@ class Flickerer:
             self.start_flicker(canvas, pair, w, h, interval)
 
 
+def combine_frames(pil1, pil2, mode):
+    """Difference ("diff") or 50/50 blend ("blend") of two equally sized images."""
+    a = np.asarray(pil1.convert("RGB"), dtype=np.int16)
+    b = np.asarray(pil2.convert("RGB"), dtype=np.int16)
+    if mode == "diff":
+        out = np.abs(a - b)
+    elif mode == "blend":
+        out = (a + b) // 2
+    else:
+        raise ValueError(f"unknown flicker frame mode: {mode}")
+    return Image.fromarray(out.astype(np.uint8), "RGB")
+
+
 
 class Crosshair:
     def __init__(self, canvas: tk.Canvas, other_canvas=None, color="gray", width=8):
@@ -1,9 +1,11 @@
 # ui_annotation_displayer.py
-from PIL import Image, ImageTk
+from PIL import ImageTk
+from src.data_handling.image_cache import decode_scaled, scale_to_fit
 
 class AnnotationDisplayer:
-    def __init__(self):
+    def __init__(self, prefetcher=None):
         self._images = []  # keep refs to Tk images
+        self.prefetcher = prefetcher  # ImagePrefetcher, decodes + scales off the Tk thread
 
     def display_pair(self, canvas_left, canvas_right, pair, annotations, expected, boxes_expected=None, boxes_predicted=None, max_w=1200, max_h=800):
         """
@@ -74,22 +76,21 @@ class AnnotationDisplayer:
 
 
     def _scale_image(self, pil_img, max_w, max_h):
-        w, h = pil_img.size
-        scale = min(max_w / w, max_h / h)  # preserve proportions
-        return pil_img.resize((int(w * scale), int(h * scale)), Image.Resampling.LANCZOS)
+        return scale_to_fit(pil_img, max_w, max_h)  # preserve proportions
+
 
+    def scaled_image(self, annot_img, max_w, max_h):
+        """(scaled PIL image, original size), from the prefetch cache if available."""
+        if self.prefetcher is not None:
+            return self.prefetcher.get(annot_img, max_w, max_h)
+        return decode_scaled(annot_img, max_w, max_h)
 
     def _draw_image(self, canvas, annot_img, max_w, max_h):
 
-        if hasattr(annot_img, "load_image"):
-            pil_img = annot_img.load_image()
-        else:
-            pil_img = Image.open(annot_img.img_path)
-            
-        orig_w, orig_h = pil_img.size
+        pil_img, (orig_w, orig_h) = self.scaled_image(annot_img, max_w, max_h)
         canvas.img_size = (orig_w, orig_h)  # store true image size
 
-        pil_img = self._scale_image(pil_img, max_w, max_h)
+        # only the PhotoImage conversion has to happen on the Tk thread
         tk_img = ImageTk.PhotoImage(pil_img)
         self._images.append(tk_img)
 
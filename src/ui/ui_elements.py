@@ -6,7 +6,8 @@ from src.logic_annotation.logic_data_handler import SessionDataHandler
 from src.logic_annotation.logic_saver import AnnotationSaver
 from src.ui.ui_annotation import BoxHandler, Flickerer, Crosshair
 from src.ui.ui_annotation_displayer import AnnotationDisplayer
-from src.config import DATASET_DIR
+from src.config import DATASET_DIR, PREFETCH_NEXT, PREFETCH_PREV, PREFETCH_WORKERS, IMAGE_CACHE_MB, FLICKER_EXTRA_FRAME
+from src.data_handling.image_cache import ImageCache, ImagePrefetcher
 from tkinter import messagebox
 from pprint import pprint
 
@@ -34,9 +35,10 @@ class UIElements(tk.Frame):
             self.data_handler = SessionDataHandler(dataset_path,  api_base="http://172.30.20.31:8081", skip_completed=skip_completed)
         
         self.handler = BoxHandler(self.data_handler, self.data_handler.saver, ui=self)
-        self.displayer = AnnotationDisplayer()
+        self.prefetcher = ImagePrefetcher(ImageCache(max_bytes=IMAGE_CACHE_MB * 1024 * 1024), workers=PREFETCH_WORKERS)
+        self.displayer = AnnotationDisplayer(self.prefetcher)
         self.data_handler.saver.set_on_change(self.refresh)
-        self.flickerer = Flickerer(ui=self)
+        self.flickerer = Flickerer(ui=self, prefetcher=self.prefetcher, extra_frame=FLICKER_EXTRA_FRAME)
 
         # --- Subframes ---
         self.top_frame = tk.Frame(self)
@@ -59,6 +61,7 @@ class UIElements(tk.Frame):
         # Bind keys
         root.bind("<space>", self.toggle_flicker)
         root.bind("<Configure>", self._on_resize)
+        root.protocol("WM_DELETE_WINDOW", self.on_close)
 
         # === Klares 3-Zeilen-Layout ===
         self.rowconfigure(0, weight=0)   # top bar (fix)
@@ -150,6 +153,11 @@ class UIElements(tk.Frame):
 
 
 
+    def on_close(self):
+        self.data_handler.close()
+        self.prefetcher.shutdown()
+        self.winfo_toplevel().destroy()
+
     def _on_resize(self, event=None):
         # cancel pending refresh if still waiting
         if hasattr(self, "_resize_job") and self._resize_job:
@@ -211,6 +219,13 @@ class UIElements(tk.Frame):
             max_w=available_w,
             max_h=available_h
         )
+
+        # decode the neighbouring pairs in the background so "next" is instant
+        self.prefetcher.prefetch(
+            self.data_handler.neighbour_pairs(PREFETCH_NEXT, PREFETCH_PREV),
+            available_w // 2,
+            available_h,
+        )
         if not getattr(self.handler, "_moving", False):
             self.handler.selected_box_index = None
             self.handler.selected_canvas = None
@@ -248,6 +263,7 @@ class UIElements(tk.Frame):
                     self.data_handler.context_info(),
                 )
 
+        self.data_handler.flush_saver()
         self.refresh()
 
         # detect transition
@@ -376,6 +392,7 @@ class UIElements(tk.Frame):
                     self.data_handler.context_info(),
                 )
 
+        self.data_handler.flush_saver()
         self.refresh()
             
         # Optional: Sessionwechsel anzeigen